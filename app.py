@@ -1,10 +1,13 @@
-import json
-import re
-from urllib.parse import quote, urlparse, parse_qs
+import time
+from urllib.parse import quote
 
 import streamlit as st
-from chatbot import get_answer
-from config import MAPS_API_KEY
+from streamlit_javascript import st_javascript
+import session_log
+import tracing
+from chatbot import get_answer_stream
+from config import MAPS_TRAVEL_TIMES, SESSION_LOG_PATH, TRACE_DEBUG_PANEL
+from place_view import place_views
 
 
 # =========================================================
@@ -181,118 +184,6 @@ def safe_rerun():
             pass
 
 
-def extract_google_drive_file_id(url: str):
-    if not url or not isinstance(url, str):
-        return None
-
-    m = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)
-    if m:
-        return m.group(1)
-
-    if "open?id=" in url:
-        try:
-            parsed = urlparse(url)
-            q = parse_qs(parsed.query)
-            file_ids = q.get("id")
-            if file_ids:
-                return file_ids[0]
-        except Exception:
-            pass
-
-    if "uc?id=" in url:
-        try:
-            parsed = urlparse(url)
-            q = parse_qs(parsed.query)
-            file_ids = q.get("id")
-            if file_ids:
-                return file_ids[0]
-        except Exception:
-            pass
-
-    return None
-
-
-def fix_image_url(url: str):
-    if not url or not isinstance(url, str):
-        return None
-
-    url = url.strip()
-    if not url:
-        return None
-
-    if "drive.google.com" in url:
-        file_id = extract_google_drive_file_id(url)
-        if file_id:
-            return f"https://drive.google.com/uc?export=view&id={file_id}"
-        return url
-
-    if "lh3.google" in url or "googleusercontent.com" in url:
-        if "=" not in url.split("/")[-1]:
-            return f"{url}=s1200"
-        return url
-
-    return url
-
-
-def parse_image_urls(raw_value):
-    if not raw_value:
-        return []
-
-    if isinstance(raw_value, list):
-        return [fix_image_url(u) for u in raw_value if isinstance(u, str) and u.strip()]
-
-    if isinstance(raw_value, str):
-        txt = raw_value.strip()
-        if not txt:
-            return []
-
-        try:
-            data = json.loads(txt)
-            if isinstance(data, list):
-                return [fix_image_url(u) for u in data if isinstance(u, str) and u.strip()]
-        except Exception:
-            pass
-
-        return [fix_image_url(txt)]
-
-    return []
-
-
-def get_best_image_candidates(place: dict):
-    urls = []
-
-    image_urls = parse_image_urls(place.get("image_urls"))
-    urls.extend(image_urls)
-
-    image_url = place.get("image_url")
-    if isinstance(image_url, str) and image_url.strip():
-        fixed = fix_image_url(image_url)
-        if fixed and fixed not in urls:
-            urls.append(fixed)
-
-    clean = []
-    for u in urls:
-        if isinstance(u, str) and u.startswith(("http://", "https://")):
-            clean.append(u)
-
-    return clean
-
-
-def build_static_map_url(lat, lng):
-    if lat is None or lng is None or not MAPS_API_KEY:
-        return None
-
-    return (
-        "https://maps.googleapis.com/maps/api/staticmap"
-        f"?center={lat},{lng}"
-        f"&zoom=15"
-        f"&size=900x520"
-        f"&maptype=roadmap"
-        f"&markers=color:red%7C{lat},{lng}"
-        f"&key={MAPS_API_KEY}"
-    )
-
-
 def try_show_image(url: str, caption: str = None):
     if not url:
         return False
@@ -343,9 +234,16 @@ if "focus_place_id" not in st.session_state:
 if "last_results" not in st.session_state:
     st.session_state.last_results = []
 
+# view model ของการ์ดใน last_results (place_view.py) คำนวณตอนได้ผลลัพธ์ rerun ถัดไปแค่วาดซ้ำ
+if "last_views" not in st.session_state:
+    st.session_state.last_views = place_views(st.session_state.last_results)
+
 if "banned_categories" not in st.session_state:
     st.session_state.banned_categories = []
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = session_log.new_session_id()
+
 
 # =========================================================
 # SIDEBAR
@@ -367,6 +265,7 @@ with st.sidebar:
 
     if st.button("ล้างผลลัพธ์ล่าสุด", use_container_width=True):
         st.session_state["last_results"] = []
+        st.session_state["last_views"] = []
         st.session_state["focus_place_id"] = None
         safe_rerun()
 
@@ -378,41 +277,61 @@ with st.sidebar:
             }
         ]
         st.session_state["last_results"] = []
+        st.session_state["last_views"] = []
         st.session_state["focus_place_id"] = None
         st.session_state["banned_categories"] = []
+        st.session_state["session_id"] = session_log.new_session_id()
         safe_rerun()
 
 
+# =========================================================
+# USER LOCATION
+# =========================================================
+# ตำแหน่งจากเบราว์เซอร์ (ผู้ใช้ต้องกดอนุญาต) ใช้หาเวลาเดินทางบนการ์ดเมื่อเปิด MAPS_TRAVEL_TIMES
+# การค้นหายังไม่ใช้ตำแหน่งนี้: get_answer ได้ user_lat / user_lng เป็น None เหมือนเดิม
+GEOLOCATION_JS = """await new Promise((resolve) => {
+    if (!navigator.geolocation) { resolve(null); return; }
+    navigator.geolocation.getCurrentPosition(
+        (pos) => resolve([pos.coords.latitude, pos.coords.longitude]),
+        () => resolve(null),
+        {timeout: 10000, maximumAge: 600000}
+    );
+})"""
+
+if MAPS_TRAVEL_TIMES and st.session_state.user_lat is None:
+    with st.sidebar:
+        # คืน 0 จนกว่าเบราว์เซอร์จะตอบ แล้ว rerun พร้อมค่า [lat, lng] (หรือ None ถ้าผู้ใช้ไม่อนุญาต)
+        coords = st_javascript(GEOLOCATION_JS, key="user_location")
+    if isinstance(coords, list) and len(coords) == 2:
+        st.session_state.user_lat, st.session_state.user_lng = float(coords[0]), float(coords[1])
+
+
 # =========================================================
 # PLACE CARD
 # =========================================================
-def _render_place_card(p: dict):
-    name = p.get("name", "-")
-    desc = (p.get("description") or "").strip()
-    hi = (p.get("highlight") or "").strip()
-    tambon = p.get("tambon", "-")
-    category = p.get("category", "-")
-    lat = p.get("latitude")
-    lng = p.get("longitude")
-
-    map_link = None
-    if lat is not None and lng is not None:
-        map_link = f"https://www.google.com/maps?q={lat},{lng}"
+def _render_place_card(v: dict):
+    """วาดการ์ดจาก view model (place_view.place_views) ไม่มีการคำนวณระหว่าง rerun"""
+    name = v["name"]
+    desc = v["description"]
+    hi = v["highlight"]
+    tambon = v["tambon"]
+    category = v["category"]
+    map_link = v["map_link"]
 
     with st.container(border=True):
         img_col, info_col = st.columns([1, 1.45], gap="medium")
 
         with img_col:
             shown = False
-            image_candidates = get_best_image_candidates(p)
 
-            if image_candidates:
-                shown = try_show_image(image_candidates[0])
+            if v["thumbnail"]:
+                shown = try_show_image(v["thumbnail"])
 
-            if not shown:
-                static_map = build_static_map_url(lat, lng)
-                if static_map:
-                    shown = try_show_image(static_map)
+            if not shown and v["images"]:
+                shown = try_show_image(v["images"][0])
+
+            if not shown and v["static_map"]:
+                shown = try_show_image(v["static_map"])
 
             if not shown:
                 st.info("ไม่มีรูปภาพ")
@@ -424,11 +343,12 @@ def _render_place_card(p: dict):
                 unsafe_allow_html=True
             )
 
-            if "distance_km" in p and p.get("distance_km") is not None:
-                try:
-                    st.markdown(f"**ระยะทาง:** {float(p['distance_km']):.2f} กม.")
-                except Exception:
-                    pass
+            if v["distance"]:
+                by_road = " (ตามถนน)" if v.get("distance_by_road") else ""
+                st.markdown(f"**ระยะทาง:** {v['distance']} กม.{by_road}")
+
+            if v.get("travel_time"):
+                st.markdown(f"**เวลาเดินทาง:** {v['travel_time']}")
 
             if desc:
                 st.markdown(f'<div class="place-desc">{desc}</div>', unsafe_allow_html=True)
@@ -454,7 +374,7 @@ with left_col:
     st.subheader("แชทกับพี่ปะทิว")
 
     chat_area = st.container(height=620, border=True)
-    with chat_area:
+    with chat_area, tracing.span("render.chat"):
         for msg in st.session_state.messages:
             render_chat_bubble(msg["role"], msg["content"])
 
@@ -462,11 +382,11 @@ with right_col:
     st.subheader("ผลลัพธ์ล่าสุด")
 
     result_area = st.container(height=620, border=True)
-    with result_area:
-        last_results = st.session_state.get("last_results", [])
-        if last_results:
-            for p in last_results:
-                _render_place_card(p)
+    with result_area, tracing.span("render.results"):
+        last_views = st.session_state.get("last_views", [])
+        if last_views:
+            for v in last_views:
+                _render_place_card(v)
         else:
             st.markdown("""
             <div class="empty-box">
@@ -491,15 +411,16 @@ user_input = st.chat_input("พิมพ์ชื่อสถานที่ ป
 if user_input:
     st.session_state.messages.append({"role": "user", "content": user_input})
 
-    result = get_answer(
-        user_input,
-        user_lat=None,
-        user_lng=None,
-        history=st.session_state.messages[-8:],
-        focus_place_id=st.session_state.get("focus_place_id"),
-        last_results=st.session_state.get("last_results", []),
-        banned_categories=st.session_state.get("banned_categories", []),
-    )
+    turn_inputs = {
+        "user_lat": None,
+        "user_lng": None,
+        "history": st.session_state.messages[-8:],
+        "focus_place_id": st.session_state.get("focus_place_id"),
+        "last_results": st.session_state.get("last_results", []),
+        "banned_categories": st.session_state.get("banned_categories", []),
+    }
+    started = time.perf_counter()
+    result = get_answer_stream(user_input, **turn_inputs)
 
     if isinstance(result, tuple) and len(result) == 3:
         reply_text, places, banned_out = result
@@ -509,10 +430,31 @@ if user_input:
     else:
         reply_text, places = result
 
+    if not isinstance(reply_text, str):
+        # คำตอบคุยเล่นมาเป็น stream: แสดงทีละ chunk ในกล่องแชท แล้วเก็บข้อความเต็มไว้ใน history
+        with chat_area, tracing.span("render.chat_stream"):
+            render_chat_bubble("user", user_input)
+            reply_text = st.write_stream(reply_text)
+        if not isinstance(reply_text, str):
+            reply_text = "".join(str(part) for part in reply_text)
+
+    if SESSION_LOG_PATH:
+        turn = sum(1 for m in st.session_state.messages if m["role"] == "user") - 1
+        session_log.record_turn(
+            SESSION_LOG_PATH,
+            session_log.turn_record(
+                st.session_state.session_id, turn, user_input, reply=reply_text, places=places or [],
+                latency_ms=(time.perf_counter() - started) * 1000.0, **turn_inputs,
+            ),
+        )
+
     st.session_state.messages.append({"role": "assistant", "content": reply_text})
 
     if places:
         st.session_state["last_results"] = places
+        st.session_state["last_views"] = place_views(
+            places, (st.session_state.get("user_lat"), st.session_state.get("user_lng"))
+        )
         if len(places) == 1 and places[0].get("id") is not None:
             st.session_state["focus_place_id"] = places[0]["id"]
 
@@ -522,4 +464,39 @@ if user_input:
 # =========================================================
 # FOOTER
 # =========================================================
-st.caption("Pathew Chatbot")
\ No newline at end of file
+st.caption("Pathew Chatbot")
+
+
+# =========================================================
+# DEBUG: เวลาแต่ละขั้น (เปิดด้วย TRACE_DEBUG_PANEL = true)
+# =========================================================
+if TRACE_DEBUG_PANEL:
+    with st.sidebar:
+        with st.expander("Debug: เวลาแต่ละขั้น", expanded=False):
+            stages = tracing.stage_percentiles()
+            if stages:
+                st.dataframe(
+                    [
+                        {
+                            "ขั้นตอน": name,
+                            "n": v["count"],
+                            "p50 (ms)": round(v["p50_ms"], 1),
+                            "p95 (ms)": round(v["p95_ms"], 1),
+                            "p99 (ms)": round(v["p99_ms"], 1),
+                        }
+                        for name, v in sorted(stages.items())
+                    ],
+                    hide_index=True,
+                    use_container_width=True,
+                )
+            else:
+                st.caption("ยังไม่มีข้อมูล")
+
+            recent = tracing.recent_traces(limit=1)
+            if recent:
+                st.markdown("**รอบล่าสุด**")
+                st.json(recent[-1], expanded=False)
+
+            if st.button("ล้างสถิติเวลา", use_container_width=True):
+                tracing.reset_stats()
+                safe_rerun()
@@ -0,0 +1,116 @@
+"""latency ต่อรอบของ get_answer_async (LLM กับ query คาดล่วงหน้ารันพร้อมกัน, fallback ยิงพร้อมกัน)
+เทียบกับรอบเดียวกันที่ปิด query คาดล่วงหน้า (chatbot.SPECULATIVE_SEARCH = False, วัดจริง)
+และเวลาประมาณถ้าทุก call รันต่อกันทีละตัวแบบ get_answer เดิม
+
+    python -m benchmarks.bench_async
+    python -m benchmarks.bench_async --llm-ms 800 --db-ms 20
+    python -m benchmarks.bench_async --dsn "postgresql://localhost/pathew"
+
+ค่าเริ่มต้นใช้ PlaceCatalog กับข้อมูลสังเคราะห์ แล้วหน่วงทุก query ด้วย --db-ms (จำลอง round-trip)
+ถ้าให้ --dsn จะยิง Postgres จริง (ฐานที่มีตาราง places อยู่แล้ว สคริปต์อ่านอย่างเดียว
+และยังต้องมี [postgres] ใน secrets สำหรับค่าตั้งอื่นๆ) ส่วน LLM ใช้ StubModel เสมอ
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import chatbot
+import db
+import db_async
+import place_catalog
+from benchmarks.common import CountingSearch, StubModel, percentile, synthetic_places
+
+QUERIES = [
+    "อยากกินก๋วยเตี๋ยว",
+    "ขอคาเฟ่ในชุมโค",
+    "มีสถานที่ท่องเที่ยวในสะพลีไหม",
+    "ขอที่พักใกล้ทะเล บางสน",
+    "ร้านซ่อมรถแถวปากคลอง",
+    "มีอะไรแนะนำบ้าง",
+    "ร้านข้าวมันไก่เจ๊หน่อย",
+    "สวัสดีครับ",
+]
+
+
+async def _run_turns(rounds: int, lat, lng):
+    timings = []
+    try:
+        for _ in range(rounds):
+            for q in QUERIES:
+                chatbot._INTENT_CACHE.clear()
+                start = time.perf_counter()
+                await chatbot.get_answer_async(q, user_lat=lat, user_lng=lng)
+                timings.append((time.perf_counter() - start) * 1000.0)
+    finally:
+        # asyncio.run แต่ละครั้งสร้าง loop ใหม่: ปิด pool ของ loop นี้ก่อนมันจบ
+        await db_async.close_pool()
+    return timings
+
+
+def _measure(rounds: int, llm_ms: float, db_ms: float, lat, lng):
+    chatbot.model = StubModel(latency=llm_ms / 1000.0)
+    names = ["search_places", "search_places_nearby", "search_places_multi"]
+    orig = {name: getattr(db_async, name) for name in names}
+    wrapped = {name: CountingSearch(fn, db_ms / 1000.0) for name, fn in orig.items()}
+    for name, fn in wrapped.items():
+        setattr(db_async, name, fn)
+    try:
+        timings = asyncio.run(_run_turns(rounds, lat, lng))
+    finally:
+        for name, fn in orig.items():
+            setattr(db_async, name, fn)
+
+    turns = len(timings)
+    return timings, chatbot.model.calls / turns, sum(w.calls for w in wrapped.values()) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="Postgres DSN (ไม่ใส่ = PlaceCatalog + หน่วงเวลาจำลอง)")
+    parser.add_argument("--llm-ms", type=float, default=600.0, help="latency จำลองของ LLM ต่อ call")
+    parser.add_argument("--db-ms", type=float, default=15.0, help="latency จำลองต่อ query (โหมดไม่มี --dsn)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--nearby", action="store_true", help="ส่งพิกัดผู้ใช้ (ใช้ search_places_nearby)")
+    parser.add_argument("--local-intent", action="store_true",
+                        help="ให้ตัวจำแนกในเครื่องข้าม LLM ได้ตามปกติ (ค่าเริ่มต้นบังคับเรียก LLM ทุกรอบ)")
+    args = parser.parse_args()
+
+    if args.dsn:
+        import psycopg2
+
+        db._POOL = db._ConnectionPool(lambda: psycopg2.connect(args.dsn), min_size=1, max_size=5)
+        db_async._conninfo = lambda: args.dsn
+        db_ms = 0.0
+    else:
+        db.SEARCH_ENGINE = "memory"
+        place_catalog._CATALOG = place_catalog.PlaceCatalog(
+            loader=lambda: synthetic_places(2000), version_fn=lambda: 1
+        )
+        db_ms = args.db_ms
+
+    if not args.local_intent:
+        chatbot.LOCAL_INTENT_THRESHOLD = 1.01
+
+    lat, lng = (10.86, 99.40) if args.nearby else (None, None)
+
+    # เวลา CPU ล้วน (ไม่มี latency) ใช้ประกอบเป็นเวลาแบบต่อกันทีละ call ของ get_answer เดิม
+    # (โหมด --dsn เวลา query จริงรวมอยู่ในรอบนี้แล้ว)
+    cpu, _, _ = _measure(args.rounds, 0.0, 0.0, lat, lng)
+    timings, llm_per_turn, db_per_turn = _measure(args.rounds, args.llm_ms, db_ms, lat, lng)
+    chatbot.SPECULATIVE_SEARCH = False
+    try:
+        no_spec, _, _ = _measure(args.rounds, args.llm_ms, db_ms, lat, lng)
+    finally:
+        chatbot.SPECULATIVE_SEARCH = True
+
+    serial = statistics.mean(cpu) + llm_per_turn * args.llm_ms + db_per_turn * db_ms
+    print(f"turns={len(timings)} llm_calls/turn={llm_per_turn:.2f} db_queries/turn={db_per_turn:.2f}")
+    for name, values in (("async", timings), ("no-spec", no_spec)):
+        print(f"{name:<8} p50={percentile(values, 50):8.1f} ms  p95={percentile(values, 95):8.1f} ms  "
+              f"mean={statistics.mean(values):8.1f} ms")
+    print(f"serial   mean={serial:8.1f} ms (ประมาณ: CPU + ทุก call ต่อกัน)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""เวลาที่ใช้หาเวลาเดินทางไปทุกสถานที่ในผลลัพธ์: get_directions ทีละคู่แบบเดิม เทียบกับ MapsClient
+
+    python -m benchmarks.bench_maps_api
+    python -m benchmarks.bench_maps_api --results 12 --latency-ms 120 --handshake-ms 0 --rounds 20
+
+ยิงไปที่ benchmarks/mock_maps_server.py เสมอ (ไม่เสียโควตาของ Google) --handshake-ms จำลองเวลาต่อ TCP + TLS
+ของ connection ใหม่ (localhost ไม่มีต้นทุนนี้ ถ้าตั้ง 0 legacy กับ directions จะเท่ากัน)
+legacy      requests.get ใหม่ทุกคู่ ไม่มี Session / cache (maps_api.get_directions ก่อนมี MapsClient)
+directions  MapsClient.directions ทีละคู่ (Session ร่วมกัน, ไม่นับ cache): ประหยัดแค่ handshake ยังรอทีละคู่
+matrix      MapsClient.travel_times: Distance Matrix หนึ่ง request ต่อ 25 สถานที่ (ไม่นับ cache)
+cached      travel_times ซ้ำจากตำแหน่งที่ห่างไม่กี่เมตร (ได้จาก cache ของพิกัดที่ปัดแล้ว)
+"""
+import argparse
+import random
+import statistics
+import time
+
+import requests
+
+import maps_api
+from benchmarks import mock_maps_server
+from benchmarks.common import PATHEW_CENTER, percentile, synthetic_places
+
+
+def _legacy(base: str, origin, places):
+    for p in places:
+        requests.get(
+            f"{base}/directions/json?origin={origin[0]},{origin[1]}"
+            f"&destination={p['latitude']},{p['longitude']}&key=bench"
+        ).json()
+
+
+def _run(name: str, rounds: int, fn, server, before_fn=None):
+    timings = []
+    before = dict(server.counters)
+    for _ in range(rounds):
+        if before_fn:
+            before_fn()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    requests_ = sum(server.counters[k] - before[k] for k in ("directions", "distancematrix"))
+    connections = server.counters["connections"] - before["connections"]
+    print(f"{name:<11} p50={percentile(timings, 50):8.2f} ms  p95={percentile(timings, 95):8.2f} ms  "
+          f"mean={statistics.mean(timings):8.2f} ms  requests/round={requests_ / rounds:5.1f}  "
+          f"connections={connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=12, help="จำนวนสถานที่ในผลลัพธ์")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="latency จำลองของ Maps API")
+    parser.add_argument("--handshake-ms", type=float, default=60.0, help="เวลาต่อ TCP + TLS ของ connection ใหม่")
+    args = parser.parse_args()
+
+    server, base = mock_maps_server.start(latency_ms=args.latency_ms, handshake_ms=args.handshake_ms)
+    base = f"{base}/maps/api"
+    places = [p for p in synthetic_places(args.results * 2) if p["latitude"] is not None][:args.results]
+    origin = PATHEW_CENTER
+    print(f"results={len(places)} rounds={args.rounds} latency={args.latency_ms:.0f} ms "
+          f"handshake={args.handshake_ms:.0f} ms")
+
+    client = maps_api.MapsClient(api_key="bench", base_url=base)
+    _run("legacy", args.rounds, lambda: _legacy(base, origin, places), server)
+    _run("directions", args.rounds,
+         lambda: [client.directions(origin, (p["latitude"], p["longitude"])) for p in places],
+         server, client.clear_cache)
+    _run("matrix", args.rounds, lambda: client.travel_times(origin, places), server, client.clear_cache)
+
+    rnd = random.Random(1)
+    client.travel_times(origin, places)
+    _run("cached", args.rounds, lambda: client.travel_times(
+        (origin[0] + rnd.uniform(-2e-5, 2e-5), origin[1] + rnd.uniform(-2e-5, 2e-5)), places), server)
+    print(f"client: {client.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
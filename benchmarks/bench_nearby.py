@@ -0,0 +1,138 @@
+"""เทียบการค้นหาแบบใกล้ๆ: สแกนทุกแถวพร้อม acos สองครั้ง (แบบ SQL เดิม) กับ GridIndex
+ที่ 1k / 10k / 100k สถานที่สังเคราะห์
+
+    python -m benchmarks.bench_nearby
+    python -m benchmarks.bench_nearby --dsn "postgresql://localhost/pathew_bench"
+
+ถ้าให้ --dsn จะสร้าง temp table แล้วเทียบ SQL เดิมกับ db._nearby_sql (bounding box) ด้วย
+"""
+import argparse
+import random
+
+from benchmarks.common import PATHEW_CENTER, synthetic_places, timed
+from spatial_index import GridIndex, great_circle_km
+
+SCALES = [1_000, 10_000, 100_000]
+WITHIN_KM = 5.0
+K = 30
+
+LEGACY_SQL = """
+SELECT
+   {fields},
+   6371 * acos(
+       cos(radians(%(lat)s)) * cos(radians(latitude)) *
+       cos(radians(longitude) - radians(%(lng)s)) +
+       sin(radians(%(lat)s)) * sin(radians(latitude))
+   ) AS distance_km
+FROM bench_places
+WHERE (latitude IS NOT NULL AND longitude IS NOT NULL)
+  AND (
+      6371 * acos(
+           cos(radians(%(lat)s)) * cos(radians(latitude)) *
+           cos(radians(longitude) - radians(%(lng)s)) +
+           sin(radians(%(lat)s)) * sin(radians(latitude))
+      )
+  ) <= %(within)s
+ORDER BY distance_km ASC
+LIMIT %(lim)s;
+"""
+
+
+def _legacy_scan(points, lat, lng):
+    hits = []
+    for key, plat, plng in points:
+        # SQL เดิมคำนวณ acos ทั้งใน SELECT และ WHERE
+        if great_circle_km(lat, lng, plat, plng) <= WITHIN_KM:
+            hits.append((great_circle_km(lat, lng, plat, plng), key))
+    hits.sort(key=lambda h: h[0])
+    return hits[:K]
+
+
+def _queries(n: int, seed: int = 11):
+    rnd = random.Random(seed)
+    return [
+        (PATHEW_CENTER[0] + rnd.uniform(-0.1, 0.1), PATHEW_CENTER[1] + rnd.uniform(-0.1, 0.1))
+        for _ in range(n)
+    ]
+
+
+def bench_in_process():
+    print(f"{'places':>8} {'scan ms':>10} {'grid within ms':>15} {'grid kNN ms':>12}")
+    for n in SCALES:
+        rows = synthetic_places(n)
+        points = [(r["id"], r["latitude"], r["longitude"]) for r in rows if r["latitude"] is not None]
+        grid = GridIndex(points)
+        queries = _queries(20)
+
+        for lat, lng in queries[:3]:
+            expected = [k for _, k in _legacy_scan(points, lat, lng)]
+            assert [k for _, k in grid.within(lat, lng, WITHIN_KM)[:K]] == expected
+
+        scan = timed(lambda: [_legacy_scan(points, la, ln) for la, ln in queries]) / len(queries)
+        within = timed(lambda: [grid.within(la, ln, WITHIN_KM)[:K] for la, ln in queries]) / len(queries)
+        knn = timed(lambda: [grid.nearest(la, ln, K) for la, ln in queries]) / len(queries)
+        print(f"{n:>8} {scan:>10.3f} {within:>15.3f} {knn:>12.3f}")
+
+
+def bench_sql(dsn: str):
+    import psycopg2
+    import psycopg2.extras
+
+    import db
+
+    fields = "id, name, tambon, category, description, highlight, latitude, longitude, image_url"
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    print(f"{'places':>8} {'legacy ms':>10} {'bbox ms':>10}")
+    with conn.cursor() as cur:
+        for n in SCALES:
+            cur.execute("DROP TABLE IF EXISTS bench_places;")
+            cur.execute(
+                "CREATE TEMP TABLE bench_places (id int, name text, tambon text, category text, "
+                "description text, highlight text, latitude double precision, "
+                "longitude double precision, image_url text);"
+            )
+            psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO bench_places VALUES %s",
+                [
+                    (r["id"], r["name"], r["tambon"], r["category"], r["description"], r["highlight"],
+                     r["latitude"], r["longitude"], r["image_url"])
+                    for r in synthetic_places(n)
+                ],
+                page_size=5000,
+            )
+            cur.execute("CREATE INDEX ON bench_places (latitude, longitude);")
+            cur.execute("ANALYZE bench_places;")
+
+            new_sql = db._nearby_sql(fields, "TRUE", table="bench_places")
+            queries = _queries(20)
+
+            def run(sql, bbox):
+                for lat, lng in queries:
+                    params = {"lat": lat, "lng": lng, "within": WITHIN_KM, "lim": K,
+                              "cat": None, "tmb": None, "cat_like": None, "tmb_like": None}
+                    if bbox:
+                        lat_min, lat_max, lng_min, lng_max = db.bounding_box(lat, lng, WITHIN_KM)
+                        params.update(lat_min=lat_min, lat_max=lat_max, lng_min=lng_min, lng_max=lng_max)
+                    cur.execute(sql, params)
+                    cur.fetchall()
+
+            legacy = timed(lambda: run(LEGACY_SQL.format(fields=fields), False)) / len(queries)
+            bbox = timed(lambda: run(new_sql, True)) / len(queries)
+            print(f"{n:>8} {legacy:>10.3f} {bbox:>10.3f}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="Postgres DSN สำหรับเทียบฝั่ง SQL (ไม่ใส่ = เทียบเฉพาะในหน่วยความจำ)")
+    args = parser.parse_args()
+
+    bench_in_process()
+    if args.dsn:
+        bench_sql(args.dsn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Microbenchmark ของ chatbot._rank แบบ batch (rapidfuzz.process.cdist + NumPy)
+เทียบกับลูปทีละแถวแบบเดิม ที่ 30 / 300 / 3000 candidate และตรวจว่าผลลัพธ์เหมือนกันทุกตัว
+
+    python -m benchmarks.bench_rank
+"""
+import copy
+from typing import Dict, List, Optional
+
+from rapidfuzz import fuzz
+
+import chatbot
+from benchmarks.common import synthetic_places, timed
+from chatbot import _category_matches_intent, _clamp01, _norm, _normalize_loose_text
+
+SIZES = [30, 300, 3000]
+QUERIES = [
+    ("ก๋วยเตี๋ยวเรือ", "ร้านอาหาร", None),
+    ("คาเฟ่วิวทะเล ชุมโค", "คาเฟ่", "ชุมโค"),
+    ("หาดทุ่งวัวแล่น", None, None),
+    ("", None, None),
+]
+
+
+# ลูปเดิมก่อนเปลี่ยนเป็น batch เก็บไว้เป็นค่าอ้างอิง
+def _rank_reference(
+    rows: List[Dict],
+    query_text: str,
+    prefer_category: Optional[str],
+    prefer_tambon: Optional[str],
+    top_k: int = 12
+) -> List[Dict]:
+    if not rows:
+        return []
+
+    q = _norm(query_text)
+    q_norm = _normalize_loose_text(query_text)
+    scored = []
+
+    # ------------------------------
+    # Weighted Scoring Configuration
+    # น้ำหนักรวม = 1.00
+    # ------------------------------
+    W_NAME_SIM = 0.40
+    W_BLOB_SIM = 0.25
+    W_EXACT_NAME = 0.15
+    W_CATEGORY = 0.10
+    W_TAMBON = 0.06
+    W_DETAIL = 0.04
+
+    for r in rows:
+        name = str(r.get("name") or "")
+        cat = str(r.get("category") or "")
+        tmb = str(r.get("tambon") or "")
+        desc = str(r.get("description") or "")
+        hi = str(r.get("highlight") or "")
+
+        name_norm = _normalize_loose_text(name)
+        blob = " ".join([name, cat, tmb, desc, hi]).lower()
+        blob_norm = _normalize_loose_text(blob)
+
+        # 1) similarity score (0-1)
+        name_similarity = 0.0
+        blob_similarity = 0.0
+
+        if q:
+            name_similarity = fuzz.partial_ratio(q, name.lower()) / 100.0
+            blob_similarity = fuzz.partial_ratio(q, blob) / 100.0
+
+        if q_norm and name_norm:
+            loose_name_similarity = fuzz.ratio(q_norm, name_norm) / 100.0
+            name_similarity = max(name_similarity, loose_name_similarity)
+
+        if q_norm and blob_norm:
+            loose_blob_similarity = fuzz.partial_ratio(q_norm, blob_norm) / 100.0
+            blob_similarity = max(blob_similarity, loose_blob_similarity)
+
+        name_similarity = _clamp01(name_similarity)
+        blob_similarity = _clamp01(blob_similarity)
+
+        # 2) exact / near exact score (0-1)
+        exact_name_score = 0.0
+        if q_norm and name_norm:
+            if q_norm == name_norm:
+                exact_name_score = 1.0
+            else:
+                name_ratio = fuzz.ratio(q_norm, name_norm)
+                if name_ratio >= 92:
+                    exact_name_score = 0.85
+                elif name_ratio >= 88:
+                    exact_name_score = 0.70
+                elif q_norm in name_norm or name_norm in q_norm:
+                    exact_name_score = 0.50
+
+        exact_name_score = _clamp01(exact_name_score)
+
+        # 3) category match (0-1)
+        category_score = 0.0
+        if prefer_category:
+            category_score = 1.0 if _category_matches_intent(cat, prefer_category) else 0.0
+
+        # 4) tambon match (0-1)
+        tambon_score = 0.0
+        if prefer_tambon:
+            tambon_score = 1.0 if _norm(prefer_tambon) in tmb.lower() else 0.0
+
+        # 5) detail completeness (0-1)
+        detail_count = 0
+        if hi:
+            detail_count += 1
+        if desc:
+            detail_count += 1
+        if r.get("image_url"):
+            detail_count += 1
+
+        detail_score = detail_count / 3.0
+        detail_score = _clamp01(detail_score)
+
+        # 6) weighted score
+        total_score = (
+            (name_similarity * W_NAME_SIM) +
+            (blob_similarity * W_BLOB_SIM) +
+            (exact_name_score * W_EXACT_NAME) +
+            (category_score * W_CATEGORY) +
+            (tambon_score * W_TAMBON) +
+            (detail_score * W_DETAIL)
+        )
+
+        r["_score"] = round(total_score, 4)
+        scored.append((total_score, r))
+
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [r for _, r in scored[:top_k]]
+
+
+def main():
+    print(f"{'rows':>6} {'loop ms':>9} {'batch ms':>9} {'speedup':>8}")
+    for n in SIZES:
+        rows = synthetic_places(n)
+        loop_ms = batch_ms = 0.0
+        for q, cat, tmb in QUERIES:
+            a = copy.deepcopy(rows)
+            b = copy.deepcopy(rows)
+            expected = _rank_reference(a, q, cat, tmb, top_k=n)
+            got = chatbot._rank(b, q, cat, tmb, top_k=n)
+            assert [(r["id"], r["_score"]) for r in got] == [(r["id"], r["_score"]) for r in expected]
+
+            repeat = max(1, 3000 // n)
+            loop_ms += timed(lambda: _rank_reference(a, q, cat, tmb), repeat)
+            batch_ms += timed(lambda: chatbot._rank(b, q, cat, tmb), repeat)
+
+        loop_ms /= len(QUERIES)
+        batch_ms /= len(QUERIES)
+        print(f"{n:>6} {loop_ms:>9.3f} {batch_ms:>9.3f} {loop_ms / batch_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
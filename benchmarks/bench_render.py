@@ -0,0 +1,87 @@
+"""เวลาที่ใช้เตรียมการ์ดผลลัพธ์ต่อหนึ่ง rerun ของ app.py: คำนวณใหม่ทุก rerun เทียบกับ view model (place_view.py)
+
+    python -m benchmarks.bench_render
+    python -m benchmarks.bench_render --cards 30 --reruns 500
+    python -m benchmarks.bench_render --app          # รัน app.py ทั้งไฟล์ผ่าน streamlit AppTest ด้วย
+
+per-rerun   build_place_view ทุกการ์ดทุก rerun (แบบเดิมที่เรียก get_best_image_candidates ใน _render_place_card)
+cache_data  build_place_view ห่อด้วย st.cache_data ทุก rerun (ค่า hash อาร์กิวเมนต์ + pickle สำเนาผล)
+stored      อ่าน view model ที่เก็บไว้ใน session_state (สิ่งที่ app.py ทำระหว่าง rerun)
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import streamlit as st
+
+import place_view
+from benchmarks.common import percentile, synthetic_places
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def card_places(n: int):
+    """สถานที่ที่มีรูปหลายรูปแบบในฐานข้อมูลจริง: ลิงก์ Google Drive หลายแบบใน image_urls (JSON)"""
+    rows = synthetic_places(n)
+    for r in rows:
+        i = r["id"]
+        r["image_urls"] = json.dumps([
+            f"https://drive.google.com/file/d/1AbC{i:06d}xyz_-{k}/view?usp=sharing" if k % 2 == 0
+            else f"https://drive.google.com/open?id=1XyZ{i:06d}abc{k}"
+            for k in range(4)
+        ])
+        r["distance_km"] = 1.5 + i / 10.0
+    return rows
+
+
+def _time(fn, reruns: int):
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return timings
+
+
+def _report(name: str, timings):
+    print(f"{name:<11} p50={percentile(timings, 50):8.3f} ms  p95={percentile(timings, 95):8.3f} ms  "
+          f"mean={statistics.mean(timings):8.3f} ms")
+
+
+def _run_app(places, reruns: int):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.session_state["last_results"] = places
+    at.run()
+    timings = _time(at.run, reruns)
+    _report("app rerun", timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=30, help="จำนวนการ์ดผลลัพธ์")
+    parser.add_argument("--reruns", type=int, default=300)
+    parser.add_argument("--app", action="store_true", help="จับเวลา rerun ของ app.py ทั้งไฟล์ด้วย (AppTest)")
+    args = parser.parse_args()
+
+    places = card_places(args.cards)
+    print(f"cards={len(places)} reruns={args.reruns}")
+
+    _report("per-rerun", _time(lambda: [place_view.build_place_view(p) for p in places], args.reruns))
+
+    cached_view = st.cache_data(show_spinner=False)(place_view.build_place_view)
+    [cached_view(p) for p in places]
+    _report("cache_data", _time(lambda: [cached_view(p) for p in places], args.reruns))
+
+    stored = place_view.place_views(places)
+    _report("stored", _time(lambda: [v["images"] for v in stored], args.reruns))
+
+    if args.app:
+        _run_app(places, max(1, args.reruns // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""เวลาหาระยะทางตามถนนจากผู้ใช้ไปผลค้นหาใกล้ฉันทั้งชุดด้วย road_graph.py บนกราฟถนนสังเคราะห์
+
+    python -m benchmarks.bench_road_graph
+    python -m benchmarks.bench_road_graph --spacing-m 120 --results 30 --queries 200
+    python -m benchmarks.bench_road_graph --graph data/pathew_roads.npz   # กราฟจริงจาก `road_graph.py build`
+
+กราฟสังเคราะห์เป็นตารางถนนรอบอำเภอปะทิว ระยะห่าง --spacing-m เมตร ตัดถนนออกบางช่วงและมี oneway บางเส้น
+(ทางอ้อมจึงยาวกว่าเส้นตรงแบบถนนจริง) เขียนผ่าน road_graph.write_graph แล้วโหลดด้วย RoadGraph.load
+per-place  Dijkstra หนึ่งรอบต่อสถานที่ (เทียบเท่าถาม Directions ทีละสถานที่ แต่ไม่มี network)
+one-pass   RoadGraph.distances_km: Dijkstra รอบเดียวที่หยุดเมื่อเจอสถานที่ครบทั้งชุด
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import road_graph
+from benchmarks.common import PATHEW_CENTER, percentile, synthetic_places
+from spatial_index import great_circle_km
+
+
+def synthetic_grid(path: str, spacing_m: float, half_deg: float, drop: float, oneway: float, seed: int = 5):
+    rnd = np.random.default_rng(seed)
+    step_lat = spacing_m / 111_320.0
+    step_lng = step_lat / math.cos(math.radians(PATHEW_CENTER[0]))
+    rows = int(2 * half_deg / step_lat) + 1
+    cols = int(2 * half_deg / step_lng) + 1
+    r, c = np.divmod(np.arange(rows * cols), cols)
+    # ขยับ node เล็กน้อยให้ถนนไม่ตรงเป๊ะ
+    lat = PATHEW_CENTER[0] - half_deg + r * step_lat + rnd.uniform(-0.2, 0.2, r.size) * step_lat
+    lng = PATHEW_CENTER[1] - half_deg + c * step_lng + rnd.uniform(-0.2, 0.2, c.size) * step_lng
+
+    ids = np.arange(rows * cols).reshape(rows, cols)
+    u = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    v = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    keep = rnd.random(u.size) >= drop
+    u, v = u[keep], v[keep]
+    two_way = rnd.random(u.size) >= oneway
+    return road_graph.write_graph(path, lat, lng, np.concatenate([u, v[two_way]]), np.concatenate([v, u[two_way]]))
+
+
+def _queries(places, n: int, results: int, within_km: float, seed: int = 11):
+    """(origin, ปลายทาง results แห่งที่ใกล้ที่สุดในรัศมี within_km) แบบเดียวกับ search_places_nearby"""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        o = rnd.choice(places)
+        origin = (o["latitude"] + rnd.uniform(-0.01, 0.01), o["longitude"] + rnd.uniform(-0.01, 0.01))
+        near = sorted(
+            (great_circle_km(origin[0], origin[1], p["latitude"], p["longitude"]), p) for p in places
+        )
+        near = [p for d, p in near if d <= within_km][:results]
+        out.append((origin, [(p["latitude"], p["longitude"]) for p in near]))
+    return out
+
+
+def _report(name: str, timings):
+    print(f"{name:<9} p50={percentile(timings, 50):8.2f} ms  p95={percentile(timings, 95):8.2f} ms  "
+          f"mean={statistics.mean(timings):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", default="", help="ไฟล์กราฟจริง (ว่าง = สร้างกราฟสังเคราะห์)")
+    parser.add_argument("--spacing-m", type=float, default=150.0)
+    parser.add_argument("--drop", type=float, default=0.15, help="สัดส่วนช่วงถนนที่ตัดออก")
+    parser.add_argument("--oneway", type=float, default=0.05, help="สัดส่วนถนนที่เป็น oneway")
+    parser.add_argument("--places", type=int, default=1500)
+    parser.add_argument("--results", type=int, default=30, help="จำนวนสถานที่ต่อคำถาม (limit ของ search_places_nearby)")
+    parser.add_argument("--within-km", type=float, default=20.0)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.graph
+        if not path:
+            path = os.path.join(tmp, "grid.npz")
+            start = time.perf_counter()
+            info = synthetic_grid(path, args.spacing_m, 0.17, args.drop, args.oneway)
+            print(f"synthetic grid: {info['nodes']} nodes, {info['edges']} edges, {info['bytes'] / 1e6:.2f} MB "
+                  f"(built in {time.perf_counter() - start:.1f}s)")
+        start = time.perf_counter()
+        graph = road_graph.RoadGraph.load(path)
+        print(f"load {time.perf_counter() - start:.2f}s  nodes={len(graph)} edges={graph.edge_count}")
+
+    places = [p for p in synthetic_places(args.places) if p["latitude"] is not None]
+    queries = _queries(places, args.queries, args.results, args.within_km)
+    print(f"queries={len(queries)} results/query={statistics.mean(len(d) for _, d in queries):.1f} "
+          f"within={args.within_km:.0f} km")
+
+    per_place, ratios = [], []
+    for origin, dests in queries[: max(1, len(queries) // 5)]:
+        start = time.perf_counter()
+        for d in dests:
+            graph.distances_km(origin, [d])
+        per_place.append((time.perf_counter() - start) * 1000.0)
+    _report("per-place", per_place)
+
+    one_pass = []
+    graph_stats = graph.stats()
+    for origin, dests in queries:
+        start = time.perf_counter()
+        distances = graph.distances_km(origin, dests)
+        one_pass.append((time.perf_counter() - start) * 1000.0)
+        for (dlat, dlng), road in zip(dests, distances):
+            straight = great_circle_km(origin[0], origin[1], dlat, dlng)
+            if road is not None and straight > 0.5:
+                ratios.append(road / straight)
+    _report("one-pass", one_pass)
+
+    s = graph.stats()
+    settled = (s["settled"] - graph_stats["settled"]) / len(queries)
+    print(f"settled nodes/query={settled:.0f}  unreachable={s['unreachable'] - graph_stats['unreachable']}  "
+          f"road/straight p50={percentile(ratios, 50):.2f} p95={percentile(ratios, 95):.2f}")
+
+
+if __name__ == "__main__":
+    main()
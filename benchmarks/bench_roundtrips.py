@@ -0,0 +1,50 @@
+"""นับ round-trip ไป Postgres ต่อหนึ่งรอบ get_answer ก่อน/หลังเปิด schema cache
+
+ใช้ connection จำลองที่คืนผลว่าง (กรณีแย่สุด: เดินครบทุก fallback) และ LLM จำลอง
+จึงรันได้โดยไม่ต้องมีฐานข้อมูลจริง
+
+    python -m benchmarks.bench_roundtrips
+"""
+import chatbot
+import db
+from benchmarks.common import FakeConnection, StubModel
+
+QUERIES = [
+    "อยากกินก๋วยเตี๋ยว",
+    "ขอคาเฟ่ในชุมโค",
+    "มีสถานที่ท่องเที่ยวในสะพลีไหม",
+    "น้ำมันหมด",
+    "ร้านข้าวมันไก่เจ๊หน่อย",
+]
+
+
+def _run(schema_cache: bool) -> float:
+    db.close_pool()
+    db._POOL = db._ConnectionPool(FakeConnection, min_size=1, max_size=2)
+    db.invalidate_schema_cache()
+    db._schema_cache_ttl = (lambda: 300.0) if schema_cache else (lambda: 0.0)
+    db._result_cache = lambda: None  # นับ round-trip ของทุกรอบจริงๆ ไม่ให้ cache ผลค้นหาตอบแทน
+    db.reset_query_stats()
+
+    for q in QUERIES:
+        chatbot.get_answer(q)
+
+    stats = db.query_stats()
+    per_turn = stats["queries"] / len(QUERIES)
+    label = "schema cache" if schema_cache else "per-query probes"
+    print(
+        f"{label:<18} total={stats['queries']:>3} schema={stats['schema_queries']:>3} "
+        f"round-trips/turn={per_turn:.2f}"
+    )
+    return per_turn
+
+
+def main():
+    chatbot.model = StubModel(guess=chatbot._local_guess_category)
+    before = _run(schema_cache=False)
+    after = _run(schema_cache=True)
+    print(f"saved {before - after:.2f} round-trips per turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""recall และ latency ของการค้นด้วยคีย์เวิร์ดเดิม เทียบกับดัชนีเวกเตอร์ (embeddings.py) และแบบผสม
+
+    python -m benchmarks.bench_semantic
+    python -m benchmarks.bench_semantic --places 50000 --dtype float16
+    python -m benchmarks.bench_semantic --encoder paraphrase-multilingual-MiniLM-L12-v2
+    python -m benchmarks.bench_semantic --queries data/semantic_queries.jsonl
+
+ค่าเริ่มต้นใช้ข้อมูลสังเคราะห์และคำถามที่เรียกชื่อสถานที่ต่างไปจากในฐานข้อมูล (สลับคำนำหน้า
+เช่น "ครัวป้าแดง 12" หา "ร้านป้าแดง 12" และไม่เว้นวรรค) ซึ่ง ILIKE หาไม่เจอ
+--queries รับ JSON lines {"query": "...", "relevant_ids": [..]} สำหรับวัดกับข้อมูลจริงใน PlaceCatalog
+(ต้องมี [postgres] ใน secrets) ส่วน encoder "hashing" ไม่เข้าใจความหมาย ใช้โมเดลจริงเพื่อวัดคำพ้อง
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+
+import chatbot
+import db
+import embeddings
+import place_catalog
+from benchmarks.common import NAME_PREFIX, percentile, synthetic_places
+
+K = 10
+
+
+def synthetic_queries(rows, n: int, seed: int = 5):
+    rnd = random.Random(seed)
+    out = []
+    for r in rnd.sample(rows, min(n, len(rows))):
+        name = r["name"]
+        prefix = next((p for p in NAME_PREFIX if name.startswith(p)), "")
+        other = rnd.choice([p for p in NAME_PREFIX if p != prefix])
+        rest = name[len(prefix):]
+        query = other + (rest.replace(" ", "") if rnd.random() < 0.5 else rest)
+        out.append({"query": query, "relevant_ids": [r["id"]]})
+    return out
+
+
+def _keyword_rows(q: str):
+    return db.search_places(keywords_any=chatbot._extract_keywords(q, None), limit=chatbot.SEARCH_LIMIT)
+
+
+def _semantic_rows(index, q: str):
+    return db.fetch_places_by_ids([i for i, _ in index.search(q, K)])
+
+
+def _hybrid_rows(index, q: str):
+    rows = _keyword_rows(q)
+    seen = {r.get("id") for r in rows}
+    return rows + [r for r in _semantic_rows(index, q) if r.get("id") not in seen]
+
+
+def _run(name, queries, fetch, rank: bool):
+    hits, timings = 0, []
+    for item in queries:
+        start = time.perf_counter()
+        rows = fetch(item["query"])
+        if rank:
+            rows = chatbot._rank(rows, item["query"], None, None, top_k=K)
+        timings.append((time.perf_counter() - start) * 1000.0)
+        got = {r.get("id") for r in rows[:K]}
+        hits += bool(got & set(item["relevant_ids"]))
+    print(f"{name:<10} recall@{K}={hits / len(queries):6.3f}  p50={percentile(timings, 50):7.2f} ms  "
+          f"p95={percentile(timings, 95):7.2f} ms  mean={statistics.mean(timings):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=10000, help="จำนวนสถานที่สังเคราะห์")
+    parser.add_argument("--queries", help="ไฟล์คำถาม JSON lines (ไม่ใส่ = สร้างจากข้อมูลสังเคราะห์)")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--encoder", default="hashing", help='"hashing" หรือชื่อโมเดล sentence-transformers')
+    parser.add_argument("--dtype", choices=["int8", "float16"], default="int8")
+    args = parser.parse_args()
+
+    db.SEARCH_ENGINE = "memory"
+    if args.queries:
+        catalog = place_catalog.PlaceCatalog()
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        rows = synthetic_places(args.places)
+        catalog = place_catalog.PlaceCatalog(loader=lambda: rows, version_fn=lambda: 1)
+        queries = synthetic_queries(rows, args.n_queries)
+    catalog.load()
+    place_catalog._CATALOG = catalog
+    rows = catalog.search_places(limit=None)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        meta = embeddings.build_index(rows, out_dir, embeddings.load_encoder(args.encoder), args.dtype)
+        build_s = time.perf_counter() - start
+        index = embeddings.EmbeddingIndex(out_dir)
+        print(f"index: {meta['count']} x {meta['dim']} {meta['dtype']} "
+              f"({index.vectors.nbytes / 1e6:.1f} MB, built in {build_s:.1f}s)  queries={len(queries)}")
+
+        embeddings._INDEX_LOADED = True
+        embeddings._INDEX = None
+        _run("keyword", queries, _keyword_rows, rank=True)
+
+        _run("semantic", queries, lambda q: _semantic_rows(index, q), rank=False)
+
+        embeddings._INDEX = index
+        _run("hybrid", queries, lambda q: _hybrid_rows(index, q), rank=True)
+        embeddings._INDEX = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""hit ratio, byte ที่ประหยัดได้ และเวลาต่อการ์ดของ cache ภาพแผนที่ (static_maps.py) กับเซิร์ฟเวอร์จำลอง
+
+    python -m benchmarks.bench_static_maps
+    python -m benchmarks.bench_static_maps --places 200 --views 3000 --latency-ms 150
+
+จำลองการเปิดการ์ด --views ครั้งจากสถานที่ --places แห่ง (สถานที่ยอดนิยมถูกเปิดบ่อยกว่า แบบ Zipf)
+"no cache" ดึงภาพจากเซิร์ฟเวอร์ทุกครั้งแบบที่เบราว์เซอร์ทำกับ URL ของ Static Maps
+"cache" ผ่าน StaticMapCache ส่วน "offline" ดึง tile ของทุกสถานที่ก่อนแล้ววาดภาพเองโดยไม่ยิง Static Maps
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+import static_maps
+from benchmarks import mock_maps_server
+from benchmarks.common import percentile, synthetic_places
+
+
+def _views(places, n: int, seed: int = 3):
+    rnd = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(len(places))]
+    return rnd.choices(places, weights=weights, k=n)
+
+
+def _time_views(views, fn):
+    timings = []
+    for p in views:
+        start = time.perf_counter()
+        fn(p["latitude"], p["longitude"])
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return timings
+
+
+def _report(name: str, timings, server, before):
+    sent = server.counters["bytes_sent"] - before["bytes_sent"]
+    requests_ = (server.counters["staticmap"] - before["staticmap"]) + (server.counters["tiles"] - before["tiles"])
+    print(f"{name:<9} p50={percentile(timings, 50):7.2f} ms  p95={percentile(timings, 95):7.2f} ms  "
+          f"mean={statistics.mean(timings):7.2f} ms  requests={requests_}  downloaded={sent / 1e6:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=100)
+    parser.add_argument("--views", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="latency จำลองของเซิร์ฟเวอร์แผนที่")
+    args = parser.parse_args()
+
+    server, base = mock_maps_server.start(latency_ms=args.latency_ms)
+    # build_static_map_url ต้องมี key (เซิร์ฟเวอร์จำลองไม่ตรวจ)
+    static_maps.MAPS_API_KEY = static_maps.MAPS_API_KEY or "bench"
+    places = [p for p in synthetic_places(args.places) if p["latitude"] is not None]
+    views = _views(places, args.views)
+    print(f"places={len(places)} views={len(views)} latency={args.latency_ms:.0f} ms")
+
+    fetch = static_maps._http_fetcher()
+    before = dict(server.counters)
+    timings = _time_views(views, lambda lat, lng: fetch(
+        static_maps.build_static_map_url(lat, lng, base_url=f"{base}/maps/api/staticmap"), 10.0))
+    _report("no cache", timings, server, before)
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = static_maps.StaticMapCache(root, base_url=f"{base}/maps/api/staticmap")
+        before = dict(server.counters)
+        timings = _time_views(views, cache.get)
+        _report("cache", timings, server, before)
+        s = cache.stats()
+        print(f"          hit_ratio={s['hit_ratio']:.3f}  bytes_fetched={s['bytes_fetched'] / 1e6:.2f} MB  "
+              f"bytes_saved={s['bytes_saved'] / 1e6:.2f} MB")
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = static_maps.StaticMapCache(root, offline=True, tile_url=f"{base}/tiles/{{z}}/{{x}}/{{y}}.png")
+        before = dict(server.counters)
+        start = time.perf_counter()
+        for p in places:
+            cache.fetch_tiles(p["latitude"], p["longitude"])
+        warm_s = time.perf_counter() - start
+        tiles = server.counters["tiles"] - before["tiles"]
+        before = dict(server.counters)
+        timings = _time_views(views, cache.get)
+        _report("offline", timings, server, before)
+        s = cache.stats()
+        print(f"          tiles={tiles} (warm {warm_s:.1f}s)  rendered={s['offline_rendered']}  "
+              f"hit_ratio={s['hit_ratio']:.3f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
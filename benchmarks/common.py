@@ -0,0 +1,178 @@
+"""ของใช้ร่วมกันของสคริปต์ benchmark: LLM จำลอง และ connection Postgres จำลองที่นับ round-trip"""
+import asyncio
+import json
+import re
+import time
+import types
+from typing import Callable, List, Optional
+
+import psycopg2.extensions
+
+PLACES_COLUMNS = [
+    "id", "name", "tambon", "category", "description", "highlight",
+    "latitude", "longitude", "image_url", "image_urls",
+]
+
+
+class StubModel:
+    """แทน chatbot.model: ตอบ JSON แบบ deterministic และหน่วงเวลาได้ตามต้องการ"""
+
+    def __init__(self, latency: float = 0.0, guess: Optional[Callable[[str], Optional[str]]] = None):
+        self.latency = latency
+        self.guess = guess
+        self.calls = 0
+
+    def _respond(self, prompt: str):
+        if "ตอบเป็น JSON" not in prompt:
+            return types.SimpleNamespace(text="ได้เลยครับ")
+
+        m = re.search(r'ผู้ใช้: "(.*)"', prompt)
+        user_input = m.group(1) if m else ""
+        category = self.guess(user_input) if self.guess else None
+        # ตำบลที่อยู่ในคำถามตรงๆ แบบที่ LLM จริงดึงออกมาได้
+        tambon = next((t for t in TAMBONS if t in user_input), None)
+        data = {
+            "want_search": category is not None,
+            "category": category,
+            "tambon": tambon,
+            "keywords": None,
+        }
+        return types.SimpleNamespace(text=json.dumps(data, ensure_ascii=False))
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        res = self._respond(prompt)
+        if stream:
+            # แบ่งคำตอบเป็น chunk ละ 4 ตัวอักษรแบบ response ที่ stream มาจาก Gemini
+            return [types.SimpleNamespace(text=res.text[i:i + 4]) for i in range(0, len(res.text), 4)]
+        return res
+
+    async def generate_content_async(self, prompt: str, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+
+class _FakeCursor:
+    def __init__(self, conn, dict_rows: bool):
+        self._conn = conn
+        self._dict_rows = dict_rows
+        self._rows: List = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self._conn.executed.append(sql)
+        if "information_schema.columns" in sql:
+            if "column_name = %s" in sql:
+                self._rows = [(1,)] if params and params[1] in PLACES_COLUMNS else []
+            else:
+                self._rows = [(c,) for c in PLACES_COLUMNS]
+        else:
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeConnection:
+    """connection จำลองที่ไม่คืนสถานที่ใดเลย (ทำให้เดินครบทุก fallback) และจดทุก SQL ที่ถูกยิง"""
+
+    executed: List[str] = []
+
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.info = types.SimpleNamespace(
+            transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        )
+
+    def cursor(self, cursor_factory=None, **kwargs):
+        return _FakeCursor(self, dict_rows=cursor_factory is not None)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+# ---------- ข้อมูลสังเคราะห์ ----------
+PATHEW_CENTER = (10.86, 99.40)
+TAMBONS = ["บางสน", "ทะเลทรัพย์", "สะพลี", "ชุมโค", "ดอนยาง", "ปากคลอง", "เขาไชยราช"]
+CATEGORIES = [
+    "ร้านอาหาร", "คาเฟ่", "ที่พัก", "สถานที่ท่องเที่ยว", "ปั๊มน้ำมัน", "วัด", "ตลาด",
+    "ร้านซ่อมรถ", "ร้านตัดผม", "ร้านขายยา", "ร้านสะดวกซื้อ", "ธนาคาร", "ร้านอาหาร, อาหารทะเล",
+    "คาเฟ่, ร้านกาแฟ", "ที่พัก, รีสอร์ท", "สถานที่ท่องเที่ยว, ชายหาด",
+]
+NAME_PREFIX = ["ร้าน", "ครัว", "บ้าน", "คาเฟ่", "หาด", "วัด", "ตลาด", "ปั๊ม", "รีสอร์ท", "อู่"]
+NAME_WORDS = [
+    "ทุ่งวัวแล่น", "ปะทิว", "ชุมโค", "ป้าแดง", "ลุงเอก", "ทะเลสวย", "ก๋วยเตี๋ยวเรือ", "ซีฟู้ด",
+    "ริมหาด", "สะพลี", "บางสน", "ข้าวมันไก่", "กาแฟสด", "ชาไทย", "ดอนยาง", "เขาไชยราช",
+]
+DESC_WORDS = [
+    "อาหารทะเลสด", "บรรยากาศดี", "วิวทะเล", "ราคาไม่แพง", "ที่จอดรถกว้าง", "เปิดทุกวัน",
+    "เหมาะกับครอบครัว", "ถ่ายรูปสวย", "ก๋วยเตี๋ยว", "กาแฟ", "ของหวาน", "ห้องพักสะอาด",
+]
+
+
+def synthetic_places(n: int, seed: int = 7, spread_deg: float = 0.15) -> List[dict]:
+    """แถวของ places ปลอม n แถว กระจายรอบอำเภอปะทิว (คอลัมน์ตรงกับผลของ db.search_places)"""
+    import random
+
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(1, n + 1):
+        name = f"{rnd.choice(NAME_PREFIX)}{rnd.choice(NAME_WORDS)} {i}"
+        has_coords = rnd.random() > 0.03
+        rows.append({
+            "id": i,
+            "name": name,
+            "tambon": rnd.choice(TAMBONS),
+            "category": rnd.choice(CATEGORIES),
+            "description": " ".join(rnd.sample(DESC_WORDS, 3)) if rnd.random() > 0.2 else None,
+            "highlight": rnd.choice(DESC_WORDS) if rnd.random() > 0.4 else None,
+            "latitude": PATHEW_CENTER[0] + rnd.uniform(-spread_deg, spread_deg) if has_coords else None,
+            "longitude": PATHEW_CENTER[1] + rnd.uniform(-spread_deg, spread_deg) if has_coords else None,
+            "image_url": f"https://example.com/{i}.jpg" if rnd.random() > 0.5 else None,
+            "image_urls": "[]",
+        })
+    return rows
+
+
+class CountingSearch:
+    """ห่อ db_async.search_* ให้นับจำนวน query และหน่วงเวลาแบบ round-trip จำลอง"""
+
+    def __init__(self, fn, delay: float):
+        self.fn = fn
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return await self.fn(*args, **kwargs)
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def timed(fn, repeat: int = 1) -> float:
+    """เวลาเฉลี่ยต่อครั้งเป็นมิลลิวินาที"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000.0 / repeat
@@ -0,0 +1,77 @@
+"""ประเมินตัวจำแนกเจตนาในเครื่อง (chatbot._local_intent) บนไฟล์คำถามที่ติดป้ายหมวดไว้
+
+แต่ละบรรทัดของไฟล์เป็น {"query": ..., "category": ... | null, "tambon": ... | null}
+รายงานที่แต่ละ threshold: สัดส่วนรอบที่ไม่ต้องเรียก LLM, ความแม่นของหมวด/ตำบลในรอบที่ข้าม LLM
+
+    python -m benchmarks.eval_local_intent
+    python -m benchmarks.eval_local_intent --file my_labels.jsonl --with-llm
+
+--with-llm จะเรียก Gemini จริงในรอบที่ไม่ข้าม เพื่อเทียบความแม่นรวมของทั้ง pipeline
+"""
+import argparse
+import json
+import os
+
+import chatbot
+
+DEFAULT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_queries.jsonl")
+THRESHOLDS = [0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 1.0]
+
+
+def _load(path: str):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _final_category(query: str, llm: dict):
+    """หมวดที่ get_answer ใช้จริงเมื่อเรียก LLM (หมวดจากพจนานุกรมทับผล LLM ถ้ามี)"""
+    guessed = (
+        chatbot._forced_category_fallback(query)
+        or chatbot._intent_from_keywords(query)
+        or chatbot._local_guess_category(query)
+    )
+    if guessed:
+        return guessed
+    return llm.get("category") if llm.get("want_search") else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=DEFAULT_FILE)
+    parser.add_argument("--with-llm", action="store_true")
+    args = parser.parse_args()
+
+    rows = _load(args.file)
+    predictions = []
+    for row in rows:
+        cat, conf = chatbot._local_intent(row["query"])
+        llm = chatbot._understand_llm(row["query"], "")[0] if args.with_llm else None
+        predictions.append((row, cat, conf, llm))
+
+    print(f"{len(rows)} labeled queries from {args.file}")
+    header = f"{'threshold':>9} {'llm saved':>10} {'skip cat acc':>13} {'skip tambon acc':>16}"
+    if args.with_llm:
+        header += f" {'overall cat acc':>16}"
+    print(header)
+
+    for th in THRESHOLDS:
+        skipped = [(row, cat) for row, cat, conf, _ in predictions if cat and conf >= th]
+        cat_ok = sum(1 for row, cat in skipped if cat == row.get("category"))
+        tmb_ok = sum(1 for row, _ in skipped if chatbot._local_guess_tambon(row["query"]) == row.get("tambon"))
+        n_skip = len(skipped)
+        line = (
+            f"{th:>9.2f} {n_skip / len(rows):>9.0%} "
+            f"{(cat_ok / n_skip if n_skip else 0):>12.0%} {(tmb_ok / n_skip if n_skip else 0):>15.0%}"
+        )
+
+        if args.with_llm:
+            overall_ok = 0
+            for row, cat, conf, llm in predictions:
+                final = cat if (cat and conf >= th) else _final_category(row["query"], llm)
+                overall_ok += final == row.get("category")
+            line += f" {overall_ok / len(rows):>15.0%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
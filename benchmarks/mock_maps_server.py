@@ -0,0 +1,175 @@
+"""เซิร์ฟเวอร์ HTTP ในเครื่องที่ทำตัวแทน Google Maps และ tile server (ใช้กับ static_maps.py และ maps_api.py)
+
+    python -m benchmarks.mock_maps_server --port 8765 --latency-ms 150
+    python -m benchmarks.mock_maps_server --latency-ms 80 --handshake-ms 60
+
+    STATIC_MAP_URL = "http://127.0.0.1:8765/maps/api/staticmap"
+    MAP_TILE_URL = "http://127.0.0.1:8765/tiles/{z}/{x}/{y}.png"
+    MAPS_API_BASE = "http://127.0.0.1:8765/maps/api"
+
+ตอบ PNG ขนาดตาม size= (สีขึ้นกับ center), tile 256x256 ทุก z/x/y และ JSON ของ directions / distancematrix
+ที่ระยะทางคือระยะเส้นตรง x 1.3 ความเร็ว 40 กม./ชม. (ปลายทางไกลเกิน MAX_ROUTE_KM ได้ ZERO_RESULTS
+แบบข้ามทะเล) หน่วงเวลาได้ตาม --latency-ms และ --handshake-ms เพิ่มเฉพาะ request แรกของแต่ละ connection
+(แทนการต่อ TCP + TLS ไป Google ที่ client ซึ่งไม่ใช้ connection ซ้ำต้องจ่ายทุกครั้ง)
+นับจำนวน request, connection และ byte ที่ส่งออกไว้ใน server.counters
+"""
+import argparse
+import hashlib
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+from spatial_index import great_circle_km
+
+ROAD_FACTOR = 1.3
+SPEED_KMH = 40.0
+MAX_ROUTE_KM = 500.0
+
+
+def _coord(text: str):
+    lat, lng = text.split(",")
+    return float(lat), float(lng)
+
+
+def _element(origin: str, dest: str) -> dict:
+    try:
+        (olat, olng), (dlat, dlng) = _coord(origin), _coord(dest)
+    except ValueError:
+        return {"status": "NOT_FOUND"}
+    km = great_circle_km(olat, olng, dlat, dlng)
+    if km > MAX_ROUTE_KM:
+        return {"status": "ZERO_RESULTS"}
+    meters = int(km * ROAD_FACTOR * 1000)
+    seconds = int(meters / (SPEED_KMH / 3.6))
+    return {
+        "status": "OK",
+        "distance": {"value": meters, "text": f"{meters / 1000:.1f} km"},
+        "duration": {"value": seconds, "text": f"{max(1, seconds // 60)} mins"},
+    }
+
+
+def _directions(q) -> dict:
+    leg = _element(q.get("origin", [""])[0], q.get("destination", [""])[0])
+    if leg["status"] != "OK":
+        return {"status": "NOT_FOUND", "routes": []}
+    return {"status": "OK", "routes": [{"legs": [{"distance": leg["distance"], "duration": leg["duration"]}]}]}
+
+
+def _distance_matrix(q) -> dict:
+    origins = [o for o in q.get("origins", [""])[0].split("|") if o]
+    dests = [d for d in q.get("destinations", [""])[0].split("|") if d]
+    if not origins or not dests or len(dests) > 25 or len(origins) * len(dests) > 100:
+        return {"status": "MAX_DIMENSIONS_EXCEEDED" if dests else "INVALID_REQUEST", "rows": []}
+    return {"status": "OK", "rows": [{"elements": [_element(o, d) for d in dests]} for o in origins]}
+
+
+def _png(width: int, height: int, seed: str) -> bytes:
+    h = hashlib.sha1(seed.encode("utf-8")).digest()
+    img = Image.new("RGB", (width, height), (200 + h[0] % 40, 200 + h[1] % 40, 190 + h[2] % 40))
+    draw = ImageDraw.Draw(img)
+    # เส้นถนนปลอมให้ไฟล์มีขนาดใกล้ภาพแผนที่จริงกว่าพื้นสีเดียว
+    for i in range(0, 24):
+        y = (h[i % 20] * height) // 256
+        draw.line([(0, y), (width, (y * 7 + i * 13) % height)], fill=(255, 255, 255), width=3)
+    out = io.BytesIO()
+    img.save(out, "PNG")
+    return out.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive แบบเซิร์ฟเวอร์จริง: client ที่ใช้ Session เดิมจึงไม่ต้องต่อ TCP ใหม่ทุก request
+    protocol_version = "HTTP/1.1"
+    # header กับ body เขียนแยกกัน: ปิด Nagle ไม่งั้นรอ delayed ACK ~40 ms ทุก request บน keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self._fresh = True
+        with self.server.lock:
+            self.server.counters["connections"] += 1
+
+    def do_GET(self):
+        server = self.server
+        delay = server.latency + (server.handshake if self._fresh else 0.0)
+        self._fresh = False
+        if delay:
+            time.sleep(delay)
+        url = urlparse(self.path)
+
+        if url.path.endswith("/directions/json") or url.path.endswith("/distancematrix/json"):
+            q = parse_qs(url.query)
+            kind = "directions" if "/directions/" in url.path else "distancematrix"
+            data = _directions(q) if kind == "directions" else _distance_matrix(q)
+            body = json.dumps(data).encode("utf-8")
+            with server.lock:
+                server.counters[kind] += 1
+                server.counters["bytes_sent"] += len(body)
+            return self._send(200, body, "application/json")
+
+        if url.path.endswith("/staticmap"):
+            q = parse_qs(url.query)
+            try:
+                w, h = (int(v) for v in q.get("size", ["640x640"])[0].split("x"))
+            except ValueError:
+                return self._send(400, b"bad size", "text/plain")
+            body, kind = _png(w, h, q.get("center", [""])[0]), "staticmap"
+        elif url.path.startswith("/tiles/") and url.path.endswith(".png"):
+            body, kind = _png(256, 256, url.path), "tiles"
+        else:
+            return self._send(404, b"not found", "text/plain")
+
+        with server.lock:
+            server.counters[kind] += 1
+            server.counters["bytes_sent"] += len(body)
+        self._send(200, body, "image/png")
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port: int = 0, latency_ms: float = 0.0, handshake_ms: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """เริ่มเซิร์ฟเวอร์ใน daemon thread คืน (server, "http://127.0.0.1:<port>")"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000.0
+    server.handshake = handshake_ms / 1000.0
+    server.lock = threading.Lock()
+    server.counters = {
+        "staticmap": 0, "tiles": 0, "directions": 0, "distancematrix": 0, "connections": 0, "bytes_sent": 0,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--handshake-ms", type=float, default=0.0, help="เวลาเพิ่มของ request แรกต่อ connection")
+    args = parser.parse_args()
+
+    server, base = start(args.port, args.latency_ms, args.handshake_ms)
+    print(f"serving {base}/maps/api/(staticmap|directions/json|distancematrix/json) "
+          f"and {base}/tiles/{{z}}/{{x}}/{{y}}.png")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
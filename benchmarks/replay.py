@@ -0,0 +1,180 @@
+"""load test: เล่นบทสนทนาจากไฟล์ JSON lines ซ้ำกับ chatbot.get_answer พร้อมกันหลายงาน
+แล้วรายงาน throughput, tail latency และอัตราผิดพลาด
+
+    python -m benchmarks.replay
+    python -m benchmarks.replay logs/sessions.jsonl --concurrency 16 --repeat 5
+    python -m benchmarks.replay logs/sessions.jsonl --pool process --workers 4 --concurrency 16
+    python -m benchmarks.replay logs/sessions.jsonl --dsn "postgresql://localhost/pathew_bench"
+
+รับไฟล์ได้สองรูปแบบ (ผสมกันได้):
+- log จาก app.py (SESSION_LOG_PATH, ดู session_log.py): หนึ่งบรรทัดต่อรอบ มี history, focus_place_id,
+  last_results, banned_categories ของรอบนั้นครบ แต่ละรอบจึงเป็นงานอิสระ
+- บทสนทนาแบบสคริปต์ {"scenario", "turns": [...], "lat", "lng"} แบบ benchmarks/data/sessions.jsonl
+  ทั้งบทสนทนาเป็นหนึ่งงาน รอบถัดไปใช้สถานะจากคำตอบก่อนหน้า
+
+--pool thread: ทุก thread เรียก get_answer ตัวเดียวกัน (แบบ Streamlit ที่ทุก session อยู่ใน process เดียว)
+--pool process: แยก process ละ event loop/pool/cache ของตัวเอง จำลองการรันหลาย instance
+LLM เป็น StubModel เสมอ; ไม่ใส่ --dsn จะค้นใน PlaceCatalog ข้อมูลสังเคราะห์ขนาด --places
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import chatbot
+import db
+import db_async
+import session_log
+from benchmarks.common import CountingSearch, StubModel, percentile
+from benchmarks.run import SEARCH_FUNCTIONS, SESSIONS_PATH, connect_postgres, use_memory
+
+# คำตอบที่ get_answer คืนแทนการโยน exception
+ERROR_PREFIXES = ("เกิดข้อผิดพลาดในการประมวลผล", "ขออภัยครับ เกิดข้อผิดพลาดกับ AI")
+
+
+def load_units(paths: List[str]) -> List[Dict]:
+    """แปลงทุกไฟล์เป็นรายการงาน: {"kind": "turn", ...} หรือ {"kind": "session", ...}"""
+    units = []
+    for path in paths:
+        for rec in session_log.read_log(path):
+            if "turns" in rec:
+                units.append({"kind": "session", **rec})
+            elif "user_input" in rec:
+                units.append({"kind": "turn", **rec})
+    return units
+
+
+# ---------- worker ----------
+def setup_worker(places: int, dsn: str, llm_ms: float, db_ms: float):
+    """เตรียม chatbot ใน process นี้ (เรียกตรงๆ ในโหมด thread หรือเป็น initializer ของ process pool)"""
+    if dsn:
+        connect_postgres(dsn)
+        db_ms = 0.0
+    else:
+        use_memory(places)
+    chatbot.model = StubModel(latency=llm_ms / 1000.0, guess=chatbot._local_guess_category)
+    if db_ms:
+        for name in SEARCH_FUNCTIONS:
+            setattr(db_async, name, CountingSearch(getattr(db_async, name), db_ms / 1000.0))
+
+
+def _timed_turn(user_input: str, **kwargs) -> Tuple[float, bool, tuple]:
+    start = time.perf_counter()
+    try:
+        result = chatbot.get_answer(user_input, **kwargs)
+        error = str(result[0]).startswith(ERROR_PREFIXES)
+    except Exception:
+        result, error = ("", [], kwargs.get("banned_categories") or []), True
+    return (time.perf_counter() - start) * 1000.0, error, result
+
+
+def run_unit(unit: Dict) -> List[Tuple[float, bool]]:
+    """รันหนึ่งงาน คืน [(ms, error)] ของทุกรอบในงาน"""
+    if unit["kind"] == "turn":
+        ms, error, _ = _timed_turn(
+            unit["user_input"],
+            user_lat=unit.get("user_lat"),
+            user_lng=unit.get("user_lng"),
+            history=unit.get("history") or [],
+            focus_place_id=unit.get("focus_place_id"),
+            last_results=unit.get("last_results") or [],
+            banned_categories=unit.get("banned_categories") or [],
+        )
+        return [(ms, error)]
+
+    out = []
+    history: List[Dict] = []
+    last_results: List[Dict] = []
+    focus_place_id = None
+    banned: List[str] = []
+    for q in unit["turns"]:
+        history.append({"role": "user", "content": q})
+        ms, error, (reply, places, banned) = _timed_turn(
+            q, user_lat=unit.get("lat"), user_lng=unit.get("lng"), history=history[-8:],
+            focus_place_id=focus_place_id, last_results=last_results, banned_categories=banned,
+        )
+        out.append((ms, error))
+        history.append({"role": "assistant", "content": reply})
+        if places:
+            last_results = places
+            if len(places) == 1 and places[0].get("id") is not None:
+                focus_place_id = places[0]["id"]
+    return out
+
+
+# ---------- driver ----------
+def replay(units: List[Dict], concurrency: int, pool: str, workers: int, init_args: tuple) -> Dict:
+    if pool == "process":
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=setup_worker, initargs=init_args)
+    else:
+        setup_worker(*init_args)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    samples: List[Tuple[float, bool]] = []
+    lock = threading.Lock()
+    # ส่งงานไม่เกิน concurrency ชิ้นพร้อมกัน (โหมด process: workers process รับงานจากคิวนี้)
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def done(future):
+        slots.release()
+        try:
+            result = future.result()
+        except Exception:
+            result = [(0.0, True)]
+        with lock:
+            samples.extend(result)
+
+    start = time.perf_counter()
+    with executor:
+        for unit in units:
+            slots.acquire()
+            executor.submit(run_unit, unit).add_done_callback(done)
+    wall = time.perf_counter() - start
+
+    ms = [s[0] for s in samples]
+    errors = sum(1 for s in samples if s[1])
+    return {
+        "units": len(units),
+        "turns": len(samples),
+        "wall_s": wall,
+        "throughput_tps": len(samples) / wall if wall else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": max(ms),
+        "mean_ms": statistics.mean(ms),
+        "error_rate": errors / len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="*", default=[SESSIONS_PATH], help="ไฟล์ JSON lines (ค่าเริ่มต้น: sessions.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=8, help="จำนวนงานที่รันพร้อมกัน")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="จำนวน process (--pool process)")
+    parser.add_argument("--repeat", type=int, default=3, help="เล่นทุกงานซ้ำกี่รอบ")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="latency จำลองของ LLM ต่อ call")
+    parser.add_argument("--db-ms", type=float, default=0.0, help="latency จำลองต่อ query (โหมด memory)")
+    parser.add_argument("--places", type=int, default=10000, help="ขนาดข้อมูลสังเคราะห์ (โหมด memory)")
+    parser.add_argument("--dsn", help="Postgres DSN (ไม่ใส่ = PlaceCatalog ในหน่วยความจำ)")
+    args = parser.parse_args()
+
+    units = load_units(args.logs) * max(1, args.repeat)
+    if not units:
+        parser.error("ไม่มีรอบให้เล่นซ้ำ")
+
+    r = replay(units, max(1, args.concurrency), args.pool, max(1, args.workers),
+               (args.places, args.dsn, args.llm_ms, args.db_ms))
+    print(f"pool={args.pool} concurrency={args.concurrency} units={r['units']} turns={r['turns']} "
+          f"wall={r['wall_s']:.2f}s")
+    print(f"throughput={r['throughput_tps']:.1f} turns/s  error_rate={r['error_rate'] * 100:.2f}%")
+    print(f"latency p50={r['p50_ms']:.1f} p95={r['p95_ms']:.1f} p99={r['p99_ms']:.1f} "
+          f"max={r['max_ms']:.1f} mean={r['mean_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
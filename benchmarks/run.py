@@ -0,0 +1,245 @@
+"""ชุด benchmark ของ get_answer แบบออฟไลน์: เล่นบทสนทนาใน benchmarks/data/sessions.jsonl
+ซ้ำที่ข้อมูลสังเคราะห์หลายขนาด แล้วรายงาน latency แยกตาม scenario พร้อม query และ LLM call ต่อรอบ
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scales 1000,20000 --llm-ms 400 --db-ms 10 --rounds 5
+    python -m benchmarks.run --scenario followup --scenario choose
+    python -m benchmarks.run --dsn "postgresql://localhost/pathew_bench" --seed
+    python -m benchmarks.run --json out/bench.json
+
+ค่าเริ่มต้นใช้ PlaceCatalog (SEARCH_ENGINE = "memory") เป็นตัวแทนฐานข้อมูล และหน่วงทุก query ด้วย --db-ms
+ถ้าให้ --dsn จะค้นใน Postgres จริง; ใส่ --seed เพื่อ DROP แล้วสร้างตาราง places ใหม่ด้วยข้อมูลสังเคราะห์
+ทีละขนาด (ใช้กับฐานข้อมูลสำหรับ benchmark เท่านั้น) ไม่ใส่ --seed จะใช้ตาราง places ที่มีอยู่ขนาดเดียว
+ทั้งสองโหมดต้องมี [postgres] ใน secrets สำหรับค่าตั้งอื่นๆ ส่วน LLM เป็น StubModel เสมอ
+
+แต่ละรอบเริ่มจาก cache เย็น (ล้าง intent cache และปิด result cache) ใส่ --warm เพื่อใช้ cache ตามปกติ
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import chatbot
+import db
+import db_async
+import migrate
+import place_catalog
+from benchmarks.common import CountingSearch, StubModel, percentile, synthetic_places
+
+SESSIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.jsonl")
+SEARCH_FUNCTIONS = ["search_places", "search_places_nearby", "search_places_multi"]
+
+PLACES_DDL = """
+DROP TABLE IF EXISTS places CASCADE;
+CREATE TABLE places (
+    id SERIAL PRIMARY KEY,
+    name TEXT,
+    tambon TEXT,
+    category TEXT,
+    description TEXT,
+    highlight TEXT,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    image_url TEXT,
+    image_urls TEXT
+);
+"""
+PLACES_COLUMNS = ["id", "name", "tambon", "category", "description", "highlight",
+                  "latitude", "longitude", "image_url", "image_urls"]
+
+
+def load_sessions(path: str = SESSIONS_PATH, scenarios: Optional[List[str]] = None) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        sessions = [json.loads(line) for line in f if line.strip()]
+    if scenarios:
+        sessions = [s for s in sessions if s["scenario"] in scenarios]
+    return sessions
+
+
+# ---------- แหล่งข้อมูล ----------
+def use_memory(n: int):
+    db.SEARCH_ENGINE = "memory"
+    catalog = place_catalog.PlaceCatalog(loader=lambda: synthetic_places(n), version_fn=lambda: n)
+    catalog.load()
+    place_catalog._CATALOG = catalog
+
+
+def connect_postgres(dsn: str):
+    import psycopg2
+
+    db.SEARCH_ENGINE = "db"
+    db.close_pool()
+    db._POOL = db._ConnectionPool(lambda: psycopg2.connect(dsn), min_size=1, max_size=5)
+    db_async._conninfo = lambda: dsn
+
+
+def seed_postgres(n: int):
+    """สร้างตาราง places ใหม่ด้วยข้อมูลสังเคราะห์ n แถว แล้วรัน migrations ทับ (index, trigram, version)"""
+    import psycopg2.extras
+
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(PLACES_DDL)
+            psycopg2.extras.execute_values(
+                cur,
+                f"INSERT INTO places ({', '.join(PLACES_COLUMNS)}) VALUES %s",
+                [tuple(r[c] for c in PLACES_COLUMNS) for r in synthetic_places(n)],
+                page_size=5000,
+            )
+            cur.execute("SELECT setval('places_id_seq', (SELECT MAX(id) FROM places));")
+        conn.commit()
+
+        for name in sorted(f for f in os.listdir(migrate.MIGRATIONS_DIR) if f.endswith(".sql")):
+            with open(os.path.join(migrate.MIGRATIONS_DIR, name), encoding="utf-8") as fh:
+                sql = fh.read()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"  migration {name} skipped: {str(e).strip()}")
+
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE places;")
+        conn.commit()
+    db.invalidate_schema_cache()
+
+
+# ---------- รัน ----------
+def _run_session(session: Dict, warm: bool, samples: Dict[str, List[Dict]], counters):
+    lat, lng = session.get("lat"), session.get("lng")
+    history: List[Dict] = []
+    last_results: List[Dict] = []
+    focus_place_id = None
+    banned: List[str] = []
+
+    for q in session["turns"]:
+        if not warm:
+            chatbot._INTENT_CACHE.clear()
+        llm_before = chatbot.model.calls
+        searches_before = sum(c.calls for c in counters.values())
+        queries_before = db.query_stats()["queries"]
+
+        history.append({"role": "user", "content": q})
+        start = time.perf_counter()
+        reply, places, banned = chatbot.get_answer(
+            q, user_lat=lat, user_lng=lng, history=history[-8:], focus_place_id=focus_place_id,
+            last_results=last_results, banned_categories=banned,
+        )
+        elapsed = (time.perf_counter() - start) * 1000.0
+        history.append({"role": "assistant", "content": reply})
+
+        if places:
+            last_results = places
+            if len(places) == 1 and places[0].get("id") is not None:
+                focus_place_id = places[0]["id"]
+
+        samples[session["scenario"]].append({
+            "ms": elapsed,
+            "llm_calls": chatbot.model.calls - llm_before,
+            "searches": sum(c.calls for c in counters.values()) - searches_before,
+            "queries": db.query_stats()["queries"] - queries_before,
+        })
+
+
+def run_scale(sessions: List[Dict], rounds: int, llm_ms: float, db_ms: float, warm: bool) -> Dict[str, Dict]:
+    chatbot.model = StubModel(latency=llm_ms / 1000.0, guess=chatbot._local_guess_category)
+    original_cache = db._result_cache
+    if not warm:
+        db._result_cache = lambda: None
+    originals = {name: getattr(db_async, name) for name in SEARCH_FUNCTIONS}
+    counters = {name: CountingSearch(fn, db_ms / 1000.0) for name, fn in originals.items()}
+    for name, fn in counters.items():
+        setattr(db_async, name, fn)
+
+    samples: Dict[str, List[Dict]] = defaultdict(list)
+    try:
+        for _ in range(rounds):
+            for session in sessions:
+                _run_session(session, warm, samples, counters)
+    finally:
+        for name, fn in originals.items():
+            setattr(db_async, name, fn)
+        db._result_cache = original_cache
+
+    report = {}
+    for scenario, turns in samples.items():
+        ms = [t["ms"] for t in turns]
+        report[scenario] = {
+            "turns": len(turns),
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "mean_ms": statistics.mean(ms),
+            "llm_calls_per_turn": sum(t["llm_calls"] for t in turns) / len(turns),
+            "searches_per_turn": sum(t["searches"] for t in turns) / len(turns),
+            # โหมด memory ไม่มี round-trip จริง: ใช้จำนวน search ที่ส่งไปยัง db_async แทน
+            "db_round_trips_per_turn": (
+                sum(t["queries"] for t in turns) / len(turns) if db.SEARCH_ENGINE != "memory"
+                else sum(t["searches"] for t in turns) / len(turns)
+            ),
+        }
+    return report
+
+
+def _print_report(label: str, report: Dict[str, Dict]):
+    print(f"\n== {label} ==")
+    print(f"{'scenario':<10} {'turns':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'mean ms':>9} {'db/turn':>8} {'llm/turn':>9}")
+    for scenario, r in sorted(report.items()):
+        print(f"{scenario:<10} {r['turns']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+              f"{r['mean_ms']:>9.1f} {r['db_round_trips_per_turn']:>8.2f} {r['llm_calls_per_turn']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1000,10000,50000", help="จำนวนสถานที่สังเคราะห์ คั่นด้วย ,")
+    parser.add_argument("--scenario", action="append", help="รันเฉพาะ scenario นี้ (ใส่ซ้ำได้)")
+    parser.add_argument("--sessions", default=SESSIONS_PATH, help="ไฟล์บทสนทนา (JSON lines)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="latency จำลองของ LLM ต่อ call")
+    parser.add_argument("--db-ms", type=float, default=0.0, help="latency จำลองต่อ query (โหมด memory)")
+    parser.add_argument("--warm", action="store_true", help="ใช้ intent cache และ result cache ตามปกติ")
+    parser.add_argument("--dsn", help="Postgres DSN (ไม่ใส่ = PlaceCatalog ในหน่วยความจำ)")
+    parser.add_argument("--seed", action="store_true", help="สร้างตาราง places ใหม่ใน --dsn ทุกขนาด")
+    parser.add_argument("--json", help="เขียนผลทั้งหมดเป็น JSON ที่ path นี้ (ไว้เทียบระหว่าง commit)")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.sessions, args.scenario)
+    if not sessions:
+        parser.error("ไม่มีบทสนทนาให้รัน")
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    if args.dsn:
+        connect_postgres(args.dsn)
+        if not args.seed:
+            scales = [None]
+
+    results = {}
+    for n in scales:
+        if args.dsn:
+            if n is not None:
+                seed_postgres(n)
+            db_ms = 0.0
+        else:
+            use_memory(n)
+            db_ms = args.db_ms
+        db.reset_query_stats()
+
+        label = f"{n} places" if n is not None else "existing places table"
+        report = run_scale(sessions, args.rounds, args.llm_ms, db_ms, args.warm)
+        _print_report(label, report)
+        results[label] = report
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,39 @@
+import asyncio
+import hashlib
 import json
 import re
-from typing import List, Dict, Tuple, Optional, Set
+import threading
+import time
+from functools import lru_cache
+from typing import List, Dict, Iterator, Tuple, Optional, Set, Union
 
 import google.generativeai as genai
-from rapidfuzz import fuzz
-
-from config import GEMINI_API_KEY
-from db import search_places, search_places_nearby
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from config import (
+    GEMINI_API_KEY,
+    INTENT_CACHE_PATH,
+    INTENT_CACHE_SIZE,
+    INTENT_CACHE_TTL,
+    LOCAL_INTENT_THRESHOLD,
+    ROAD_DISTANCE_WEIGHT,
+    SEMANTIC_MIN_SCORE,
+    SEMANTIC_TOP_K,
+    SEMANTIC_WEIGHT,
+)
+import db_async
+import embeddings
+import tracing
+from intent_cache import IntentCache
+from keyword_matcher import KeywordMatcher, TextMatches
+from place_text import (
+    norm as _norm,
+    normalize_loose_text as _normalize_loose_text,
+    place_text,
+    split_category_tags as _split_category_tags,
+)
+from spatial_index import great_circle_km
 
 # ---------- LLM config ----------
 if not GEMINI_API_KEY:
@@ -145,6 +172,8 @@ WASH_INTENT_WORDS = ["ล้างรถ", "ล้างอัดฉีด", "
 SOUVENIR_INTENT_WORDS = ["ของฝาก"]
 INDUSTRY_INTENT_WORDS = ["โรงงาน", "อุตสาหกรรม"]
 
+PATHEW_TAMBONS = ["บางสน", "ทะเลทรัพย์", "สะพลี", "ชุมโค", "ดอนยาง", "ปากคลอง", "เขาไชยราช"]
+
 NEARBY_WORDS = [
     "ใกล้", "ใกล้ๆ", "ใกล้กัน", "ใกล้ๆกัน", "ใกล้กับ", "แถวนี้", "แถวนั้น",
     "ละแวกนี้", "รอบๆ", "ใกล้เคียง", "แถว", "ติดกับ", "ใกล้หาด", "ใกล้ที่นี่"
@@ -171,6 +200,64 @@ FOLLOWUP_PATTERNS = [
 
 
 
+FORCED_CATEGORY_WORDS = [
+    ("ร้านอาหาร", ["อาหารทะเล", "ซีฟู้ด", "ของกิน", "หิว", "กิน", "อาหาร", "ข้าว", "ก๋วยเตี๋ยว", "ร้านข้าว"]),
+    ("วัด", ["ทำบุญ", "ไหว้พระ", "วัด", "สำนักสงฆ์"]),
+    ("สถานที่ท่องเที่ยว", ["ถ่ายรูป", "ถ่ายภาพ", "มุมถ่ายรูป", "จุดถ่ายรูป", "วิวสวย", "ถ่ายคอนเทนต์", "ถ่ายสตอรี่", "ถ่ายไอจี"]),
+    ("คาเฟ่", ["ดื่ม", "กาแฟ", "คาเฟ่", "เครื่องดื่ม", "ชานม", "โกโก้", "นั่งชิล", "นั่งชิลล์", "ชิล"]),
+    ("ที่พัก", ["พัก", "โรงแรม", "รีสอร์ท", "ที่พัก", "โฮมสเตย์"]),
+    ("ร้านขายยา", ["คลินิก", "โรงพยาบาล", "อนามัย", "ร้านขายยา", "ร้านยา", "เภสัช"]),
+    ("ร้านตัดผม", ["ตัดผม", "บาร์เบอร์", "เสริมสวย", "ซาลอน"]),
+    ("ร้านซ่อมรถ", ["อู่", "ซ่อมรถ", "ปะยาง", "แบตเตอรี่", "ร้านยาง"]),
+    ("ปั๊มน้ำมัน", ["ปั๊ม", "เติมน้ำมัน", "น้ำมันหมด"]),
+    ("สถานที่ท่องเที่ยว", ["ทะเล", "ชายหาด", "หาด", "อ่าว", "จุดชมวิว", "ที่เที่ยว", "เที่ยว"]),
+]
+
+TEMPLE_WORDS = ["ทำบุญ", "ไหว้พระ", "วัด", "สำนักสงฆ์"]
+SEA_TRAVEL_WORDS = ["ทะเล", "ชายหาด", "หาด", "อ่าว", "จุดชมวิว", "ที่เที่ยว", "เที่ยว"]
+FOOD_REPLY_WORDS = ["หิว", "กิน", "อาหาร", "ของกิน", "ร้านแนะนำ"]
+
+PLACE_NAME_BROAD_WORDS = [
+    "มี", "ไหม", "มั้ย", "แนะนำ", "ใกล้", "ใกล้ๆ", "ที่ไหน",
+    "อะไร", "บ้าง", "ช่วย", "หน่อย", "เอา", "ขอ", "หา", "อยาก", "ไป",
+    "ร้าน", "คาเฟ่", "ที่พัก", "ปั๊ม", "ตลาด", "โรงแรม", "รีสอร์ท", "โรงพยาบาล", "คลินิก"
+]
+
+BROAD_QUERY_MARKERS = [
+    "หิว", "มีอะไรให้กิน", "กินอะไรดี", "มีร้านแนะนำไหม", "ร้านแนะนำ",
+    "มีโรงพยาบาลไหม", "มีโรงพยาบาลแถวนี้ไหม", "มีร้านขายยาไหม", "มีคลินิกไหม",
+    "มีที่พักไหม", "มีคาเฟ่ไหม", "มีร้านอาหารไหม",
+    "มีวัดไหม", "มีตลาดไหม", "มีปั๊มไหม", "มีธนาคารไหม",
+    "มีมัสยิดไหม", "มีสถานีรถไฟไหม", "อยากกินกาแฟ"
+]
+
+MAP_REQUEST_WORDS = ["แผนที่", "พิกัด", "ไปยังไง", "เส้นทาง", "ที่อยู่", "ไหนอะ", "ตรงไหน", "ขอแผนที่", "เปิดแผนที่"]
+
+IMAGE_REQUEST_WORDS = [
+    "มีรูปไหม", "ขอรูป", "ดูรูป", "ดูภาพ", "มีภาพไหม",
+    "ส่งรูป", "ขอภาพ", "รูปของ", "ภาพของ"
+]
+
+CHOOSE_PHRASES = ["เลือก", "ช่วยเลือก", "แนะนำ", "ร้านไหนดี", "ไหนดี", "เลือกสักร้าน", "เลือกให้หน่อย", "มีร้านแนะนำไหม"]
+
+# คำที่ทำให้ยังค้นหาต่อแม้ LLM บอกว่าเป็นการคุยทั่วไป
+SEARCH_HINT_WORDS = [
+    "กาแฟ", "ข้าว", "อาหาร", "หิว", "กิน", "ของกิน", "ปั๊ม",
+    "เที่ยว", "ที่พัก", "โรงแรม", "รีสอร์ท", "ยิม", "วัด", "ตลาด", "ยา",
+    "โรงพยาบาล", "คลินิก", "อนามัย", "เครื่องดื่ม",
+    "ตัดผม", "เสริมสวย", "บาร์เบอร์", "ทำบุญ", "ไหว้พระ", "ทะเล", "ชายหาด", "หาด", "อ่าว",
+    "ถ่ายรูป", "ถ่ายภาพ", "มุมถ่ายรูป", "จุดถ่ายรูป", "วิวสวย"
+]
+
+# คำที่ชี้กลับไปยังบทสนทนาก่อนหน้า: ความหมายขึ้นกับประวัติแชท จึงไม่ใช้ cache ของ _understand
+CONTEXT_REFERENCE_WORDS = [
+    "ร้านนี้", "ที่นี่", "ตรงนี้", "สถานที่นี้", "อันนี้", "อันนั้น", "ร้านนั้น", "ที่นั่น",
+    "แบบนั้น", "แบบเดิม", "เหมือนเดิม", "อีกที่", "อีกร้าน", "ล่ะ"
+]
+
+# คำถามสั้นกว่านี้มักย่อความจากคำถามก่อนหน้า จึงผูก key กับคำถามก่อนหน้าของผู้ใช้ด้วย
+SHORT_QUERY_CHARS = 12
+
 PHOTO_SPOT_WORDS = [
     "ถ่ายรูป", "ถ่ายภาพ", "มุมถ่ายรูป", "จุดถ่ายรูป", "วิวสวย", "ถ่ายคอนเทนต์",
     "ถ่ายเล่น", "ถ่ายรูปสวย", "ถ่ายรูปชิลๆ", "ถ่ายสตอรี่", "ถ่ายรูปลงไอจี", "ถ่ายไอจี"
@@ -200,19 +287,11 @@ def _history_to_text(history: Optional[List[Dict]], max_turns: int = 8) -> str:
             lines.append(f"{role}: {c}")
     return "\n".join(lines)
 
-def _norm(s: str) -> str:
-    return (s or "").strip().lower()
-
 def _normalize_place_name(s: str) -> str:
     s = _norm(s)
     s = re.sub(r"\s+", "", s)
     return s
 
-def _normalize_loose_text(s: str) -> str:
-    s = _norm(s)
-    s = re.sub(r"[\s\-_]+", "", s)
-    return s
-
 def _clamp01(x: float) -> float:
     return max(0.0, min(1.0, x))
 
@@ -225,20 +304,25 @@ def _is_similar_name(q: str, candidate: str, threshold: int = 88) -> bool:
         return True
     return fuzz.ratio(qn, cn) >= threshold
 
-def _split_category_tags(cat_value: str) -> List[str]:
-    if not cat_value:
-        return []
-    parts = [p.strip().lower() for p in str(cat_value).split(",")]
-    return [p for p in parts if p]
+_INTENT_SYNONYMS_NORM = {
+    intent: [_norm(x) for x in words] for intent, words in ALLOWED_BY_INTENT.items()
+}
 
-def _category_matches_intent(place_category: str, intent: Optional[str]) -> bool:
+def _category_matches_intent(
+    place_category: str,
+    intent: Optional[str],
+    place_tags: Optional[Tuple[str, ...]] = None,
+    full_cat: Optional[str] = None,
+) -> bool:
     if not intent:
         return True
 
-    synonyms = [_norm(x) for x in ALLOWED_BY_INTENT.get(intent, [intent])]
-    place_tags = _split_category_tags(place_category)
+    synonyms = _INTENT_SYNONYMS_NORM.get(intent) or [_norm(intent)]
+    if place_tags is None:
+        place_tags = _split_category_tags(place_category)
+    if full_cat is None:
+        full_cat = _norm(place_category)
 
-    full_cat = _norm(place_category)
     if any(s in full_cat for s in synonyms):
         return True
 
@@ -292,11 +376,11 @@ def _extract_keywords_for_nearby(user_input: str, llm_keywords: Optional[str], p
     return cleaned
 
 def _local_guess_category(user_input: str) -> Optional[str]:
-    txt = _norm(user_input)
+    m = _matches(user_input)
     scores = {}
 
-    for cat, words in LOCAL_CATEGORY_HINTS.items():
-        score = sum(1 for w in words if w in txt)
+    for cat in LOCAL_CATEGORY_HINTS:
+        score = m.count(("hint", cat))
         if score > 0:
             scores[cat] = score
 
@@ -305,35 +389,35 @@ def _local_guess_category(user_input: str) -> Optional[str]:
 
     return sorted(scores.items(), key=lambda x: x[1], reverse=True)[0][0]
 
-def _intent_from_keywords(user_input: str) -> Optional[str]:
-    txt = _norm(user_input)
+INTENT_PRIORITY_CHECKS = [
+    ("ที่พัก", HOTEL_INTENT_WORDS),
+    ("ร้านขายยา", PHARMACY_INTENT_WORDS),
+    ("ร้านอาหาร", FOOD_INTENT_WORDS),
+    ("คาเฟ่", CAFE_INTENT_WORDS),
+    ("ปั๊มน้ำมัน", GAS_INTENT_WORDS),
+    ("โรงยิม", GYM_INTENT_WORDS),
+    ("ร้านซ่อมรถ", CAR_INTENT_WORDS),
+    ("ตลาด", MARKET_INTENT_WORDS),
+    ("วัด", TEMPLE_INTENT_WORDS),
+    ("ร้านสะดวกซื้อ", CONVENIENCE_INTENT_WORDS),
+    ("ธนาคาร", BANK_INTENT_WORDS),
+    ("มัสยิด", MOSQUE_INTENT_WORDS),
+    ("สถานที่ราชการ", GOV_INTENT_WORDS),
+    ("สถานีรถไฟ", TRAIN_INTENT_WORDS),
+    ("ล้างอัดฉีด", WASH_INTENT_WORDS),
+    ("ร้านของฝาก", SOUVENIR_INTENT_WORDS),
+    ("อุตสาหกรรม", INDUSTRY_INTENT_WORDS),
+    ("สถานที่ท่องเที่ยว", TRAVEL_INTENT_WORDS),
+]
 
-    priority_checks = [
-        ("ที่พัก", HOTEL_INTENT_WORDS),
-        ("ร้านขายยา", PHARMACY_INTENT_WORDS),
-        ("ร้านอาหาร", FOOD_INTENT_WORDS),
-        ("คาเฟ่", CAFE_INTENT_WORDS),
-        ("ปั๊มน้ำมัน", GAS_INTENT_WORDS),
-        ("โรงยิม", GYM_INTENT_WORDS),
-        ("ร้านซ่อมรถ", CAR_INTENT_WORDS),
-        ("ตลาด", MARKET_INTENT_WORDS),
-        ("วัด", TEMPLE_INTENT_WORDS),
-        ("ร้านสะดวกซื้อ", CONVENIENCE_INTENT_WORDS),
-        ("ธนาคาร", BANK_INTENT_WORDS),
-        ("มัสยิด", MOSQUE_INTENT_WORDS),
-        ("สถานที่ราชการ", GOV_INTENT_WORDS),
-        ("สถานีรถไฟ", TRAIN_INTENT_WORDS),
-        ("ล้างอัดฉีด", WASH_INTENT_WORDS),
-        ("ร้านของฝาก", SOUVENIR_INTENT_WORDS),
-        ("อุตสาหกรรม", INDUSTRY_INTENT_WORDS),
-        ("สถานที่ท่องเที่ยว", TRAVEL_INTENT_WORDS),
-    ]
+def _intent_from_keywords(user_input: str) -> Optional[str]:
+    m = _matches(user_input)
 
     best_cat = None
     best_score = 0
 
-    for cat, words in priority_checks:
-        score = sum(1 for w in words if w in txt)
+    for cat, _ in INTENT_PRIORITY_CHECKS:
+        score = m.count(("intent", cat))
         if score > best_score:
             best_score = score
             best_cat = cat
@@ -341,31 +425,99 @@ def _intent_from_keywords(user_input: str) -> Optional[str]:
     return best_cat
 
 def _forced_category_fallback(user_input: str) -> Optional[str]:
-    txt = _norm(user_input)
+    m = _matches(user_input)
 
-    if any(w in txt for w in ["อาหารทะเล", "ซีฟู้ด", "ของกิน", "หิว", "กิน", "อาหาร", "ข้าว", "ก๋วยเตี๋ยว", "ร้านข้าว"]):
-        return "ร้านอาหาร"
-    if any(w in txt for w in ["ทำบุญ", "ไหว้พระ", "วัด", "สำนักสงฆ์"]):
-        return "วัด"
-    if any(w in txt for w in ["ถ่ายรูป", "ถ่ายภาพ", "มุมถ่ายรูป", "จุดถ่ายรูป", "วิวสวย", "ถ่ายคอนเทนต์", "ถ่ายสตอรี่", "ถ่ายไอจี"]):
-        return "สถานที่ท่องเที่ยว"
-    if any(w in txt for w in ["ดื่ม", "กาแฟ", "คาเฟ่", "เครื่องดื่ม", "ชานม", "โกโก้", "นั่งชิล", "นั่งชิลล์", "ชิล"]):
-        return "คาเฟ่"
-    if any(w in txt for w in ["พัก", "โรงแรม", "รีสอร์ท", "ที่พัก", "โฮมสเตย์"]):
-        return "ที่พัก"
-    if any(w in txt for w in ["คลินิก", "โรงพยาบาล", "อนามัย", "ร้านขายยา", "ร้านยา", "เภสัช"]):
-        return "ร้านขายยา"
-    if any(w in txt for w in ["ตัดผม", "บาร์เบอร์", "เสริมสวย", "ซาลอน"]):
-        return "ร้านตัดผม"
-    if any(w in txt for w in ["อู่", "ซ่อมรถ", "ปะยาง", "แบตเตอรี่", "ร้านยาง"]):
-        return "ร้านซ่อมรถ"
-    if any(w in txt for w in ["ปั๊ม", "เติมน้ำมัน", "น้ำมันหมด"]):
-        return "ปั๊มน้ำมัน"
-    if any(w in txt for w in ["ทะเล", "ชายหาด", "หาด", "อ่าว", "จุดชมวิว", "ที่เที่ยว", "เที่ยว"]):
-        return "สถานที่ท่องเที่ยว"
+    for i, (cat, _) in enumerate(FORCED_CATEGORY_WORDS):
+        if m.has(("forced", i)):
+            return cat
+
+    return None
 
+def _local_guess_tambon(user_input: str) -> Optional[str]:
+    txt = _normalize_loose_text(user_input)
+    for t in PATHEW_TAMBONS:
+        if t in txt:
+            return t
     return None
 
+_LOCAL_INTENT_WORDS: Dict[str, Set[str]] = {cat: set(words) for cat, words in LOCAL_CATEGORY_HINTS.items()}
+for _cat, _words in INTENT_PRIORITY_CHECKS:
+    _LOCAL_INTENT_WORDS.setdefault(_cat, set()).update(_words)
+
+# ---------- Keyword matcher ----------
+# พจนานุกรมทุกชุดถูกรวมเป็น automaton เดียว สแกนข้อความผู้ใช้ครั้งเดียวต่อรอบแล้วทุกตัวตรวจใช้ผลร่วมกัน
+_MATCHER = KeywordMatcher()
+
+def _register_keywords():
+    for cat, words in LOCAL_CATEGORY_HINTS.items():
+        _MATCHER.add(("hint", cat), words)
+    for cat, words in CATEGORY_SYNONYMS.items():
+        _MATCHER.add(("syn", cat), [_norm(w) for w in words])
+    for cat in CANON_CATS:
+        _MATCHER.add(("canon", cat), [_norm(cat)])
+    for cat, words in INTENT_PRIORITY_CHECKS:
+        _MATCHER.add(("intent", cat), words)
+    for cat, words in _LOCAL_INTENT_WORDS.items():
+        _MATCHER.add(("local", cat), words)
+    for i, (_, words) in enumerate(FORCED_CATEGORY_WORDS):
+        _MATCHER.add(("forced", i), words)
+
+    for tag, words in [
+        ("neg", NEG_WORDS),
+        ("nearby", NEARBY_WORDS),
+        ("photo", PHOTO_SPOT_WORDS),
+        ("temple", TEMPLE_WORDS),
+        ("sea", SEA_TRAVEL_WORDS),
+        ("food_reply", FOOD_REPLY_WORDS),
+        ("place_name_broad", PLACE_NAME_BROAD_WORDS),
+        ("broad_marker", BROAD_QUERY_MARKERS),
+        ("map", MAP_REQUEST_WORDS),
+        ("image", IMAGE_REQUEST_WORDS),
+        ("choose", CHOOSE_PHRASES),
+        ("search_hint", SEARCH_HINT_WORDS),
+        ("context_ref", CONTEXT_REFERENCE_WORDS),
+    ]:
+        _MATCHER.add(tag, words)
+    _MATCHER.compile()
+
+_register_keywords()
+
+@lru_cache(maxsize=512)
+def _match_normalized(txt: str) -> TextMatches:
+    return _MATCHER.match(txt)
+
+def _matches(text: str) -> TextMatches:
+    """ผลจับคำของข้อความ (หลัง strip/lower) คำนวณครั้งเดียวต่อข้อความแล้วใช้ซ้ำทุกตัวตรวจ"""
+    return _match_normalized(_norm(text))
+
+
+def _local_intent(user_input: str) -> Tuple[Optional[str], float]:
+    """เดาหมวดจากพจนานุกรมในเครื่อง พร้อมความมั่นใจ 0-1
+
+    หมวดที่ได้คือหมวดเดียวกับที่ get_answer ใช้ทับผลของ LLM อยู่แล้ว
+    (_forced_category_fallback -> _intent_from_keywords -> _local_guess_category)
+    ความมั่นใจ = ครึ่งหนึ่งจากจำนวนตัวตรวจที่เห็นตรงกัน และอีกครึ่งจากระยะห่างของคะแนนคำที่เจอ
+    ระหว่างหมวดที่ชนะกับหมวดรองลงมา (รวมคำจาก LOCAL_CATEGORY_HINTS และ *_INTENT_WORDS)
+    """
+    detectors = [
+        _forced_category_fallback(user_input),
+        _intent_from_keywords(user_input),
+        _local_guess_category(user_input),
+    ]
+    guessed = next((d for d in detectors if d), None)
+    if not guessed:
+        return None, 0.0
+
+    m = _matches(user_input)
+    scores = {cat: m.count(("local", cat)) for cat in _LOCAL_INTENT_WORDS}
+
+    top = scores.get(guessed, 0)
+    runner_up = max((v for c, v in scores.items() if c != guessed), default=0)
+    margin = (top - runner_up) / top if top > 0 else 0.0
+    votes = sum(1 for d in detectors if d == guessed) / len(detectors)
+
+    return guessed, _clamp01(0.5 * votes + 0.5 * max(0.0, margin))
+
 def _is_strict_category(prefer_category: Optional[str]) -> bool:
     return prefer_category in {
         "วัด",
@@ -382,9 +534,8 @@ def _infer_category_from_places(places: List[Dict]) -> Optional[str]:
 
     score_map = {}
     for p in places:
-        cat = str(p.get("category") or "")
         for canon in CANON_CATS:
-            if _category_matches_intent(cat, canon):
+            if _is_allowed_for_intent(canon, p):
                 score_map[canon] = score_map.get(canon, 0) + 1
 
     if not score_map:
@@ -392,16 +543,17 @@ def _infer_category_from_places(places: List[Dict]) -> Optional[str]:
 
     return sorted(score_map.items(), key=lambda x: x[1], reverse=True)[0][0]
 
+@tracing.traced("post_filter")
 def _post_filter_results_by_query(rows: List[Dict], user_input: str, prefer_category: Optional[str]) -> List[Dict]:
     if not rows:
         return rows
 
-    txt = _norm(user_input)
+    m = _matches(user_input)
 
-    if prefer_category == "วัด" or any(w in txt for w in ["ทำบุญ", "ไหว้พระ", "วัด", "สำนักสงฆ์"]):
+    if prefer_category == "วัด" or m.has("temple"):
         return [r for r in rows if _is_allowed_for_intent("วัด", r)]
 
-    if prefer_category == "สถานที่ท่องเที่ยว" and any(w in txt for w in ["ทะเล", "ชายหาด", "หาด", "อ่าว", "จุดชมวิว", "ที่เที่ยว", "เที่ยว"]):
+    if prefer_category == "สถานที่ท่องเที่ยว" and m.has("sea"):
         return [r for r in rows if _is_allowed_for_intent("สถานที่ท่องเที่ยว", r)]
 
     return rows
@@ -428,13 +580,7 @@ def _strict_category_filter(rows: List[Dict], prefer_category: Optional[str]) ->
 def _looks_like_explicit_place_name_query(user_input: str) -> bool:
     txt = _norm(user_input)
 
-    broad_words = [
-        "มี", "ไหม", "มั้ย", "แนะนำ", "ใกล้", "ใกล้ๆ", "ที่ไหน",
-        "อะไร", "บ้าง", "ช่วย", "หน่อย", "เอา", "ขอ", "หา", "อยาก", "ไป",
-        "ร้าน", "คาเฟ่", "ที่พัก", "ปั๊ม", "ตลาด", "โรงแรม", "รีสอร์ท", "โรงพยาบาล", "คลินิก"
-    ]
-
-    if any(w in txt for w in broad_words):
+    if _matches(txt).has("place_name_broad"):
         return False
 
     if len(txt.strip()) < 3:
@@ -451,8 +597,7 @@ def _find_exact_name_matches(user_input: str, rows: List[Dict]) -> List[Dict]:
     near_exact = []
 
     for r in rows:
-        name = str(r.get("name") or "")
-        nn = _normalize_loose_text(name)
+        nn = place_text(r).name_norm
 
         if nn == qn:
             exact.append(r)
@@ -461,6 +606,50 @@ def _find_exact_name_matches(user_input: str, rows: List[Dict]) -> List[Dict]:
 
     return exact if exact else near_exact
 
+# ------------------------------
+# Weighted Scoring Configuration
+# น้ำหนักรวม = 1.00
+# ------------------------------
+W_NAME_SIM = 0.40
+W_BLOB_SIM = 0.25
+W_EXACT_NAME = 0.15
+W_CATEGORY = 0.10
+W_TAMBON = 0.06
+W_DETAIL = 0.04
+
+# ระยะทางถนนที่คะแนนความใกล้เหลือครึ่งหนึ่ง (ดู _road_scores)
+ROAD_DISTANCE_HALF_KM = 5.0
+
+# cdist แตก thread เมื่อมี candidate มากพอที่จะคุ้ม overhead
+RANK_WORKERS = -1
+RANK_PARALLEL_MIN_ROWS = 256
+
+def _cdist_scores(scorer, query: str, choices: List[str], workers: int) -> np.ndarray:
+    return process.cdist([query], choices, scorer=scorer, dtype=np.float64, workers=workers)[0]
+
+def _semantic_scores(query_text: str, rows: List[Dict]) -> Optional[np.ndarray]:
+    """cosine (0-1) ระหว่างคำถามกับแต่ละแถวจากดัชนีเวกเตอร์ (None ถ้าไม่ได้เปิดใช้)"""
+    index = embeddings.get_index()
+    if index is None or SEMANTIC_WEIGHT <= 0:
+        return None
+    ids = [r.get("id") for r in rows]
+    if all(i is None for i in ids):
+        return None
+    return np.clip(index.scores_for_ids(query_text, ids), 0.0, 1.0).astype(np.float64)
+
+def _road_scores(rows: List[Dict]) -> Optional[np.ndarray]:
+    """ความใกล้ตามถนน (0-1) จาก road_km ที่ road_graph.order_by_road เติมไว้: 0.5 ที่ ROAD_DISTANCE_HALF_KM
+    แถวที่ไปไม่ถึงได้ 0 (None ถ้าปิดไว้หรือไม่มีแถวไหนมี road_km เช่น NEARBY_ORDER = "straight")"""
+    if ROAD_DISTANCE_WEIGHT <= 0:
+        return None
+    road_km = [r.get("road_km") for r in rows]
+    if all(km is None for km in road_km):
+        return None
+    return np.array([
+        0.0 if km is None else ROAD_DISTANCE_HALF_KM / (ROAD_DISTANCE_HALF_KM + float(km)) for km in road_km
+    ])
+
+@tracing.traced("rank")
 def _rank(
     rows: List[Dict],
     query_text: str,
@@ -473,138 +662,121 @@ def _rank(
 
     q = _norm(query_text)
     q_norm = _normalize_loose_text(query_text)
-    scored = []
+    workers = RANK_WORKERS if len(rows) >= RANK_PARALLEL_MIN_ROWS else 1
+
+    texts = [place_text(r) for r in rows]
+    name_norms = [t.name_norm for t in texts]
+    blob_norms = [t.blob_norm for t in texts]
+    has_name_norm = np.array([bool(n) for n in name_norms])
+    has_blob_norm = np.array([bool(b) for b in blob_norms])
+
+    # 1) similarity score (0-1)
+    name_similarity = np.zeros(len(rows))
+    blob_similarity = np.zeros(len(rows))
+
+    if q:
+        name_similarity = _cdist_scores(fuzz.partial_ratio, q, [t.name_lower for t in texts], workers) / 100.0
+        blob_similarity = _cdist_scores(fuzz.partial_ratio, q, [t.blob for t in texts], workers) / 100.0
+
+    name_ratio = np.zeros(len(rows))
+    if q_norm:
+        name_ratio = _cdist_scores(fuzz.ratio, q_norm, name_norms, workers)
+        loose_name_similarity = np.where(has_name_norm, name_ratio / 100.0, 0.0)
+        name_similarity = np.maximum(name_similarity, loose_name_similarity)
+
+        loose_blob_similarity = _cdist_scores(fuzz.partial_ratio, q_norm, blob_norms, workers) / 100.0
+        blob_similarity = np.where(has_blob_norm, np.maximum(blob_similarity, loose_blob_similarity), blob_similarity)
+
+    name_similarity = np.clip(name_similarity, 0.0, 1.0)
+    blob_similarity = np.clip(blob_similarity, 0.0, 1.0)
+
+    # 2) exact / near exact score (0-1)
+    exact_name_score = np.zeros(len(rows))
+    if q_norm:
+        is_exact = np.array([nn == q_norm for nn in name_norms])
+        contains = np.array([bool(nn) and (q_norm in nn or nn in q_norm) for nn in name_norms])
+        exact_name_score = np.select(
+            [is_exact, name_ratio >= 92, name_ratio >= 88, contains],
+            [1.0, 0.85, 0.70, 0.50],
+            default=0.0,
+        )
+        exact_name_score = np.where(has_name_norm, exact_name_score, 0.0)
 
-    # ------------------------------
-    # Weighted Scoring Configuration
-    # น้ำหนักรวม = 1.00
-    # ------------------------------
-    W_NAME_SIM = 0.40
-    W_BLOB_SIM = 0.25
-    W_EXACT_NAME = 0.15
-    W_CATEGORY = 0.10
-    W_TAMBON = 0.06
-    W_DETAIL = 0.04
+    # 3) category match (0-1)
+    category_score = np.zeros(len(rows))
+    if prefer_category:
+        category_score = np.array([
+            1.0 if _category_matches_intent(t.category, prefer_category, t.cat_tags, t.category_norm) else 0.0
+            for t in texts
+        ])
+
+    # 4) tambon match (0-1)
+    tambon_score = np.zeros(len(rows))
+    if prefer_tambon:
+        want_tambon = _norm(prefer_tambon)
+        tambon_score = np.array([1.0 if want_tambon in t.tambon_lower else 0.0 for t in texts])
+
+    # 5) detail completeness (0-1)
+    detail_score = np.clip(np.array([t.detail_count for t in texts]) / 3.0, 0.0, 1.0)
+
+    # 6) weighted score
+    total_score = (
+        (name_similarity * W_NAME_SIM) +
+        (blob_similarity * W_BLOB_SIM) +
+        (exact_name_score * W_EXACT_NAME) +
+        (category_score * W_CATEGORY) +
+        (tambon_score * W_TAMBON) +
+        (detail_score * W_DETAIL)
+    )
 
-    for r in rows:
-        name = str(r.get("name") or "")
-        cat = str(r.get("category") or "")
-        tmb = str(r.get("tambon") or "")
-        desc = str(r.get("description") or "")
-        hi = str(r.get("highlight") or "")
-
-        name_norm = _normalize_loose_text(name)
-        blob = " ".join([name, cat, tmb, desc, hi]).lower()
-        blob_norm = _normalize_loose_text(blob)
-
-        # 1) similarity score (0-1)
-        name_similarity = 0.0
-        blob_similarity = 0.0
-
-        if q:
-            name_similarity = fuzz.partial_ratio(q, name.lower()) / 100.0
-            blob_similarity = fuzz.partial_ratio(q, blob) / 100.0
-
-        if q_norm and name_norm:
-            loose_name_similarity = fuzz.ratio(q_norm, name_norm) / 100.0
-            name_similarity = max(name_similarity, loose_name_similarity)
-
-        if q_norm and blob_norm:
-            loose_blob_similarity = fuzz.partial_ratio(q_norm, blob_norm) / 100.0
-            blob_similarity = max(blob_similarity, loose_blob_similarity)
-
-        name_similarity = _clamp01(name_similarity)
-        blob_similarity = _clamp01(blob_similarity)
-
-        # 2) exact / near exact score (0-1)
-        exact_name_score = 0.0
-        if q_norm and name_norm:
-            if q_norm == name_norm:
-                exact_name_score = 1.0
-            else:
-                name_ratio = fuzz.ratio(q_norm, name_norm)
-                if name_ratio >= 92:
-                    exact_name_score = 0.85
-                elif name_ratio >= 88:
-                    exact_name_score = 0.70
-                elif q_norm in name_norm or name_norm in q_norm:
-                    exact_name_score = 0.50
-
-        exact_name_score = _clamp01(exact_name_score)
-
-        # 3) category match (0-1)
-        category_score = 0.0
-        if prefer_category:
-            category_score = 1.0 if _category_matches_intent(cat, prefer_category) else 0.0
-
-        # 4) tambon match (0-1)
-        tambon_score = 0.0
-        if prefer_tambon:
-            tambon_score = 1.0 if _norm(prefer_tambon) in tmb.lower() else 0.0
-
-        # 5) detail completeness (0-1)
-        detail_count = 0
-        if hi:
-            detail_count += 1
-        if desc:
-            detail_count += 1
-        if r.get("image_url"):
-            detail_count += 1
-
-        detail_score = detail_count / 3.0
-        detail_score = _clamp01(detail_score)
-
-        # 6) weighted score
-        total_score = (
-            (name_similarity * W_NAME_SIM) +
-            (blob_similarity * W_BLOB_SIM) +
-            (exact_name_score * W_EXACT_NAME) +
-            (category_score * W_CATEGORY) +
-            (tambon_score * W_TAMBON) +
-            (detail_score * W_DETAIL)
-        )
+    # 7) semantic similarity: ผสมกับคะแนนข้างบนเมื่อมีดัชนีเวกเตอร์ (EMBEDDING_INDEX_PATH)
+    semantic_score = _semantic_scores(query_text, rows)
+    if semantic_score is not None:
+        total_score = (1.0 - SEMANTIC_WEIGHT) * total_score + SEMANTIC_WEIGHT * semantic_score
 
-        r["_score"] = round(total_score, 4)
-        scored.append((total_score, r))
+    # 8) ระยะทางตามถนน: ผสมแบบเดียวกันเมื่อผลมาจากการค้นหาใกล้ฉันที่เรียงตามถนน (NEARBY_ORDER = "road")
+    road_score = _road_scores(rows)
+    if road_score is not None:
+        total_score = (1.0 - ROAD_DISTANCE_WEIGHT) * total_score + ROAD_DISTANCE_WEIGHT * road_score
+
+    scored = []
+    for total, r in zip(total_score.tolist(), rows):
+        r["_score"] = round(total, 4)
+        scored.append((total, r))
 
     scored.sort(key=lambda x: x[0], reverse=True)
     return [r for _, r in scored[:top_k]]
 
+async def _rank_async(*args, **kwargs) -> List[Dict]:
+    """_rank ใน thread: ครั้งแรกโหลดดัชนีเวกเตอร์/โมเดล และทุกครั้งเข้ารหัสคำถาม (_semantic_scores)
+    รวมถึง cdist ของ rapidfuzz ซึ่งเป็นงาน CPU ที่ไม่ควรค้าง event loop ที่ทุก session ใช้ร่วมกัน"""
+    return await asyncio.to_thread(_rank, *args, **kwargs)
+
 def _is_allowed_for_intent(intent: Optional[str], place: Dict) -> bool:
     if not intent:
         return True
-    cat = str(place.get("category") or "")
-    return _category_matches_intent(cat, intent)
+    pt = place_text(place)
+    return _category_matches_intent(pt.category, intent, pt.cat_tags, pt.category_norm)
 
 def _apply_banned(rows: List[Dict], banned: Set[str]) -> List[Dict]:
     if not banned:
         return rows
 
-    def banned_cat(cat: str) -> bool:
-        c = (cat or "").strip().lower()
-        cat_tags = _split_category_tags(c)
-        for b in banned:
-            bb = _norm(b)
+    banned_norm = [_norm(b) for b in banned]
+
+    def banned_cat(pt) -> bool:
+        c = pt.category_norm
+        for bb in banned_norm:
             if bb in c:
                 return True
-            if any(bb == tag or bb in tag for tag in cat_tags):
+            if any(bb == tag or bb in tag for tag in pt.cat_tags):
                 return True
         return False
 
-    return [r for r in rows if not banned_cat(str(r.get("category") or ""))]
+    return [r for r in rows if not banned_cat(place_text(r))]
 
 def _is_broad_query(user_input: str, keywords: List[str]) -> bool:
-    txt = _norm(user_input)
-
-    broad_markers = [
-        "หิว", "มีอะไรให้กิน", "กินอะไรดี", "มีร้านแนะนำไหม", "ร้านแนะนำ",
-        "มีโรงพยาบาลไหม", "มีโรงพยาบาลแถวนี้ไหม", "มีร้านขายยาไหม", "มีคลินิกไหม",
-        "มีที่พักไหม", "มีคาเฟ่ไหม", "มีร้านอาหารไหม",
-        "มีวัดไหม", "มีตลาดไหม", "มีปั๊มไหม", "มีธนาคารไหม",
-        "มีมัสยิดไหม", "มีสถานีรถไฟไหม", "อยากกินกาแฟ"
-    ]
-
-    if any(w in txt for w in broad_markers):
+    if _matches(user_input).has("broad_marker"):
         return True
 
     if len(keywords) == 1 and len(keywords[0]) >= 10:
@@ -640,7 +812,7 @@ def _fallback_reply(user_input: str, prefer_category: Optional[str]) -> str:
 
     return "ผมอาจยังตีความคำนี้ไม่ครบครับ \n" + _category_examples_text()
 
-def _search_by_context(
+async def _search_by_context(
     user_input: str,
     user_lat: Optional[float],
     user_lng: Optional[float],
@@ -650,7 +822,7 @@ def _search_by_context(
     limit: int = 30
 ) -> List[Dict]:
     if user_lat is not None and user_lng is not None:
-        return search_places_nearby(
+        return await db_async.search_places_nearby(
             user_lat,
             user_lng,
             category=prefer_category,
@@ -658,31 +830,129 @@ def _search_by_context(
             keywords_any=keywords,
             limit=limit
         )
-    return search_places(
+    return await db_async.search_places(
         category=prefer_category,
         tambon=prefer_tambon,
         keywords_any=keywords,
         limit=limit
     )
 
-def _broader_category_fallback(
+# กลยุทธ์ค้นหาที่ fallback ของ get_answer อาจใช้ ดึงมาพร้อมกันใน round-trip เดียว:
+# ตามคีย์เวิร์ด (limit 30) และทั้งหมวด (limit 40 ของ _broader_category_fallback;
+# 30 แถวแรกคือผลของ query ไม่มีคีย์เวิร์ด limit 30 เพราะ ORDER BY เดียวกันและมี id ตัดสินเมื่อค่าเท่ากัน)
+STRATEGY_KEYWORD = "keyword"
+STRATEGY_ALL = "all"
+SEARCH_LIMIT = 30
+BROADER_LIMIT = 40
+# เริ่ม query ตามหมวดที่เดาได้ระหว่างรอ LLM (ปิดได้เพื่อเทียบเวลาใน benchmarks/bench_async.py)
+SPECULATIVE_SEARCH = True
+
+NEARBY_WITHIN_KM = 20.0
+
+async def _with_semantic_candidates(
+    user_input: str,
+    rows: List[Dict],
+    user_lat: Optional[float],
+    user_lng: Optional[float],
+    prefer_tambon: Optional[str] = None,
+) -> List[Dict]:
+    """rows[:SEARCH_LIMIT] นำหน้าด้วยสถานที่ที่ใกล้เคียงคำถามเชิงความหมาย (เมื่อมีดัชนีเวกเตอร์) รวมไม่เกิน SEARCH_LIMIT
+    ใช้ตอนคีย์เวิร์ดไม่เจออะไร: คำถามที่ใช้คำต่างจากในฐานข้อมูลยังได้ผลตรงเรื่อง
+    ผลเชิงความหมายต้องได้ cosine อย่างน้อย SEMANTIC_MIN_SCORE และผ่านเงื่อนไขตำบลเดียวกับ SQL (tambon ILIKE)"""
+    rows = rows[:SEARCH_LIMIT]
+    # ครั้งแรกโหลดดัชนีและโมเดลจากดิสก์: ทำใน thread เหมือน index.search
+    index = await asyncio.to_thread(embeddings.get_index)
+    if index is None:
+        return rows
+
+    hits = await asyncio.to_thread(index.search, user_input, SEMANTIC_TOP_K)
+    seen = {r.get("id") for r in rows}
+    extra = await db_async.fetch_places_by_ids(
+        [i for i, score in hits if score >= SEMANTIC_MIN_SCORE and i not in seen]
+    )
+
+    if prefer_tambon:
+        tmb = prefer_tambon.lower()
+        extra = [r for r in extra if tmb in (r.get("tambon") or "").lower()]
+
+    if user_lat is not None and user_lng is not None:
+        nearby = []
+        for r in extra:
+            if r.get("latitude") is None or r.get("longitude") is None:
+                continue
+            d = great_circle_km(float(user_lat), float(user_lng), float(r["latitude"]), float(r["longitude"]))
+            if d <= NEARBY_WITHIN_KM:
+                r["distance_km"] = d
+                nearby.append(r)
+        extra = nearby
+
+    return (extra + rows)[:SEARCH_LIMIT]
+
+class _SearchBatch:
+    """ผลค้นหาของ get_answer หนึ่งรอบ: เริ่มเป็น task ล่วงหน้าได้ (รันพร้อม LLM) และไม่ยิงซ้ำเมื่อเงื่อนไขเดิม"""
+
+    def __init__(self, user_input: str, user_lat: Optional[float], user_lng: Optional[float]):
+        self.user_input = user_input
+        self.user_lat = user_lat
+        self.user_lng = user_lng
+        self._tasks: Dict[tuple, asyncio.Task] = {}
+
+    def start(self, prefer_category: Optional[str], prefer_tambon: Optional[str],
+              keywords: Optional[List[str]]) -> asyncio.Task:
+        key = (prefer_category, prefer_tambon, tuple(keywords) if keywords else None)
+        task = self._tasks.get(key)
+        if task is None:
+            strategies = {}
+            # คำถามกว้างใช้ผลทั้งหมวด: กลยุทธ์คีย์เวิร์ดจะถูกใช้แค่ใน fallback ซึ่ง _answer_search ยิงเองเมื่อถึง
+            if keywords and not _is_broad_query(self.user_input, keywords):
+                strategies[STRATEGY_KEYWORD] = (keywords, SEARCH_LIMIT)
+            strategies[STRATEGY_ALL] = (None, BROADER_LIMIT)
+            task = asyncio.ensure_future(db_async.search_places_multi(
+                strategies,
+                category=prefer_category,
+                tambon=prefer_tambon,
+                lat=self.user_lat,
+                lng=self.user_lng,
+            ))
+            self._tasks[key] = task
+        return task
+
+    async def fetch(self, prefer_category: Optional[str], prefer_tambon: Optional[str],
+                    keywords: Optional[List[str]]) -> Dict[str, List[Dict]]:
+        """ผลของ task (ใช้ร่วมเมื่อเงื่อนไขซ้ำ) เป็นสำเนาแถวต่อผู้เรียก เพราะ _rank เขียน _score ลงแถว"""
+        results = await self.start(prefer_category, prefer_tambon, keywords)
+        return {tag: [dict(r) for r in rows] for tag, rows in results.items()}
+
+    async def cancel_pending(self):
+        """ยกเลิก query ที่เริ่มไว้แต่ไม่ได้ใช้ (เช่น query คาดล่วงหน้าที่ LLM ตอบไม่ตรง)
+        แล้วรอให้จบ: error ของ task ที่ไม่มีใครรอจะกลายเป็นคำเตือน Task exception was never retrieved"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _broader_category_fallback(
     user_input: str,
     user_lat: Optional[float],
     user_lng: Optional[float],
     prefer_tambon: Optional[str],
     prefer_category: Optional[str],
-    banned_set: Set[str]
+    banned_set: Set[str],
+    rows: Optional[List[Dict]] = None
 ) -> List[Dict]:
-    base = _search_by_context(
-        user_input=user_input,
-        user_lat=user_lat,
-        user_lng=user_lng,
-        prefer_tambon=prefer_tambon,
-        keywords=None,
-        prefer_category=prefer_category,
-        limit=40
-    )
-    base = _apply_banned(base, banned_set)
+    if rows is None:
+        rows = await _search_by_context(
+            user_input=user_input,
+            user_lat=user_lat,
+            user_lng=user_lng,
+            prefer_tambon=prefer_tambon,
+            keywords=None,
+            prefer_category=prefer_category,
+            limit=BROADER_LIMIT
+        )
+    base = _apply_banned(rows, banned_set)
 
     if prefer_category:
         filtered = [p for p in base if _is_allowed_for_intent(prefer_category, p)]
@@ -690,18 +960,18 @@ def _broader_category_fallback(
         filtered = _post_filter_results_by_query(filtered, user_input, prefer_category)
 
         if _is_strict_category(prefer_category):
-            return _rank(filtered, user_input, prefer_category, prefer_tambon) if filtered else []
+            return await _rank_async(filtered, user_input, prefer_category, prefer_tambon) if filtered else []
 
         if filtered:
-            return _rank(filtered, user_input, prefer_category, prefer_tambon)
+            return await _rank_async(filtered, user_input, prefer_category, prefer_tambon)
 
     base = _strict_category_filter(base, prefer_category)
-    ranked = _rank(base, user_input, prefer_category, prefer_tambon)
+    ranked = await _rank_async(base, user_input, prefer_category, prefer_tambon)
     ranked = _post_filter_results_by_query(ranked, user_input, prefer_category)
     return ranked
 
 # ---------- Intent ----------
-def _understand(user_input: str, history_text: str) -> dict:
+def _intent_prompt(user_input: str, history_text: str) -> str:
     sys = (
         "คุณคือผู้ช่วยท้องถิ่นของอำเภอปะทิว จังหวัดชุมพร "
         "ตัดสินใจว่าผู้ใช้กำลังอยาก 'ค้นหาสถานที่' หรือ 'คุยทั่วไป'. "
@@ -712,7 +982,7 @@ def _understand(user_input: str, history_text: str) -> dict:
         "ถ้ามี keyword สำคัญให้คืน keywords ด้วย. ตอบเฉพาะ JSON."
     )
 
-    prompt = f'''{sys}
+    return f'''{sys}
 บริบทก่อนหน้า: {history_text or "(ไม่มี)"}
 ผู้ใช้: "{user_input}"
 
@@ -725,49 +995,173 @@ def _understand(user_input: str, history_text: str) -> dict:
 }}
 '''
 
+def _parse_intent(res) -> dict:
+    data = _safe_json(getattr(res, "text", ""))
+    return {
+        "want_search": bool(data.get("want_search")),
+        "category": data.get("category"),
+        "tambon": data.get("tambon"),
+        "keywords": data.get("keywords"),
+    }
+
+_EMPTY_INTENT = {"want_search": False, "category": None, "tambon": None, "keywords": None}
+
+def _understand_llm(user_input: str, history_text: str) -> Tuple[dict, bool]:
     try:
-        res = model.generate_content(prompt)
-        data = _safe_json(getattr(res, "text", ""))
-        return {
-            "want_search": bool(data.get("want_search")),
-            "category": data.get("category"),
-            "tambon": data.get("tambon"),
-            "keywords": data.get("keywords"),
-        }
+        res = model.generate_content(_intent_prompt(user_input, history_text))
+        return _parse_intent(res), True
     except Exception as e:
         print(f"DEBUG: _understand error: {str(e)}")
-        return {"want_search": False, "category": None, "tambon": None, "keywords": None}
+        return dict(_EMPTY_INTENT), False
+
+async def _understand_llm_async(user_input: str, history_text: str) -> Tuple[dict, bool]:
+    try:
+        res = await model.generate_content_async(_intent_prompt(user_input, history_text))
+        return _parse_intent(res), True
+    except Exception as e:
+        print(f"DEBUG: _understand error: {str(e)}")
+        return dict(_EMPTY_INTENT), False
+
+_INTENT_CACHE = IntentCache(INTENT_CACHE_SIZE, INTENT_CACHE_TTL, INTENT_CACHE_PATH or None)
+
+def _intent_cache_key(user_input: str, history_text: str) -> Optional[str]:
+    """key = คำถามที่ normalize แล้ว + hash ของประวัติส่วนที่เกี่ยวข้อง (None = ไม่ควร cache)"""
+    q = _normalize_loose_text(user_input)
+    if not q:
+        return None
+
+    if _matches(user_input).has("context_ref"):
+        return None
+
+    relevant = ""
+    if len(q) <= SHORT_QUERY_CHARS:
+        user_lines = [
+            _normalize_loose_text(line[len("ผู้ใช้:"):])
+            for line in (history_text or "").split("\n")
+            if line.startswith("ผู้ใช้:")
+        ]
+        # ประวัติจาก app.py มีคำถามปัจจุบันเป็นบรรทัดสุดท้ายอยู่แล้ว
+        if user_lines and user_lines[-1] == q:
+            user_lines = user_lines[:-1]
+        relevant = user_lines[-1] if user_lines else ""
+
+    digest = hashlib.sha1(relevant.encode("utf-8")).hexdigest()[:16]
+    return f"{q}|{digest}"
+
+@tracing.traced("understand")
+async def _understand(user_input: str, history_text: str) -> dict:
+    key = _intent_cache_key(user_input, history_text)
+    if key is None:
+        _INTENT_CACHE.note_skip()
+        return (await _understand_llm_async(user_input, history_text))[0]
+
+    cached = _INTENT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    u, ok = await _understand_llm_async(user_input, history_text)
+    if ok:
+        _INTENT_CACHE.put(key, u)
+    return u
+
+def intent_cache_stats() -> Dict:
+    return _INTENT_CACHE.stats()
+
+_LOCAL_INTENT_STATS = {"turns": 0, "llm_skipped": 0}
+
+async def _resolve_intent(user_input: str, history_text: str) -> dict:
+    """ใช้ผลจากตัวจำแนกในเครื่องแทน _understand เมื่อมั่นใจเกิน LOCAL_INTENT_THRESHOLD"""
+    _LOCAL_INTENT_STATS["turns"] += 1
+
+    cat, confidence = _local_intent(user_input)
+    if cat and confidence >= LOCAL_INTENT_THRESHOLD:
+        _LOCAL_INTENT_STATS["llm_skipped"] += 1
+        return {
+            "want_search": True,
+            "category": cat,
+            "tambon": _local_guess_tambon(user_input),
+            "keywords": None,
+        }
+
+    return await _understand(user_input, history_text)
+
+def local_intent_stats() -> Dict:
+    out = dict(_LOCAL_INTENT_STATS)
+    out["llm_skip_ratio"] = out["llm_skipped"] / out["turns"] if out["turns"] else 0.0
+    return out
 
-def _reply_chitchat(user_input: str, history_text: str) -> str:
-    prompt = (
+
+def _chitchat_prompt(user_input: str, history_text: str) -> str:
+    return (
         "คุณคือเพื่อนผู้ช่วยท้องถิ่นของอำเภอปะทิว ตอบสั้น สุภาพ อบอุ่น "
         f"บริบทก่อนหน้า:\n{history_text or '(ไม่มีประวัติ)'}\n\n"
         f"ผู้ใช้: {user_input}\nตอบ:"
     )
+
+@tracing.traced("llm.chitchat")
+async def _reply_chitchat(user_input: str, history_text: str) -> str:
+    prompt = _chitchat_prompt(user_input, history_text)
     try:
-        res = model.generate_content(prompt)
+        res = await model.generate_content_async(prompt)
         return (getattr(res, "text", "") or "").strip() or "ครับผม"
     except Exception as e:
         return f"ขออภัยครับ เกิดข้อผิดพลาดกับ AI: {str(e)}"
 
+_STREAM_STATS = {"streams": 0, "ttft_total": 0.0, "ttft_max": 0.0, "total_seconds": 0.0}
+
+def _reply_chitchat_stream(user_input: str, history_text: str) -> Iterator[str]:
+    """_reply_chitchat แบบ stream: yield ข้อความทีละ chunk ตามที่ LLM ส่งมา
+
+    เป็น generator แบบ sync เพื่อให้ st.write_stream ใน app.py ดึงได้ตรงๆ
+    (ยังไม่เรียก LLM จนกว่าจะเริ่มวน) และจับเวลาถึง chunk แรก (TTFT) ไว้ใน _STREAM_STATS
+    """
+    prompt = _chitchat_prompt(user_input, history_text)
+    start = time.perf_counter()
+    first_at: Optional[float] = None
+    try:
+        for chunk in model.generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "") or ""
+            if not text:
+                continue
+            if first_at is None:
+                first_at = time.perf_counter()
+            yield text
+        if first_at is None:
+            first_at = time.perf_counter()
+            yield "ครับผม"
+    except Exception as e:
+        if first_at is None:
+            first_at = time.perf_counter()
+        yield f"ขออภัยครับ เกิดข้อผิดพลาดกับ AI: {str(e)}"
+    finally:
+        if first_at is not None:
+            ttft = first_at - start
+            _STREAM_STATS["streams"] += 1
+            _STREAM_STATS["ttft_total"] += ttft
+            _STREAM_STATS["ttft_max"] = max(_STREAM_STATS["ttft_max"], ttft)
+            _STREAM_STATS["total_seconds"] += time.perf_counter() - start
+            tracing.record("llm.chitchat_stream.ttft", ttft)
+            tracing.record("llm.chitchat_stream", time.perf_counter() - start)
+
+def chitchat_stream_stats() -> Dict:
+    out = dict(_STREAM_STATS)
+    n = out["streams"]
+    out["ttft_avg"] = out["ttft_total"] / n if n else 0.0
+    out["total_avg"] = out["total_seconds"] / n if n else 0.0
+    return out
+
 # ---------- Detection ----------
 def _looks_like_followup(q: str) -> bool:
     q = q.strip().lower()
     return any(re.search(p, q) for p in FOLLOWUP_PATTERNS)
 
 def _looks_like_map_request(q: str) -> bool:
-    q = (q or "").strip().lower()
-    keywords = ["แผนที่", "พิกัด", "ไปยังไง", "เส้นทาง", "ที่อยู่", "ไหนอะ", "ตรงไหน", "ขอแผนที่", "เปิดแผนที่"]
-    return any(k in q for k in keywords)
+    return _matches(q).has("map")
 
 def _looks_like_image_request(q: str) -> bool:
     q = (q or "").strip().lower()
 
-    explicit_keywords = [
-        "มีรูปไหม", "ขอรูป", "ดูรูป", "ดูภาพ", "มีภาพไหม",
-        "ส่งรูป", "ขอภาพ", "รูปของ", "ภาพของ"
-    ]
-    if any(k in q for k in explicit_keywords):
+    if _matches(q).has("image"):
         return True
 
     if q in {"รูป", "ภาพ"}:
@@ -776,17 +1170,13 @@ def _looks_like_image_request(q: str) -> bool:
     return False
 
 def _looks_like_photo_spot_query(q: str) -> bool:
-    q = _norm(q)
-    return any(k in q for k in PHOTO_SPOT_WORDS)
+    return _matches(q).has("photo")
 
 def _looks_like_choose_request(q: str) -> bool:
-    q = q.strip().lower()
-    phrases = ["เลือก", "ช่วยเลือก", "แนะนำ", "ร้านไหนดี", "ไหนดี", "เลือกสักร้าน", "เลือกให้หน่อย", "มีร้านแนะนำไหม"]
-    return any(p in q for p in phrases)
+    return _matches(q).has("choose")
 
 def _looks_like_nearby_followup(q: str) -> bool:
-    q = _norm(q)
-    return any(k in q for k in NEARBY_WORDS)
+    return _matches(q).has("nearby")
 
 def _extract_place_name(q: str) -> Optional[str]:
     s = q
@@ -803,30 +1193,30 @@ def _extract_place_name(q: str) -> Optional[str]:
     return s if len(s) >= 2 else None
 
 def _text_to_category(txt: str) -> Optional[str]:
-    t = _norm(txt)
+    m = _matches(txt)
 
     for c in CANON_CATS:
-        if _norm(c) in t:
+        if m.has(("canon", c)):
             return c
 
     scores = {}
-    for cat, words in CATEGORY_SYNONYMS.items():
-        score = sum(1 for w in words if _norm(w) in t)
+    for cat in CATEGORY_SYNONYMS:
+        score = m.count(("syn", cat))
         if score > 0:
             scores[cat] = score
 
     if scores:
         return sorted(scores.items(), key=lambda x: x[1], reverse=True)[0][0]
 
-    for cat, words in LOCAL_CATEGORY_HINTS.items():
-        if any(w in t for w in words):
+    for cat in LOCAL_CATEGORY_HINTS:
+        if m.has(("hint", cat)):
             return cat
 
     return None
 
 def _extract_ban_categories(user_input: str, last_results: List[Dict]) -> List[str]:
     t = _norm(user_input)
-    if not any(w in t for w in NEG_WORDS):
+    if not _matches(t).has("neg"):
         return []
 
     cat = _text_to_category(t)
@@ -844,7 +1234,7 @@ def _extract_ban_categories(user_input: str, last_results: List[Dict]) -> List[s
                     return [guessed]
     return []
 
-def _pick_focus_place(focus_place_id, last_results, maybe_name=None):
+async def _pick_focus_place(focus_place_id, last_results, maybe_name=None):
     if focus_place_id and last_results:
         for p in last_results:
             if p.get("id") == focus_place_id:
@@ -854,7 +1244,7 @@ def _pick_focus_place(focus_place_id, last_results, maybe_name=None):
         return last_results[0]
 
     if maybe_name:
-        found = search_places(keywords_any=[maybe_name], limit=10)
+        found = await db_async.search_places(keywords_any=[maybe_name], limit=10)
         if not found:
             return None
 
@@ -864,7 +1254,7 @@ def _pick_focus_place(focus_place_id, last_results, maybe_name=None):
 
         best, score = None, -1
         for p in found:
-            s = fuzz.partial_ratio(maybe_name.lower(), (p.get("name") or "").lower())
+            s = fuzz.partial_ratio(maybe_name.lower(), place_text(p).name_lower)
             if s > score:
                 best, score = p, s
         return best
@@ -877,9 +1267,8 @@ def _infer_intent_from_last_results(last_results: List[Dict]) -> Optional[str]:
 
     score_map = {}
     for p in last_results:
-        cat = str(p.get("category") or "")
         for canon in CANON_CATS:
-            if _category_matches_intent(cat, canon):
+            if _is_allowed_for_intent(canon, p):
                 score_map[canon] = score_map.get(canon, 0) + 1
 
     if not score_map:
@@ -946,13 +1335,13 @@ def _reply_for_found_places(user_input: str, places: List[Dict], category: Optio
     if not places:
         return "ผมยังหาไม่เจอแบบตรงคำนี้ครับ แต่ลองบอกประเภทเพิ่มได้นะครับ"
 
-    txt = _norm(user_input)
+    m = _matches(user_input)
     detected_category = _infer_category_from_places(places)
     final_category = detected_category or category
 
-    if final_category == "วัด" or any(w in txt for w in ["ทำบุญ", "ไหว้พระ", "วัด", "สำนักสงฆ์"]):
+    if final_category == "วัด" or m.has("temple"):
         return "ได้เลยครับ นี่คือสถานที่สำหรับทำบุญหรือไหว้พระที่ผมหามาให้ครับ"
-    if final_category == "ร้านอาหาร" or any(w in txt for w in ["หิว", "กิน", "อาหาร", "ของกิน", "ร้านแนะนำ"]):
+    if final_category == "ร้านอาหาร" or m.has("food_reply"):
         return "ได้เลยครับ นี่คือร้านอาหารที่น่าลองในปะทิวครับ"
     if final_category == "คาเฟ่":
         return "ได้เลยครับ นี่คือคาเฟ่ที่น่าสนใจครับ"
@@ -993,7 +1382,7 @@ def _reply_for_nearby_found_places(reference_place: Dict, found_places: List[Dic
 
     return f"นี่คือสถานที่ใกล้ **{ref_name}** ที่ผมหามาให้ครับ"
 
-def _search_near_reference_place(
+async def _search_near_reference_place(
     user_input: str,
     history_text: str,
     reference_place: Dict,
@@ -1006,7 +1395,7 @@ def _search_near_reference_place(
     if ref_lat is None or ref_lng is None:
         return ("ขออภัยครับ สถานที่อ้างอิงนี้ยังไม่มีพิกัด จึงยังหาแบบใกล้ๆ ไม่ได้ครับ", [], list(banned_set))
 
-    u = _understand(user_input, history_text)
+    u = await _resolve_intent(user_input, history_text)
     guessed_cat = _forced_category_fallback(user_input) or _intent_from_keywords(user_input) or _local_guess_category(user_input)
     prefer_category = guessed_cat or u.get("category")
 
@@ -1016,7 +1405,7 @@ def _search_near_reference_place(
     nearby_keywords = _extract_keywords_for_nearby(user_input, u.get("keywords"), prefer_category)
     broad_query = _is_broad_query(user_input, nearby_keywords)
 
-    base = search_places_nearby(
+    base = await db_async.search_places_nearby(
         ref_lat,
         ref_lng,
         category=prefer_category,
@@ -1039,11 +1428,11 @@ def _search_near_reference_place(
     if ref_id is not None:
         base = [p for p in base if p.get("id") != ref_id]
 
-    ranked = _rank(base, user_input, prefer_category, None)
+    ranked = await _rank_async(base, user_input, prefer_category, None)
     ranked = _post_filter_results_by_query(ranked, user_input, prefer_category)
 
     if not ranked:
-        base2 = search_places_nearby(
+        base2 = await db_async.search_places_nearby(
             ref_lat,
             ref_lng,
             category=None,
@@ -1064,7 +1453,7 @@ def _search_near_reference_place(
         if ref_id is not None:
             base2 = [p for p in base2 if p.get("id") != ref_id]
 
-        ranked = _rank(base2, user_input, prefer_category, None)
+        ranked = await _rank_async(base2, user_input, prefer_category, None)
         ranked = _post_filter_results_by_query(ranked, user_input, prefer_category)
 
     if not ranked:
@@ -1079,7 +1468,7 @@ def _search_near_reference_place(
     return (reply, ranked, list(banned_set))
 
 # ---------- Main ----------
-def get_answer(
+async def get_answer_async(
     user_input: str,
     user_lat: Optional[float] = None,
     user_lng: Optional[float] = None,
@@ -1087,7 +1476,39 @@ def get_answer(
     focus_place_id: Optional[int] = None,
     last_results: Optional[List[Dict]] = None,
     banned_categories: Optional[List[str]] = None,
-) -> Tuple[str, List[Dict], List[str]]:
+    stream: bool = False,
+) -> Tuple[Union[str, Iterator[str]], List[Dict], List[str]]:
+    """คืน (คำตอบ, สถานที่, หมวดที่แบน) ทุกรอบถูกบันทึกเป็น trace "get_answer" (ดู tracing.py)
+
+    stream=True: ถ้ารอบนี้เป็นคุยเล่น คำตอบจะเป็น generator ของ chunk จาก LLM แทน str
+    (ผู้เรียกต้องวนเอาเอง) กรณีอื่นเป็น str เหมือนเดิม
+    """
+    with tracing.trace("get_answer", nearby=user_lat is not None and user_lng is not None):
+        reply, places, banned = await _get_answer(
+            user_input, user_lat, user_lng, history, focus_place_id,
+            last_results, banned_categories, stream,
+        )
+        return reply, await _hydrate(places), banned
+
+async def _hydrate(places: List[Dict]) -> List[Dict]:
+    """ผลค้นหาจาก Postgres มาแบบ light (ไม่มี image_urls) เติมให้ครบเฉพาะแถวที่ตอบจริงใน query เดียว"""
+    try:
+        return await db_async.hydrate_places(places)
+    except Exception as e:
+        # ขาดแค่รายการรูป ยังตอบได้
+        print(f"DEBUG: hydrate error: {str(e)}")
+        return places
+
+async def _get_answer(
+    user_input: str,
+    user_lat: Optional[float],
+    user_lng: Optional[float],
+    history: Optional[List[Dict]],
+    focus_place_id: Optional[int],
+    last_results: Optional[List[Dict]],
+    banned_categories: Optional[List[str]],
+    stream: bool,
+) -> Tuple[Union[str, Iterator[str]], List[Dict], List[str]]:
     try:
         history = history or []
         history_text = _history_to_text(history, max_turns=8)
@@ -1121,7 +1542,7 @@ def get_answer(
                     name = best.get("name", "สถานที่นี้")
                     return (f"ผมขอแนะนำ **{name}** ครับ", [best], list(banned_set))
 
-            base = _broader_category_fallback(
+            base = await _broader_category_fallback(
                 user_input=user_input,
                 user_lat=user_lat,
                 user_lng=user_lng,
@@ -1141,7 +1562,7 @@ def get_answer(
             pass
         elif _looks_like_followup(user_input) or _looks_like_map_request(user_input) or _looks_like_image_request(user_input):
             maybe_name = _extract_place_name(user_input)
-            place = _pick_focus_place(focus_place_id, last_results, maybe_name)
+            place = await _pick_focus_place(focus_place_id, last_results, maybe_name)
             if place:
                 if _looks_like_map_request(user_input):
                     return ("นี่ครับ แผนที่พิกัดของสถานที่", [place], list(banned_set))
@@ -1150,10 +1571,10 @@ def get_answer(
                 return (_format_place_answer_from_existing_fields(place, user_input), [place], list(banned_set))
 
         maybe_named_place = _extract_place_name(user_input)
-        focus_place = _pick_focus_place(focus_place_id, last_results, maybe_named_place)
+        focus_place = await _pick_focus_place(focus_place_id, last_results, maybe_named_place)
 
         if _looks_like_nearby_followup(user_input) and focus_place:
-            return _search_near_reference_place(
+            return await _search_near_reference_place(
                 user_input=user_input,
                 history_text=history_text,
                 reference_place=focus_place,
@@ -1163,7 +1584,7 @@ def get_answer(
 
         if _looks_like_explicit_place_name_query(user_input):
             q_compact = _normalize_loose_text(user_input)
-            exact_candidates = search_places(
+            exact_candidates = await db_async.search_places(
                 category=None,
                 tambon=None,
                 keywords_any=[user_input, q_compact],
@@ -1173,51 +1594,84 @@ def get_answer(
 
             exact_matches = _find_exact_name_matches(user_input, exact_candidates)
             if exact_matches:
-                ranked_exact = _rank(exact_matches, user_input, None, None, top_k=5)
+                ranked_exact = await _rank_async(exact_matches, user_input, None, None, top_k=5)
                 return ("นี่คือสถานที่ที่คุณค้นหาครับ", ranked_exact[:1], list(banned_set))
 
-        u = _understand(user_input, history_text)
-
         guessed_cat = (
             _forced_category_fallback(user_input)
             or _intent_from_keywords(user_input)
             or _local_guess_category(user_input)
         )
-        txt = user_input.lower()
 
-        if not u.get("want_search") and guessed_cat:
-            u["want_search"] = True
-            u["category"] = guessed_cat
-
-        if not u.get("want_search"):
-            if any(w in txt for w in [
-                "กาแฟ", "ข้าว", "อาหาร", "หิว", "กิน", "ของกิน", "ปั๊ม",
-                "เที่ยว", "ที่พัก", "โรงแรม", "รีสอร์ท", "ยิม", "วัด", "ตลาด", "ยา",
-                "โรงพยาบาล", "คลินิก", "อนามัย", "เครื่องดื่ม",
-                "ตัดผม", "เสริมสวย", "บาร์เบอร์", "ทำบุญ", "ไหว้พระ", "ทะเล", "ชายหาด", "หาด", "อ่าว",
-                "ถ่ายรูป", "ถ่ายภาพ", "มุมถ่ายรูป", "จุดถ่ายรูป", "วิวสวย"
-            ]):
-                u["want_search"] = True
-                u["category"] = guessed_cat or "สถานที่ท่องเที่ยว"
-
-        if not u.get("want_search"):
-            return (_reply_chitchat(user_input, history_text), [], list(banned_set))
-
-        prefer_category = guessed_cat or u.get("category")
-        prefer_tambon = u.get("tambon")
-        keywords = _extract_keywords(user_input, u.get("keywords"))
-        broad_query = _is_broad_query(user_input, keywords)
-
-        base = _search_by_context(
-            user_input=user_input,
-            user_lat=user_lat,
-            user_lng=user_lng,
-            prefer_tambon=prefer_tambon,
-            keywords=None if broad_query else keywords,
-            prefer_category=prefer_category,
-            limit=30
+        searches = _SearchBatch(user_input, user_lat, user_lng)
+        try:
+            return await _answer_search(
+                user_input, history_text, guessed_cat, searches, banned_set, stream
+            )
+        finally:
+            await searches.cancel_pending()
+
+    except Exception as e:
+        return (
+            f"เกิดข้อผิดพลาดในการประมวลผล: {str(e)}",
+            [],
+            (banned_categories or [])
         )
 
+async def _answer_search(
+    user_input: str,
+    history_text: str,
+    guessed_cat: Optional[str],
+    searches: _SearchBatch,
+    banned_set: Set[str],
+    stream: bool = False,
+) -> Tuple[Union[str, Iterator[str]], List[Dict], List[str]]:
+    if guessed_cat and SPECULATIVE_SEARCH:
+        # หมวดจากพจนานุกรมทับผลของ LLM เสมอ จึงเริ่ม query ด้วยเงื่อนไขที่คาดไว้ระหว่างรอ LLM ได้เลย
+        # ถ้า LLM ให้ตำบล/คีย์เวิร์ดต่างไป query นี้จะถูกยกเลิกแล้วยิงใหม่ตามผลจริง
+        searches.start(guessed_cat, _local_guess_tambon(user_input), _extract_keywords(user_input, None))
+
+    u = await _resolve_intent(user_input, history_text)
+    txt = user_input.lower()
+
+    if not u.get("want_search") and guessed_cat:
+        u["want_search"] = True
+        u["category"] = guessed_cat
+
+    if not u.get("want_search"):
+        if _matches(txt).has("search_hint"):
+            u["want_search"] = True
+            u["category"] = guessed_cat or "สถานที่ท่องเที่ยว"
+
+    if not u.get("want_search"):
+        if stream:
+            return (_reply_chitchat_stream(user_input, history_text), [], list(banned_set))
+        return (await _reply_chitchat(user_input, history_text), [], list(banned_set))
+
+    prefer_category = guessed_cat or u.get("category")
+    prefer_tambon = u.get("tambon")
+    keywords = _extract_keywords(user_input, u.get("keywords"))
+    broad_query = _is_broad_query(user_input, keywords)
+
+    results = await searches.fetch(prefer_category, prefer_tambon, keywords)
+    everything = results[STRATEGY_ALL]
+
+    base = everything[:SEARCH_LIMIT] if broad_query or not keywords else results[STRATEGY_KEYWORD]
+
+    base = _apply_banned(base, banned_set)
+
+    if prefer_category:
+        filtered_by_intent = [p for p in base if _is_allowed_for_intent(prefer_category, p)]
+        if filtered_by_intent:
+            base = filtered_by_intent
+
+    base = _strict_category_filter(base, prefer_category)
+    base = _post_filter_results_by_query(base, user_input, prefer_category)
+
+    if not base and keywords:
+        base = await _with_semantic_candidates(
+            user_input, everything, searches.user_lat, searches.user_lng, prefer_tambon
+        )
         base = _apply_banned(base, banned_set)
 
         if prefer_category:
@@ -1228,75 +1682,120 @@ def get_answer(
         base = _strict_category_filter(base, prefer_category)
         base = _post_filter_results_by_query(base, user_input, prefer_category)
 
-        if not base and keywords:
-            base = _search_by_context(
+    ranked = await _rank_async(base, user_input, prefer_category, prefer_tambon)
+    ranked = _post_filter_results_by_query(ranked, user_input, prefer_category)
+
+    if not ranked and keywords:
+        base2 = results.get(STRATEGY_KEYWORD)
+        if base2 is None:
+            base2 = await _search_by_context(
                 user_input=user_input,
-                user_lat=user_lat,
-                user_lng=user_lng,
+                user_lat=searches.user_lat,
+                user_lng=searches.user_lng,
                 prefer_tambon=prefer_tambon,
-                keywords=None,
+                keywords=keywords,
                 prefer_category=prefer_category,
-                limit=30
+                limit=SEARCH_LIMIT
             )
-            base = _apply_banned(base, banned_set)
+        base2 = _apply_banned(base2, banned_set)
 
-            if prefer_category:
-                filtered_by_intent = [p for p in base if _is_allowed_for_intent(prefer_category, p)]
-                if filtered_by_intent:
-                    base = filtered_by_intent
+        if prefer_category:
+            filtered_by_intent = [p for p in base2 if _is_allowed_for_intent(prefer_category, p)]
+            if filtered_by_intent:
+                base2 = filtered_by_intent
 
-            base = _strict_category_filter(base, prefer_category)
-            base = _post_filter_results_by_query(base, user_input, prefer_category)
+        base2 = _strict_category_filter(base2, prefer_category)
+        base2 = _post_filter_results_by_query(base2, user_input, prefer_category)
 
-        ranked = _rank(base, user_input, prefer_category, prefer_tambon)
+        ranked = await _rank_async(base2, user_input, prefer_category, prefer_tambon)
         ranked = _post_filter_results_by_query(ranked, user_input, prefer_category)
 
-        if not ranked and keywords:
-            base2 = _search_by_context(
-                user_input=user_input,
-                user_lat=user_lat,
-                user_lng=user_lng,
-                prefer_tambon=prefer_tambon,
-                keywords=keywords,
-                prefer_category=prefer_category,
-                limit=30
-            )
-            base2 = _apply_banned(base2, banned_set)
-
-            if prefer_category:
-                filtered_by_intent = [p for p in base2 if _is_allowed_for_intent(prefer_category, p)]
-                if filtered_by_intent:
-                    base2 = filtered_by_intent
-
-            base2 = _strict_category_filter(base2, prefer_category)
-            base2 = _post_filter_results_by_query(base2, user_input, prefer_category)
+    if not ranked:
+        broader = await _broader_category_fallback(
+            user_input=user_input,
+            user_lat=searches.user_lat,
+            user_lng=searches.user_lng,
+            prefer_tambon=prefer_tambon,
+            prefer_category=prefer_category,
+            banned_set=banned_set,
+            rows=everything
+        )
 
-            ranked = _rank(base2, user_input, prefer_category, prefer_tambon)
-            ranked = _post_filter_results_by_query(ranked, user_input, prefer_category)
+        if broader:
+            reply = _fallback_reply(user_input, prefer_category)
+            return (reply, broader[:8], list(banned_set))
 
-        if not ranked:
-            broader = _broader_category_fallback(
-                user_input=user_input,
-                user_lat=user_lat,
-                user_lng=user_lng,
-                prefer_tambon=prefer_tambon,
-                prefer_category=prefer_category,
-                banned_set=banned_set
-            )
+    if not ranked:
+        return (_fallback_reply(user_input, prefer_category), [], list(banned_set))
 
-            if broader:
-                reply = _fallback_reply(user_input, prefer_category)
-                return (reply, broader[:8], list(banned_set))
+    reply = _reply_for_found_places(user_input, ranked, prefer_category)
+    return (reply, ranked, list(banned_set))
 
-        if not ranked:
-            return (_fallback_reply(user_input, prefer_category), [], list(banned_set))
+# event loop ถาวรใน daemon thread: get_answer แบบ sync ส่งงานเข้า loop นี้ เพื่อให้ pool ของ psycopg
+# และ client async ของ Gemini (ผูกกับ loop ที่สร้างมัน) ใช้ซ้ำได้ข้ามรอบสนทนา
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    if _LOOP is None:
+        with _LOOP_LOCK:
+            if _LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="chatbot-async", daemon=True).start()
+                _LOOP = loop
+    return _LOOP
+
+def _run_answer(
+    user_input: str,
+    user_lat: Optional[float],
+    user_lng: Optional[float],
+    history: Optional[List[Dict]],
+    focus_place_id: Optional[int],
+    last_results: Optional[List[Dict]],
+    banned_categories: Optional[List[str]],
+    stream: bool,
+) -> Tuple[Union[str, Iterator[str]], List[Dict], List[str]]:
+    """ส่ง get_answer_async เข้า loop เบื้องหลังแล้วรอผล (get_answer และ get_answer_stream ใช้ร่วมกัน)"""
+    future = asyncio.run_coroutine_threadsafe(
+        get_answer_async(
+            user_input,
+            user_lat=user_lat,
+            user_lng=user_lng,
+            history=history,
+            focus_place_id=focus_place_id,
+            last_results=last_results,
+            banned_categories=banned_categories,
+            stream=stream,
+        ),
+        _background_loop(),
+    )
+    return future.result()
 
-        reply = _reply_for_found_places(user_input, ranked, prefer_category)
-        return (reply, ranked, list(banned_set))
+def get_answer(
+    user_input: str,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+    history: Optional[List[Dict]] = None,
+    focus_place_id: Optional[int] = None,
+    last_results: Optional[List[Dict]] = None,
+    banned_categories: Optional[List[str]] = None,
+) -> Tuple[str, List[Dict], List[str]]:
+    """get_answer_async แบบ blocking สำหรับโค้ด sync (เช่น app.py) เรียกจาก thread ไหนก็ได้"""
+    return _run_answer(
+        user_input, user_lat, user_lng, history, focus_place_id, last_results, banned_categories, stream=False
+    )
 
-    except Exception as e:
-        return (
-            f"เกิดข้อผิดพลาดในการประมวลผล: {str(e)}",
-            [],
-            (banned_categories or [])
-        )
\ No newline at end of file
+def get_answer_stream(
+    user_input: str,
+    user_lat: Optional[float] = None,
+    user_lng: Optional[float] = None,
+    history: Optional[List[Dict]] = None,
+    focus_place_id: Optional[int] = None,
+    last_results: Optional[List[Dict]] = None,
+    banned_categories: Optional[List[str]] = None,
+) -> Tuple[Union[str, Iterator[str]], List[Dict], List[str]]:
+    """เหมือน get_answer แต่คำตอบคุยเล่นเป็น generator ของ chunk (ส่งให้ st.write_stream ได้เลย)"""
+    return _run_answer(
+        user_input, user_lat, user_lng, history, focus_place_id, last_results, banned_categories, stream=True
+    )
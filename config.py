@@ -1,4 +1,86 @@
 import streamlit as st
 
+
+def _flag(name: str, default: bool) -> bool:
+    """อ่านค่าเปิด/ปิดจาก secrets: รับทั้ง bool ของ TOML และสตริงอย่าง "false", "0", "off" จากตัวแปรแวดล้อม"""
+    value = st.secrets.get(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() not in ("", "0", "false", "no", "off")
+    return bool(value)
+
+
 GEMINI_API_KEY = st.secrets.get("GOOGLE_API_KEY", "")
-MAPS_API_KEY = st.secrets.get("MAPS_API_KEY", "")
\ No newline at end of file
+MAPS_API_KEY = st.secrets.get("MAPS_API_KEY", "")
+
+# maps_api.MapsClient: ผล Directions / Distance Matrix เก็บไว้ MAPS_CACHE_TTL วินาที
+# MAPS_TRAVEL_TIMES = แสดงเวลาเดินทางจากตำแหน่งผู้ใช้บนการ์ด (Distance Matrix หนึ่ง request ต่อชุดผลลัพธ์)
+MAPS_API_BASE = st.secrets.get("MAPS_API_BASE", "https://maps.googleapis.com/maps/api")
+MAPS_CACHE_TTL = float(st.secrets.get("MAPS_CACHE_TTL", 6 * 3600))
+MAPS_TRAVEL_TIMES = _flag("MAPS_TRAVEL_TIMES", False)
+
+# "db" = ค้นหาด้วย SQL ทุกครั้ง, "memory" = โหลดตาราง places ไว้ใน PlaceCatalog แล้วค้นหาในหน่วยความจำ
+SEARCH_ENGINE = st.secrets.get("SEARCH_ENGINE", "db")
+CATALOG_REFRESH_SECONDS = float(st.secrets.get("CATALOG_REFRESH_SECONDS", 300))
+
+# cache ผลตีความเจตนาจาก LLM (_understand); ใส่ INTENT_CACHE_PATH เพื่อเก็บลง SQLite ข้ามการรีสตาร์ท
+INTENT_CACHE_SIZE = int(st.secrets.get("INTENT_CACHE_SIZE", 1024))
+INTENT_CACHE_TTL = float(st.secrets.get("INTENT_CACHE_TTL", 6 * 3600))
+INTENT_CACHE_PATH = st.secrets.get("INTENT_CACHE_PATH", "")
+
+# ถ้าตัวจำแนกเจตนาในเครื่องมั่นใจอย่างน้อยเท่านี้ (0-1) จะไม่เรียก LLM ในรอบนั้น; ตั้ง > 1 เพื่อปิด
+LOCAL_INTENT_THRESHOLD = float(st.secrets.get("LOCAL_INTENT_THRESHOLD", 0.75))
+
+# cache ผลค้นหาสถานที่ที่ใช้ร่วมกันทุกผู้ใช้ (0 = ปิด); พิกัดปัดเป็นช่อง geohash ตาม precision
+# (6 ≈ 1.2 x 0.6 กม.) ล้างเมื่อ version ของ places เปลี่ยน หรือเมื่อได้ NOTIFY places_changed
+RESULT_CACHE_SIZE = int(st.secrets.get("RESULT_CACHE_SIZE", 2048))
+RESULT_CACHE_TTL = float(st.secrets.get("RESULT_CACHE_TTL", 300))
+RESULT_CACHE_GEOHASH_PRECISION = int(st.secrets.get("RESULT_CACHE_GEOHASH_PRECISION", 6))
+RESULT_CACHE_VERSION_CHECK_SECONDS = float(st.secrets.get("RESULT_CACHE_VERSION_CHECK_SECONDS", 5))
+RESULT_CACHE_LISTEN = _flag("RESULT_CACHE_LISTEN", False)
+
+# trace เวลาของแต่ละขั้นใน get_answer: TRACE_JSONL_PATH = ไฟล์ที่ต่อท้าย trace ละบรรทัด,
+# TRACE_OTEL_ENDPOINT = collector OTLP (เช่น http://localhost:4317, ต้องมี opentelemetry-sdk)
+TRACE_ENABLED = _flag("TRACE_ENABLED", True)
+TRACE_HISTORY_SIZE = int(st.secrets.get("TRACE_HISTORY_SIZE", 2048))
+TRACE_JSONL_PATH = st.secrets.get("TRACE_JSONL_PATH", "")
+TRACE_OTEL_ENDPOINT = st.secrets.get("TRACE_OTEL_ENDPOINT", "")
+TRACE_DEBUG_PANEL = _flag("TRACE_DEBUG_PANEL", False)
+
+# บันทึกทุกรอบของแชทใน app.py เป็น JSON lines ที่ path นี้ (ว่าง = ไม่บันทึก) เล่นซ้ำด้วย benchmarks/replay.py
+SESSION_LOG_PATH = st.secrets.get("SESSION_LOG_PATH", "")
+
+# ค้นหาเชิงความหมาย: โฟลเดอร์ดัชนีเวกเตอร์จาก `python embeddings.py build` หรือโฟลเดอร์ artifact
+# ของ `python precompute.py --embeddings` (ใช้รุ่นที่ manifest.json ชี้) ว่าง = ปิด
+# SEMANTIC_WEIGHT คือสัดส่วนของคะแนน cosine ที่ผสมเข้าคะแนนของ _rank
+# SEMANTIC_MIN_SCORE คือ cosine ขั้นต่ำของสถานที่ที่ดึงเพิ่มจากดัชนีเมื่อค้นด้วยคีย์เวิร์ดไม่เจอ
+EMBEDDING_INDEX_PATH = st.secrets.get("EMBEDDING_INDEX_PATH", "")
+EMBEDDING_MODEL = st.secrets.get("EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+SEMANTIC_WEIGHT = float(st.secrets.get("SEMANTIC_WEIGHT", 0.25))
+SEMANTIC_MIN_SCORE = float(st.secrets.get("SEMANTIC_MIN_SCORE", 0.35))
+SEMANTIC_TOP_K = int(st.secrets.get("SEMANTIC_TOP_K", 30))
+
+# โฟลเดอร์ artifact ของ `python precompute.py` (manifest.json + vNNNNNN/)
+PRECOMPUTE_DIR = st.secrets.get("PRECOMPUTE_DIR", "data/precompute")
+
+# cache รูปย่อของการ์ดสถานที่บนดิสก์ (thumbnails.py, ว่าง = แสดง URL ต้นฉบับตรงๆ)
+# THUMBNAIL_SIZE = ด้านยาวสุดเป็น px, THUMBNAIL_MAX_MB = ขนาดรวมก่อนเริ่มลบไฟล์ที่ใช้ล่าสุดนานที่สุด
+# THUMBNAIL_DEADLINE_SECONDS = เวลารวมที่ยอมรอดึงรูปย่อที่ยังไม่มีตอนตอบ (ที่เหลือดึงต่อในเบื้องหลัง)
+THUMBNAIL_DIR = st.secrets.get("THUMBNAIL_DIR", "")
+THUMBNAIL_SIZE = int(st.secrets.get("THUMBNAIL_SIZE", 512))
+THUMBNAIL_MAX_MB = float(st.secrets.get("THUMBNAIL_MAX_MB", 512))
+THUMBNAIL_DEADLINE_SECONDS = float(st.secrets.get("THUMBNAIL_DEADLINE_SECONDS", 0.3))
+
+# cache ภาพแผนที่ของการ์ดบนดิสก์ (static_maps.py, ว่าง = ให้เบราว์เซอร์ดึง Static Maps เองทุกครั้ง)
+# STATIC_MAP_OFFLINE = ไม่ยิง Static Maps เลย ใช้ภาพที่ cache ไว้หรือวาดจาก tile ของ MAP_TILE_URL ที่ดึงเก็บไว้
+# MAP_TILE_URL เช่น "https://tile.openstreetmap.org/{z}/{x}/{y}.png" (ใช้ตอน `python static_maps.py warm --tiles`)
+STATIC_MAP_DIR = st.secrets.get("STATIC_MAP_DIR", "")
+STATIC_MAP_OFFLINE = _flag("STATIC_MAP_OFFLINE", False)
+STATIC_MAP_URL = st.secrets.get("STATIC_MAP_URL", "https://maps.googleapis.com/maps/api/staticmap")
+MAP_TILE_URL = st.secrets.get("MAP_TILE_URL", "")
+
+# ระยะทางตามถนนจากกราฟถนนที่แปลงไว้ (`python road_graph.py build <osm> <npz>`, ว่าง = ไม่ใช้)
+# NEARBY_ORDER = "road" เรียงผลค้นหาใกล้ฉันตามระยะทางถนนแทนระยะเส้นตรง ("straight" = แบบเดิม)
+# ROAD_DISTANCE_WEIGHT = สัดส่วนของคะแนนความใกล้ตามถนนที่ผสมเข้าคะแนนของ _rank (ใช้เฉพาะแถวที่มี road_km)
+ROAD_GRAPH_PATH = st.secrets.get("ROAD_GRAPH_PATH", "")
+NEARBY_ORDER = st.secrets.get("NEARBY_ORDER", "straight")
+ROAD_DISTANCE_WEIGHT = float(st.secrets.get("ROAD_DISTANCE_WEIGHT", 0.15))
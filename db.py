@@ -1,7 +1,18 @@
+import re
+import select
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
-import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 import streamlit as st
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from config import SEARCH_ENGINE
+from road_graph import order_by_road
+from spatial_index import bounding_box
 
 
 def get_conn():
@@ -16,6 +27,225 @@ def get_conn():
     )
 
 
+# ---------- Connection pool ----------
+class _ConnectionPool:
+    """Pool แบบ thread-safe: รอคิวได้ถึง timeout, ตรวจสุขภาพ connection ที่ว่างนาน และรีไซเคิลตามอายุ"""
+
+    def __init__(self, connect, min_size=1, max_size=5, timeout=10.0,
+                 max_lifetime=1800.0, health_check_interval=30.0):
+        self._connect = connect
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(1, int(max_size))
+        self.timeout = float(timeout)
+        self.max_lifetime = float(max_lifetime)
+        self.health_check_interval = float(health_check_interval)
+
+        self._cond = threading.Condition()
+        self._idle = []  # [(conn, created_at, last_used)]
+        self._created_at = {}
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "health_check_failures": 0,
+        }
+
+        for _ in range(min(self.min_size, self.max_size)):
+            conn = self._new_conn()
+            self._size += 1
+            self._idle.append((conn, self._created_at[id(conn)], time.monotonic()))
+
+    # _created_at และ _stats แก้ภายใต้ self._cond เสมอ (Condition ใช้ RLock จึงเรียกซ้อนจากใน lock ได้)
+    def _new_conn(self):
+        conn = self._connect()
+        conn.autocommit = True
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _close_conn(self, conn):
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, created_at, last_used) -> bool:
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime > 0 and now - created_at > self.max_lifetime:
+            with self._cond:
+                self._stats["connections_recycled"] += 1
+            return False
+        if now - last_used > self.health_check_interval:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+            except Exception:
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                return False
+        return True
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise psycopg2.pool.PoolError(
+                        f"no free connection after {self.timeout:.1f}s (max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+
+        if entry is not None:
+            conn, created_at, last_used = entry
+            if self._is_healthy(conn, created_at, last_used):
+                return conn
+            self._close_conn(conn)
+
+        try:
+            return self._new_conn()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard: bool = False):
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._close_conn(conn)
+                self._size -= 1
+            else:
+                created_at = self._created_at.get(id(conn), time.monotonic())
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _, _ in self._idle:
+                self._close_conn(conn)
+                self._size -= 1
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            out = dict(self._stats)
+            out["size"] = self._size
+            out["idle"] = len(self._idle)
+            out["in_use"] = self._size - len(self._idle)
+            out["max_size"] = self.max_size
+        checkouts = out["checkouts"]
+        out["wait_seconds_avg"] = out["wait_seconds_total"] / checkouts if checkouts else 0.0
+        return out
+
+
+_POOL: Optional[_ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> _ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                cfg = st.secrets["postgres"]
+                _POOL = _ConnectionPool(
+                    get_conn,
+                    min_size=cfg.get("pool_min_size", 1),
+                    max_size=cfg.get("pool_max_size", 5),
+                    timeout=cfg.get("pool_timeout", 10),
+                    max_lifetime=cfg.get("pool_max_lifetime", 1800),
+                    health_check_interval=cfg.get("pool_health_check_interval", 30),
+                )
+    return _POOL
+
+
+@contextmanager
+def pooled_conn():
+    """ยืม connection จาก pool ของทั้ง process แล้วคืนอัตโนมัติเมื่อจบ with-block"""
+    pool = _get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+def pool_stats() -> Dict:
+    """ตัวเลขของ pool สำหรับปรับขนาด: checkout, เวลารอ, timeout, connection ที่สร้าง/รีไซเคิล"""
+    if _POOL is None:
+        return {}
+    return _POOL.stats()
+
+
+def close_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.closeall()
+            _POOL = None
+
+
+# ---------- Query / schema stats ----------
+_QUERY_STATS = {"queries": 0, "schema_queries": 0}
+
+
+def _execute(cur, sql: str, params=None):
+    _QUERY_STATS["queries"] += 1
+    cur.execute(sql, params)
+
+
+def query_stats() -> Dict:
+    """จำนวน round-trip ที่ยิงไปยัง Postgres ตั้งแต่เริ่ม process (หรือตั้งแต่ reset ล่าสุด)"""
+    return dict(_QUERY_STATS)
+
+
+def reset_query_stats():
+    for k in _QUERY_STATS:
+        _QUERY_STATS[k] = 0
+
+
 def _has_column(conn, table: str, column: str) -> bool:
     q = """
     SELECT 1
@@ -26,10 +256,69 @@ def _has_column(conn, table: str, column: str) -> bool:
     LIMIT 1;
     """
     with conn.cursor() as cur:
-        cur.execute(q, (table, column))
+        _QUERY_STATS["schema_queries"] += 1
+        _execute(cur, q, (table, column))
         return cur.fetchone() is not None
 
 
+# ---------- Schema capability cache ----------
+_SCHEMA_CACHE: Dict[str, tuple] = {}  # table -> (columns, loaded_at)
+_SCHEMA_LOCK = threading.Lock()
+
+
+def _schema_cache_ttl() -> float:
+    return float(st.secrets["postgres"].get("schema_cache_ttl", 300))
+
+
+def _table_columns(conn, table: str) -> set:
+    """คอลัมน์ของตาราง อ่านจาก information_schema ครั้งเดียวแล้วเก็บไว้ตาม TTL"""
+    ttl = _schema_cache_ttl()
+    cached = _SCHEMA_CACHE.get(table)
+    if cached and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+
+    q = """
+    SELECT column_name
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+      AND table_name = %s;
+    """
+    with conn.cursor() as cur:
+        _QUERY_STATS["schema_queries"] += 1
+        _execute(cur, q, (table,))
+        columns = {row[0] for row in cur.fetchall()}
+
+    with _SCHEMA_LOCK:
+        _SCHEMA_CACHE[table] = (columns, time.monotonic())
+    return columns
+
+
+def _extensions(conn) -> set:
+    """extension ที่ติดตั้งในฐานข้อมูล (cache แบบเดียวกับคอลัมน์ ใต้คีย์ pg_extension)"""
+    ttl = _schema_cache_ttl()
+    cached = _SCHEMA_CACHE.get("pg_extension")
+    if cached and time.monotonic() - cached[1] < ttl:
+        return cached[0]
+
+    with conn.cursor() as cur:
+        _QUERY_STATS["schema_queries"] += 1
+        _execute(cur, "SELECT extname FROM pg_extension;")
+        names = {row[0] for row in cur.fetchall()}
+
+    with _SCHEMA_LOCK:
+        _SCHEMA_CACHE["pg_extension"] = (names, time.monotonic())
+    return names
+
+
+def invalidate_schema_cache(table: Optional[str] = None):
+    """ล้าง cache ของ schema เช่นหลังรัน migration"""
+    with _SCHEMA_LOCK:
+        if table is None:
+            _SCHEMA_CACHE.clear()
+        else:
+            _SCHEMA_CACHE.pop(table, None)
+
+
 def _norm_text(value: str) -> str:
     if not value:
         return ""
@@ -110,10 +399,91 @@ def _build_keywords_or(prefix: str, keywords_any: Optional[List[str]]):
 
     return "(" + " OR ".join(clauses) + ")", params
 
-def _select_fields(conn):
-    has_id = _has_column(conn, "places", "id")
-    has_image_urls = _has_column(conn, "places", "image_urls")
+# อักขระที่ทำให้ search_norm LIKE ให้ผลต่างจาก ILIKE แบบเดิม (wildcard และตัวคั่นฟิลด์)
+_TRGM_UNSAFE_CHARS = "%_\\|"
+
+
+def _trigram_mode_enabled() -> bool:
+    return st.secrets["postgres"].get("keyword_search", "auto") != "legacy"
+
+
+def _use_trigram(conn) -> bool:
+    """ใช้ search_norm + pg_trgm เมื่อรัน migrations/002 แล้ว (ตั้ง keyword_search = "legacy" เพื่อปิด)"""
+    if not _trigram_mode_enabled():
+        return False
+    return "search_norm" in _table_columns(conn, "places") and "pg_trgm" in _extensions(conn)
+
+
+def _build_keywords_trgm(prefix: str, keywords_any: Optional[List[str]]):
+    """เงื่อนไข OR บนคอลัมน์ search_norm ที่ใช้ GIN trigram index ได้
+
+    ให้ผลเท่ากับ _build_keywords_or (ILIKE คำดิบบนฟิลด์ใด ๆ ก็ตรงกับ LIKE คำ normalize อยู่แล้ว)
+    ยกเว้นคำอาหารทะเลที่จำกัดฟิลด์ และคำที่มี wildcard ซึ่งยังใช้ SQL แบบเดิม
+    คืน (where, params, similarity_term)
+    """
+    if not keywords_any:
+        return "TRUE", {}, None
+
+    clauses, params, legacy_terms = [], {}, []
+    sim_term = None
+
+    for i, term in enumerate(keywords_any):
+        raw_term = (term or "").strip()
+        if not raw_term:
+            continue
+        if raw_term in ["อาหารทะเล", "ซีฟู้ด"] or any(ch in raw_term for ch in _TRGM_UNSAFE_CHARS):
+            legacy_terms.append(raw_term)
+            continue
+
+        norm_term = _norm_text(raw_term)
+        key = f"{prefix}{i}_norm"
+        params[key] = f"%{norm_term}%"
+        clauses.append(f"search_norm LIKE %({key})s")
+        if sim_term is None or len(norm_term) > len(sim_term):
+            sim_term = norm_term
+
+    if legacy_terms:
+        where_legacy, p_legacy = _build_keywords_or(f"{prefix}l", legacy_terms)
+        clauses.append(where_legacy)
+        params.update(p_legacy)
+
+    if not clauses:
+        return "TRUE", {}, None
+
+    return "(" + " OR ".join(clauses) + ")", params, sim_term
+
+
+def _keywords_clause(use_trigram: bool, prefix: str, keywords_any: Optional[List[str]]):
+    if use_trigram:
+        return _build_keywords_trgm(prefix, keywords_any)
+    where_kw, p_kw = _build_keywords_or(prefix, keywords_any)
+    return where_kw, p_kw, None
+
+
+def _keywords_where(conn, prefix: str, keywords_any: Optional[List[str]]):
+    """เลือกระหว่างเงื่อนไข trigram กับแบบเดิม คืน (where, params, similarity_term)"""
+    return _keywords_clause(_use_trigram(conn), prefix, keywords_any)
+
+
+def _light_search_enabled() -> bool:
+    return st.secrets["postgres"].get("search_columns", "light") != "full"
 
+
+def _select_fields(conn, light: bool = False):
+    light = light and _light_search_enabled()
+    if _schema_cache_ttl() > 0:
+        columns = _table_columns(conn, "places")
+        return _fields_sql("id" in columns, "image_urls" in columns, light)
+    return _fields_sql(_has_column(conn, "places", "id"), _has_column(conn, "places", "image_urls"), light)
+
+
+# คอลัมน์ที่ค้นหาแบบ light ไม่ดึง: ไม่ได้ใช้กรองหรือจัดอันดับ ใช้แค่ตอนแสดงผล จึงเติมทีหลังเฉพาะแถวที่ตอบจริง
+# (description / highlight ยังต้องดึง เพราะ _rank ใช้เทียบข้อความและคำตอบยกมาแสดง)
+DEFERRED_FIELDS = ("image_urls",)
+
+
+def _fields_sql(has_id: bool, has_image_urls: bool, light: bool = False) -> str:
+    """คอลัมน์ของผลค้นหา light=True ตัด DEFERRED_FIELDS ออก (ต้องมี id ไว้เติมภายหลัง)"""
     fields = [
         "name", "tambon", "category", "description", "highlight",
         "latitude", "longitude", "image_url"
@@ -121,6 +491,8 @@ def _select_fields(conn):
     if has_id:
         fields.insert(0, "id")
 
+    if light and has_id and has_image_urls:
+        return ", ".join(fields)
     if has_image_urls:
         fields.append("COALESCE(image_urls, '[]'::jsonb)::TEXT AS image_urls")
     else:
@@ -129,78 +501,434 @@ def _select_fields(conn):
     return ", ".join(fields)
 
 
-def search_places(category=None, tambon=None, keywords_any=None, limit=30) -> List[Dict]:
-    with get_conn() as conn:
-        select_fields = _select_fields(conn)
-        where_kw, p_kw = _build_keywords_or("kw", keywords_any)
+def _dict_rows(cur, rows) -> List[Dict]:
+    """แปลงแถว tuple จาก cursor ธรรมดาเป็น dict ทีเดียวตอนท้าย
+    (ถูกกว่า RealDictCursor ที่สร้าง RealDictRow และเรียก __setitem__ ระดับ Python ทีละคอลัมน์)
+    แถวเป็น dict ตั้งแต่ตรงนี้ ไม่ได้เก็บเป็น tuple ถึง _rank: 70 แถวใช้ราว 0.07 ms เทียบกับ _rank ราว 2 ms"""
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in rows]
 
-        sql = f"""
-        SELECT {select_fields}
-        FROM places
-        WHERE
-          (%(cat)s IS NULL OR category ILIKE %(cat_like)s)
-          AND (%(tmb)s IS NULL OR tambon ILIKE %(tmb_like)s)
-          AND {where_kw}
-        ORDER BY name
-        LIMIT %(lim)s;
-        """
-
-        params = {
-            "cat": category,
-            "tmb": tambon,
-            "cat_like": f"%{category}%" if category else None,
-            "tmb_like": f"%{tambon}%" if tambon else None,
-            "lim": limit,
-        }
-        params.update(p_kw)
 
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(sql, params)
-            return cur.fetchall()
+def _fetch_dicts(conn, sql: str, params=None) -> List[Dict]:
+    with conn.cursor() as cur:
+        _execute(cur, sql, params)
+        return _dict_rows(cur, cur.fetchall())
 
 
-def search_places_nearby(lat, lng, category=None, tambon=None, keywords_any=None,
-                         limit=30, within_km=20) -> List[Dict]:
-    with get_conn() as conn:
+def fetch_all_places() -> List[Dict]:
+    """ทุกแถวของ places ครบทุกคอลัมน์ (ใช้โหลด PlaceCatalog)"""
+    with pooled_conn() as conn:
+        return _fetch_dicts(conn, f"SELECT {_select_fields(conn)} FROM places;")
+
+
+def iter_places(batch_size: int = 2000, cursor_name: str = "places_stream") -> Iterator[List[Dict]]:
+    """ทุกแถวของ places ทีละชุดเรียงตาม id ผ่าน server-side (named) cursor
+    ไม่ต้องโหลดทั้งตารางเข้าหน่วยความจำ (ใช้กับงานออฟไลน์อย่าง precompute.py)"""
+    with pooled_conn() as conn:
         select_fields = _select_fields(conn)
-        where_kw, p_kw = _build_keywords_or("kw", keywords_any)
+        # named cursor ต้องอยู่ใน transaction: ปิด autocommit ของ connection จาก pool ชั่วคราว
+        conn.autocommit = False
+        try:
+            with conn.cursor(name=cursor_name) as cur:
+                cur.itersize = batch_size
+                _execute(cur, f"SELECT {select_fields} FROM places ORDER BY id;")
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield _dict_rows(cur, rows)
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+
+
+def fetch_places_by_ids(ids: List[int]) -> List[Dict]:
+    """แถวของ places ตาม id เรียงตามลำดับใน ids (id ที่ไม่มีในตารางจะถูกข้าม)"""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    if SEARCH_ENGINE == "memory":
+        return _catalog().fetch_places_by_ids(ids)
+
+    with pooled_conn() as conn:
+        sql, params = _by_ids_query(_select_fields(conn), ids)
+        return _order_by_ids(_fetch_dicts(conn, sql, params), ids)
+
+
+def _by_ids_query(select_fields: str, ids: List[int]):
+    return f"SELECT {select_fields} FROM places WHERE id = ANY(%(ids)s);", {"ids": ids}
+
+
+def _order_by_ids(rows: List[Dict], ids: List[int]) -> List[Dict]:
+    by_id = {r.get("id"): r for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+# ---------- เติมคอลัมน์ให้ผลค้นหาแบบ light ----------
+def _light_ids(rows: List[Dict]) -> List[int]:
+    """id ของแถวที่ยังขาด DEFERRED_FIELDS (แถวจาก PlaceCatalog / last_results ที่เติมแล้วจะไม่ติดมา)"""
+    ids = []
+    for r in rows:
+        if r.get("id") is not None and any(f not in r for f in DEFERRED_FIELDS):
+            ids.append(r["id"])
+    return list(dict.fromkeys(ids))
+
+
+def _merge_hydrated(rows: List[Dict], full_rows: List[Dict]) -> List[Dict]:
+    """สำเนาของแถวเดิมที่เติมคอลัมน์จาก full_rows (ไม่แก้แถวที่อาจอยู่ใน cache ผลค้นหา)
+    ค่าที่แถวเดิมมีอยู่แล้ว เช่น distance_km, _score, _text คงไว้ตามเดิม"""
+    full = {r.get("id"): r for r in full_rows}
+    return [{**full[r["id"]], **r} if r.get("id") in full else r for r in rows]
+
+
+def hydrate_places(rows: List[Dict]) -> List[Dict]:
+    """เติมคอลัมน์ที่ค้นหาแบบ light ข้ามไว้ ให้แถวผลลัพธ์สุดท้ายด้วย query เดียว (WHERE id = ANY)"""
+    ids = _light_ids(rows)
+    if not ids:
+        return rows
+    return _merge_hydrated(rows, fetch_places_by_ids(ids))
+
+
+def places_version():
+    """ค่าที่เปลี่ยนเมื่อข้อมูลใน places เปลี่ยน: ตัวนับจาก trigger ใน migrations/003 ถ้ามี
+    ไม่งั้นใช้ (จำนวนแถว, updated_at ล่าสุด) และ None ถ้าไม่มีอะไรให้ตรวจ"""
+    with pooled_conn() as conn:
+        with conn.cursor() as cur:
+            if "version" in _table_columns(conn, "places_version"):
+                _execute(cur, "SELECT version FROM places_version;")
+                row = cur.fetchone()
+                return ("counter", row[0] if row else 0)
+            if "updated_at" not in _table_columns(conn, "places"):
+                return None
+            _execute(cur, "SELECT COUNT(*), MAX(updated_at) FROM places;")
+            return tuple(cur.fetchone())
+
+
+def listen_places_changes(on_change, channel: str = "places_changed", poll_seconds: float = 30.0):
+    """LISTEN บน connection แยก (ไม่ใช้ pool) แล้วเรียก on_change(payload) ทุกครั้งที่ trigger
+    ของ places ส่ง NOTIFY มา ทำงานไปเรื่อยๆ จนกว่า connection จะหลุด (ผู้เรียกต่อใหม่เอง)"""
+    conn = get_conn()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {channel};")
+        while True:
+            if select.select([conn], [], [], poll_seconds) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                on_change(conn.notifies.pop(0).payload)
+    finally:
+        conn.close()
+
+
+def _catalog():
+    from place_catalog import get_catalog
+    return get_catalog()
+
+
+def _result_cache():
+    from result_cache import get_result_cache
+    return get_result_cache()
+
+
+def result_cache_stats() -> Dict:
+    """hit/miss/eviction ของ cache ผลค้นหา ({} ถ้าปิดไว้)"""
+    cache = _result_cache()
+    return cache.stats() if cache is not None else {}
+
+
+def _keywords_key(keywords_any: Optional[List[str]]):
+    return tuple((k or "").strip() for k in keywords_any) if keywords_any else None
+
+
+# ค้นจากกึ่งกลางช่อง geohash ด้วย LIMIT กี่เท่าของที่ผู้เรียกขอ (ผู้ใช้ไม่ได้อยู่กึ่งกลางช่องพอดี)
+# 3 เท่าพอสำหรับ geohash precision 6 กับ limit 30/40: สุ่ม 400 คำถามบนข้อมูลสังเคราะห์ไม่ต้องค้นซ้ำจากพิกัดจริงเลย
+NEARBY_LIMIT_FACTOR = 3
+
+
+def _cached_search(key: tuple, lat, lng, within_km, run, limits=None):
+    """ผลจาก cache ร่วม (สำเนา) หรือเรียก run(lat, lng, within_km, limit_factor) แล้วเก็บไว้
+
+    ถ้ามีพิกัด จะค้นจากกึ่งกลางช่อง geohash ของผู้ใช้ด้วยรัศมีที่บวกระยะถึงมุมช่องและ LIMIT x NEARBY_LIMIT_FACTOR
+    แล้วคำนวณ distance_km ใหม่จากพิกัดจริง กรองตาม within_km และตัดเหลือ limits
+    (int หรือ {ป้าย: limit} ของ search_places_multi) ถ้ายืนยันไม่ได้ว่าได้แถวที่ใกล้ที่สุดครบ จะค้นจากพิกัดจริงแทน
+    """
+    cache = _result_cache()
+    if cache is None:
+        return run(lat, lng, within_km, 1)
+
+    qlat, qlng, cell = cache.bucket(lat, lng)
+    pad_km = cache.cell_radius_km(cell)
+    key = key + (cell, within_km)
+    value = cache.get(key)
+    if value is None:
+        generation = cache.generation
+        value = run(qlat, qlng, within_km + pad_km if pad_km else within_km, _limit_factor(pad_km))
+        cache.put(key, value, generation)
+    out = _relocated(value, lat, lng, qlat, qlng, within_km, limits, pad_km)
+    return out if out is not None else run(lat, lng, within_km, 1)
+
+
+def _limit_factor(pad_km: float) -> int:
+    return NEARBY_LIMIT_FACTOR if pad_km else 1
+
+
+def _padded(limit, factor: int):
+    return limit * factor if limit is not None else None
+
+
+def _relocated(value, lat, lng, qlat, qlng, within_km, limits=None, pad_km: float = 0.0):
+    """ผลที่ค้นจาก (qlat, qlng) ปรับให้เป็นของพิกัดจริง หรือ None ถ้าต้องค้นใหม่จากพิกัดจริง"""
+    if lat is None or lng is None or (not pad_km and (qlat, qlng) == (float(lat), float(lng))):
+        return value
+
+    from result_cache import relocate
+
+    factor = _limit_factor(pad_km)
+
+    def one(rows, limit):
+        queried = _padded(limit, factor) if pad_km else None
+        return relocate(rows, lat, lng, within_km, limit, pad_km, queried)
+
+    if isinstance(value, dict):
+        out = {tag: one(rows, (limits or {}).get(tag)) for tag, rows in value.items()}
+        return None if any(rows is None for rows in out.values()) else out
+    return one(value, limits)
+
+
+def _road_ordered(value, lat, lng):
+    """ผลค้นหาใกล้ฉันเรียงตามระยะทางถนน (road_km) เมื่อ NEARBY_ORDER = "road" และมีกราฟถนน"""
+    if isinstance(value, dict):
+        return {tag: order_by_road(rows, lat, lng) for tag, rows in value.items()}
+    return order_by_road(value, lat, lng)
+
+
+def search_places(category=None, tambon=None, keywords_any=None, limit=30) -> List[Dict]:
+    if SEARCH_ENGINE == "memory":
+        return _catalog().search_places(category, tambon, keywords_any, limit)
 
-        sql = f"""
+    return _cached_search(
+        ("search", category, tambon, _keywords_key(keywords_any), limit), None, None, None,
+        lambda lat, lng, within, factor: _search_places_db(category, tambon, keywords_any, limit),
+    )
+
+
+def _search_places_db(category, tambon, keywords_any, limit) -> List[Dict]:
+    with pooled_conn() as conn:
+        sql, params = _search_query(
+            _select_fields(conn, light=True), _use_trigram(conn), category, tambon, keywords_any, limit
+        )
+        return _fetch_dicts(conn, sql, params)
+
+
+def _tiebreak(select_fields: str) -> str:
+    """id ต่อท้าย ORDER BY ให้ลำดับแน่นอนเมื่อค่าที่เรียงเท่ากัน: limit 30 จึงได้ 30 แถวแรกของ limit 40 เสมอ
+    (ตารางเก่าที่ไม่มี id เรียงตามเดิม)"""
+    return ", id" if select_fields.split(",", 1)[0].strip() == "id" else ""
+
+
+def _ordinal(order_by: str) -> str:
+    """คอลัมน์ลำดับภายในกลยุทธ์ สำหรับ ORDER BY ด้านนอกของ _multi_query"""
+    return f", row_number() OVER (ORDER BY {order_by}) AS ordinal"
+
+
+def _search_query(select_fields: str, use_trigram: bool, category, tambon, keywords_any, limit,
+                  ordinal: bool = False):
+    """(sql, params) ของ search_places ไม่ผูกกับ driver (ใช้ร่วมกับ db_async)"""
+    where_kw, p_kw, sim_term = _keywords_clause(use_trigram, "kw", keywords_any)
+    order_by = "word_similarity(%(sim)s, search_norm) DESC, name" if sim_term else "name"
+    order_by += _tiebreak(select_fields)
+    if ordinal:
+        select_fields += _ordinal(order_by)
+
+    sql = f"""
+    SELECT {select_fields}
+    FROM places
+    WHERE
+      (%(cat)s IS NULL OR category ILIKE %(cat_like)s)
+      AND (%(tmb)s IS NULL OR tambon ILIKE %(tmb_like)s)
+      AND {where_kw}
+    ORDER BY {order_by}
+    LIMIT %(lim)s;
+    """
+
+    params = {
+        "cat": category,
+        "tmb": tambon,
+        "cat_like": f"%{category}%" if category else None,
+        "tmb_like": f"%{tambon}%" if tambon else None,
+        "sim": sim_term,
+        "lim": limit,
+    }
+    params.update(p_kw)
+    return sql, params
+
+
+def _nearby_sql(select_fields: str, where_kw: str, table: str = "places", ordinal: bool = False) -> str:
+    """ตัดด้วย bounding box ก่อน (ใช้ index บน latitude/longitude ได้) แล้วคำนวณ acos แค่ครั้งเดียวต่อแถว"""
+    order_by = "distance_km ASC" + _tiebreak(select_fields)
+    return f"""
+    SELECT *{_ordinal(order_by) if ordinal else ""}
+    FROM (
         SELECT
            {select_fields},
-           6371 * acos(
+           6371 * acos(LEAST(1.0, GREATEST(-1.0,
                cos(radians(%(lat)s)) * cos(radians(latitude)) *
                cos(radians(longitude) - radians(%(lng)s)) +
                sin(radians(%(lat)s)) * sin(radians(latitude))
-           ) AS distance_km
-        FROM places
-        WHERE (latitude IS NOT NULL AND longitude IS NOT NULL)
+           ))) AS distance_km
+        FROM {table}
+        WHERE latitude BETWEEN %(lat_min)s AND %(lat_max)s
+          AND longitude BETWEEN %(lng_min)s AND %(lng_max)s
           AND (%(cat)s IS NULL OR category ILIKE %(cat_like)s)
           AND (%(tmb)s IS NULL OR tambon ILIKE %(tmb_like)s)
           AND {where_kw}
-          AND (
-              6371 * acos(
-                   cos(radians(%(lat)s)) * cos(radians(latitude)) *
-                   cos(radians(longitude) - radians(%(lng)s)) +
-                   sin(radians(%(lat)s)) * sin(radians(latitude))
-              )
-          ) <= %(within)s
-        ORDER BY distance_km ASC
-        LIMIT %(lim)s;
-        """
-
-        params = {
-            "lat": lat,
-            "lng": lng,
-            "cat": category,
-            "tmb": tambon,
-            "cat_like": f"%{category}%" if category else None,
-            "tmb_like": f"%{tambon}%" if tambon else None,
-            "within": within_km,
-            "lim": limit,
+    ) AS nearby
+    WHERE distance_km <= %(within)s
+    ORDER BY {order_by}
+    LIMIT %(lim)s;
+    """
+
+
+def search_places_nearby(lat, lng, category=None, tambon=None, keywords_any=None,
+                         limit=30, within_km=20) -> List[Dict]:
+    if SEARCH_ENGINE == "memory":
+        rows = _catalog().search_places_nearby(lat, lng, category, tambon, keywords_any, limit, within_km)
+    else:
+        rows = _cached_search(
+            ("nearby", category, tambon, _keywords_key(keywords_any), limit), lat, lng, within_km,
+            lambda qlat, qlng, within, factor: _search_places_nearby_db(
+                qlat, qlng, category, tambon, keywords_any, _padded(limit, factor), within
+            ),
+            limit,
+        )
+    return _road_ordered(rows, lat, lng)
+
+
+def _search_places_nearby_db(lat, lng, category, tambon, keywords_any, limit, within_km) -> List[Dict]:
+    with pooled_conn() as conn:
+        sql, params = _nearby_query(
+            _select_fields(conn, light=True), _use_trigram(conn), lat, lng, category, tambon, keywords_any,
+            limit, within_km,
+        )
+        return _fetch_dicts(conn, sql, params)
+
+
+def _nearby_query(select_fields: str, use_trigram: bool, lat, lng, category, tambon, keywords_any,
+                  limit, within_km, ordinal: bool = False):
+    """(sql, params) ของ search_places_nearby ไม่ผูกกับ driver (ใช้ร่วมกับ db_async)"""
+    where_kw, p_kw, _ = _keywords_clause(use_trigram, "kw", keywords_any)
+
+    sql = _nearby_sql(select_fields, where_kw, ordinal=ordinal)
+    lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, within_km)
+
+    params = {
+        "lat": lat,
+        "lng": lng,
+        "cat": category,
+        "tmb": tambon,
+        "cat_like": f"%{category}%" if category else None,
+        "tmb_like": f"%{tambon}%" if tambon else None,
+        "within": within_km,
+        "lat_min": lat_min,
+        "lat_max": lat_max,
+        "lng_min": lng_min,
+        "lng_max": lng_max,
+        "lim": limit,
+    }
+    params.update(p_kw)
+    return sql, params
+
+
+# ---------- หลายกลยุทธ์ในคำสั่งเดียว ----------
+_PARAM_RE = re.compile(r"%\((\w+)\)s")
+
+
+def _prefix_params(sql: str, params: Dict, prefix: str):
+    """เติม prefix ให้ชื่อพารามิเตอร์ทุกตัว เพื่อรวมหลาย query ไว้ใน statement เดียวโดยชื่อไม่ชนกัน"""
+    return (
+        _PARAM_RE.sub(lambda m: f"%({prefix}{m.group(1)})s", sql),
+        {f"{prefix}{k}": v for k, v in params.items()},
+    )
+
+
+def _multi_query(select_fields: str, use_trigram: bool, strategies: Dict[str, Tuple[Optional[List[str]], int]],
+                 category, tambon, lat=None, lng=None, within_km=20):
+    """(sql, params) ที่รวม search_places / search_places_nearby หลายชุดคีย์เวิร์ดด้วย UNION ALL
+
+    แต่ละกลยุทธ์เป็นวงเล็บของตัวเองพร้อม ORDER BY/LIMIT เดิม ติดป้ายไว้ในคอลัมน์ strategy
+    และลำดับภายในกลยุทธ์ในคอลัมน์ ordinal: UNION ALL ไม่รับประกันลำดับแถว (เช่น Parallel Append)
+    จึงเรียงด้านนอกด้วย ORDER BY strategy, ordinal
+    """
+    branches, params = [], {}
+    for i, (tag, (keywords_any, limit)) in enumerate(strategies.items()):
+        fields = f"{select_fields}, %(tag)s::TEXT AS strategy"
+        if lat is not None and lng is not None:
+            sql, p = _nearby_query(fields, use_trigram, lat, lng, category, tambon, keywords_any, limit, within_km,
+                                   ordinal=True)
+        else:
+            sql, p = _search_query(fields, use_trigram, category, tambon, keywords_any, limit, ordinal=True)
+        p["tag"] = tag
+        sql, p = _prefix_params(sql.strip().rstrip(";"), p, f"s{i}_")
+        branches.append(f"({sql})")
+        params.update(p)
+    union = "\nUNION ALL\n".join(branches)
+    return f"SELECT * FROM (\n{union}\n) AS strategies\nORDER BY strategy, ordinal;", params
+
+
+def _split_strategies(rows: List[Dict], strategies) -> Dict[str, List[Dict]]:
+    out: Dict[str, List[Dict]] = {tag: [] for tag in strategies}
+    for row in rows:
+        row.pop("ordinal", None)
+        out[row.pop("strategy")].append(row)
+    return out
+
+
+def search_places_multi(strategies: Dict[str, Tuple[Optional[List[str]], int]], category=None, tambon=None,
+                        lat=None, lng=None, within_km=20) -> Dict[str, List[Dict]]:
+    """ค้นหาหลายกลยุทธ์ใน round-trip เดียว: strategies = {ป้าย: (keywords_any, limit)}
+
+    ถ้าให้ lat/lng จะเป็น search_places_nearby ทุกกลยุทธ์ คืน {ป้าย: แถวตามลำดับเดิม}
+    """
+    if not strategies:
+        return {}
+
+    if SEARCH_ENGINE == "memory":
+        catalog = _catalog()
+        if lat is not None and lng is not None:
+            return _road_ordered({
+                tag: catalog.search_places_nearby(lat, lng, category, tambon, kws, limit, within_km)
+                for tag, (kws, limit) in strategies.items()
+            }, lat, lng)
+        return {
+            tag: catalog.search_places(category, tambon, kws, limit)
+            for tag, (kws, limit) in strategies.items()
         }
-        params.update(p_kw)
 
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(sql, params)
-            return cur.fetchall()
+    return _road_ordered(_cached_search(
+        ("multi", category, tambon, _strategies_key(strategies)), lat, lng,
+        within_km if lat is not None and lng is not None else None,
+        lambda qlat, qlng, within, factor: _search_places_multi_db(
+            _padded_strategies(strategies, factor), category, tambon, qlat, qlng, within
+        ),
+        {tag: limit for tag, (kws, limit) in strategies.items()},
+    ), lat, lng)
+
+
+def _padded_strategies(strategies, factor: int):
+    if factor == 1:
+        return strategies
+    return {tag: (kws, _padded(limit, factor)) for tag, (kws, limit) in strategies.items()}
+
+
+def _strategies_key(strategies) -> tuple:
+    return tuple((tag, _keywords_key(kws), limit) for tag, (kws, limit) in strategies.items())
+
+
+def _search_places_multi_db(strategies, category, tambon, lat, lng, within_km) -> Dict[str, List[Dict]]:
+    with pooled_conn() as conn:
+        sql, params = _multi_query(
+            _select_fields(conn, light=True), _use_trigram(conn), strategies, category, tambon, lat, lng, within_km
+        )
+        return _split_strategies(_fetch_dicts(conn, sql, params), strategies)
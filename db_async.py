@@ -0,0 +1,226 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import streamlit as st
+
+import db
+import tracing
+
+try:
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+    from psycopg.rows import dict_row, tuple_row
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:  # psycopg 3 เป็นตัวเลือก: ไม่มีก็ใช้ฟังก์ชันของ db.py ผ่าน thread
+    psycopg = None
+    AsyncConnectionPool = None
+
+
+_POOL: Optional["AsyncConnectionPool"] = None
+_POOL_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _use_async_driver() -> bool:
+    """ใช้ psycopg 3 แบบ async เมื่อติดตั้งไว้ (ตั้ง postgres.async_driver = "off" เพื่อบังคับใช้ thread)"""
+    if psycopg is None:
+        return False
+    return st.secrets["postgres"].get("async_driver", "auto") != "off"
+
+
+def _conninfo() -> str:
+    cfg = st.secrets["postgres"]
+    return make_conninfo(
+        host=cfg["host"],
+        port=cfg["port"],
+        dbname=cfg["dbname"],
+        user=cfg["user"],
+        password=cfg["password"],
+        sslmode=cfg.get("sslmode", "require"),
+    )
+
+
+def _release_pool(pool: "AsyncConnectionPool", loop: asyncio.AbstractEventLoop) -> None:
+    """ปิด pool เดิมเมื่อต้องสร้าง pool ใหม่ให้ loop อื่น (pool แบบ async ต้องปิดบน loop ที่สร้างมันเท่านั้น)
+
+    loop เดิมยังรันอยู่ใน thread อื่น: ส่ง close() ไปรันบน loop นั้น
+    loop เดิมจบไปแล้ว (เช่น asyncio.run ที่ไม่ได้ await close_pool()): worker ของ pool ตายไปพร้อม loop
+    แล้ว จึงทิ้ง pool ไป ให้ connection ที่ค้างถูกปิดเมื่อ object ถูกเก็บกวาด
+    """
+    if loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(pool.close(), loop)
+    else:
+        print("DEBUG: async pool ของ loop ที่จบไปแล้วไม่ได้ปิดด้วย close_pool(): ทิ้ง pool เดิม")
+
+
+async def _get_pool() -> "AsyncConnectionPool":
+    """pool ของ event loop ปัจจุบัน (pool แบบ async ผูกกับ loop ที่สร้างมัน)"""
+    global _POOL, _POOL_LOOP
+    loop = asyncio.get_running_loop()
+    if _POOL is None or _POOL_LOOP is not loop:
+        if _POOL is not None:
+            _release_pool(_POOL, _POOL_LOOP)
+            _POOL, _POOL_LOOP = None, None
+        cfg = st.secrets["postgres"]
+        pool = AsyncConnectionPool(
+            _conninfo(),
+            min_size=cfg.get("pool_min_size", 1),
+            max_size=cfg.get("pool_max_size", 5),
+            timeout=cfg.get("pool_timeout", 10),
+            max_lifetime=cfg.get("pool_max_lifetime", 1800),
+            # ClientCursor ผูกพารามิเตอร์ฝั่ง client เหมือน psycopg2 เพื่อใช้ SQL ชุดเดียวกับ db.py
+            # (เงื่อนไขแบบ %(cat)s IS NULL ต้องการค่าที่ฝังใน SQL ไม่ใช่พารามิเตอร์ฝั่ง server ที่ไม่มีชนิด)
+            kwargs={"autocommit": True, "cursor_factory": psycopg.AsyncClientCursor, "row_factory": dict_row},
+            open=False,
+        )
+        await pool.open()
+        _POOL, _POOL_LOOP = pool, loop
+    return _POOL
+
+
+async def close_pool():
+    """ปิด pool: เรียกก่อน loop จบ (เช่นท้าย coroutine ที่ส่งให้ asyncio.run)"""
+    global _POOL, _POOL_LOOP
+    if _POOL is None:
+        return
+    if _POOL_LOOP is asyncio.get_running_loop():
+        await _POOL.close()
+    else:
+        _release_pool(_POOL, _POOL_LOOP)
+    _POOL, _POOL_LOOP = None, None
+
+
+async def _cached_schema(conn, key: str, sql: str, params=None) -> set:
+    """อ่าน schema ผ่าน cache ตัวเดียวกับ db._SCHEMA_CACHE (ฝั่ง sync และ async ใช้ร่วมกัน)"""
+    cached = db._SCHEMA_CACHE.get(key)
+    if cached and time.monotonic() - cached[1] < db._schema_cache_ttl():
+        return cached[0]
+
+    async with conn.cursor(row_factory=tuple_row) as cur:
+        db._QUERY_STATS["schema_queries"] += 1
+        db._QUERY_STATS["queries"] += 1
+        await cur.execute(sql, params)
+        values = {row[0] for row in await cur.fetchall()}
+
+    with db._SCHEMA_LOCK:
+        db._SCHEMA_CACHE[key] = (values, time.monotonic())
+    return values
+
+
+async def _query_shape(conn, light: bool):
+    """(select_fields, use_trigram) ที่ db.search_places ใช้ คำนวณจาก schema ที่ cache ไว้"""
+    columns = await _cached_schema(
+        conn, "places",
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s;",
+        ("places",),
+    )
+    use_trigram = False
+    if db._trigram_mode_enabled() and "search_norm" in columns:
+        extensions = await _cached_schema(conn, "pg_extension", "SELECT extname FROM pg_extension;")
+        use_trigram = "pg_trgm" in extensions
+    light = light and db._light_search_enabled()
+    return db._fields_sql("id" in columns, "image_urls" in columns, light), use_trigram
+
+
+async def _cached(key: tuple, lat, lng, within_km, run, limits=None):
+    """db._cached_search แบบ async (get ของ cache อาจต้องอ่าน version จากฐานข้อมูล จึงรันใน thread)"""
+    cache = db._result_cache()
+    if cache is None:
+        return await run(lat, lng, within_km, 1)
+
+    qlat, qlng, cell = cache.bucket(lat, lng)
+    pad_km = cache.cell_radius_km(cell)
+    key = key + (cell, within_km)
+    value = await asyncio.to_thread(cache.get, key)
+    if value is None:
+        generation = cache.generation
+        value = await run(qlat, qlng, within_km + pad_km if pad_km else within_km, db._limit_factor(pad_km))
+        cache.put(key, value, generation)
+    out = db._relocated(value, lat, lng, qlat, qlng, within_km, limits, pad_km)
+    return out if out is not None else await run(lat, lng, within_km, 1)
+
+
+async def _fetch(build, *args, light: bool = True) -> List[Dict]:
+    pool = await _get_pool()
+    async with pool.connection() as conn:
+        select_fields, use_trigram = await _query_shape(conn, light)
+        sql, params = build(select_fields, use_trigram, *args)
+        async with conn.cursor() as cur:
+            db._QUERY_STATS["queries"] += 1
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+@tracing.traced("db.search_places")
+async def search_places(category=None, tambon=None, keywords_any=None, limit=30) -> List[Dict]:
+    """db.search_places แบบ async: psycopg 3 ถ้ามี ไม่งั้นรันฟังก์ชัน sync ใน thread pool"""
+    # engine "memory" ก็ส่งเข้า thread: ครั้งแรกต้องโหลดทั้งตารางจาก Postgres และการค้นเป็นงาน CPU
+    # ที่ไม่ควรค้าง event loop ซึ่ง LLM call ของรอบอื่นรออยู่
+    if db.SEARCH_ENGINE == "memory" or not _use_async_driver():
+        return await asyncio.to_thread(db.search_places, category, tambon, keywords_any, limit)
+    return await _cached(
+        ("search", category, tambon, db._keywords_key(keywords_any), limit), None, None, None,
+        lambda lat, lng, within, factor: _fetch(db._search_query, category, tambon, keywords_any, limit),
+    )
+
+
+@tracing.traced("db.search_places_nearby")
+async def search_places_nearby(lat, lng, category=None, tambon=None, keywords_any=None,
+                               limit=30, within_km=20) -> List[Dict]:
+    if db.SEARCH_ENGINE == "memory" or not _use_async_driver():
+        return await asyncio.to_thread(
+            db.search_places_nearby, lat, lng, category, tambon, keywords_any, limit, within_km
+        )
+    rows = await _cached(
+        ("nearby", category, tambon, db._keywords_key(keywords_any), limit), lat, lng, within_km,
+        lambda qlat, qlng, within, factor: _fetch(
+            db._nearby_query, qlat, qlng, category, tambon, keywords_any, db._padded(limit, factor), within
+        ),
+        limit,
+    )
+    # ครั้งแรกโหลดกราฟถนน และทุกครั้งรัน Dijkstra ใน Python: ทำใน thread ไม่ให้ค้าง event loop
+    return await asyncio.to_thread(db._road_ordered, rows, lat, lng)
+
+
+@tracing.traced("db.search_places_multi")
+async def search_places_multi(strategies, category=None, tambon=None, lat=None, lng=None,
+                              within_km=20) -> Dict[str, List[Dict]]:
+    """db.search_places_multi แบบ async (ทุกกลยุทธ์ใน round-trip เดียว)"""
+    if not strategies:
+        return {}
+    if db.SEARCH_ENGINE == "memory" or not _use_async_driver():
+        return await asyncio.to_thread(db.search_places_multi, strategies, category, tambon, lat, lng, within_km)
+
+    async def run(qlat, qlng, within, factor):
+        padded = db._padded_strategies(strategies, factor)
+        rows = await _fetch(db._multi_query, padded, category, tambon, qlat, qlng, within)
+        return db._split_strategies(rows, padded)
+
+    value = await _cached(
+        ("multi", category, tambon, db._strategies_key(strategies)), lat, lng,
+        within_km if lat is not None and lng is not None else None, run,
+        {tag: limit for tag, (kws, limit) in strategies.items()},
+    )
+    return await asyncio.to_thread(db._road_ordered, value, lat, lng)
+
+
+@tracing.traced("db.fetch_places_by_ids")
+async def fetch_places_by_ids(ids: List[int]) -> List[Dict]:
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    if db.SEARCH_ENGINE == "memory" or not _use_async_driver():
+        return await asyncio.to_thread(db.fetch_places_by_ids, ids)
+    # ค้นตาม id ไม่ใช้ trigram: ตัดอาร์กิวเมนต์ use_trigram ที่ _fetch ส่งให้ builder ทุกตัวออก
+    rows = await _fetch(lambda fields, _use_trigram, ids: db._by_ids_query(fields, ids), ids, light=False)
+    return db._order_by_ids(rows, ids)
+
+
+@tracing.traced("db.hydrate_places")
+async def hydrate_places(rows: List[Dict]) -> List[Dict]:
+    """db.hydrate_places แบบ async: เติมคอลัมน์ที่ค้นหาแบบ light ข้ามไว้ ด้วย query เดียว"""
+    ids = db._light_ids(rows)
+    if not ids:
+        return rows
+    return db._merge_hydrated(rows, await fetch_places_by_ids(ids))
@@ -0,0 +1,255 @@
+"""ดัชนีเวกเตอร์ของสถานที่สำหรับค้นหาเชิงความหมาย (จับคำถามที่ถามด้วยคำอื่นที่ keyword ไม่เจอ)
+
+เวกเตอร์ของ ชื่อ | คำอธิบาย | จุดเด่น คำนวณล่วงหน้าแบบออฟไลน์ด้วยโมเดลบน CPU แล้วเก็บเป็นเมทริกซ์
+int8 (scale ต่อแถว) หรือ float16 ที่ normalize แล้ว (ไฟล์ .npy เปิดแบบ memory-map) ค้นด้วยการคูณ
+เมทริกซ์ตรงๆ ซึ่งพอสำหรับข้อมูลระดับอำเภอ (50k แถว x 384 มิติ ≈ 19 MB ที่ int8)
+int8 เป็นค่าเริ่มต้นเพราะ numpy แปลง int8 เป็น float32 ได้เร็วกว่า float16 หลายเท่า
+
+    python embeddings.py build --out data/embeddings
+    python embeddings.py build --out data/embeddings --encoder hashing --dtype float16
+
+ไฟล์ในโฟลเดอร์ดัชนี: vectors.npy (N x dim), ids.npy (id ของ places เรียงจากน้อยไปมาก),
+scales.npy (เฉพาะ int8) และ meta.json
+"""
+import argparse
+import json
+import os
+import threading
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import EMBEDDING_INDEX_PATH, EMBEDDING_MODEL
+from place_text import normalize_loose_text
+
+SCORE_BLOCK_ROWS = 8192
+
+
+def place_document(place: Dict) -> str:
+    """ข้อความของสถานที่ที่ใช้ทำเวกเตอร์"""
+    parts = [place.get("name"), place.get("description"), place.get("highlight")]
+    return " | ".join(str(p).strip() for p in parts if p and str(p).strip())
+
+
+# ---------- Encoders ----------
+class HashingEncoder:
+    """ตัวเข้ารหัสที่ไม่ต้องมีโมเดล: hash character 2-3 gram ของข้อความ normalize ลง dim มิติ
+
+    จับได้เฉพาะคำที่สะกดใกล้กัน/สลับลำดับ ไม่เข้าใจความหมาย ใช้แทนเมื่อไม่มี sentence-transformers
+    (และใน benchmark)
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = int(dim)
+
+    def _vector(self, text: str) -> np.ndarray:
+        v = np.zeros(self.dim, dtype=np.float32)
+        t = normalize_loose_text(text)
+        for n in (2, 3):
+            for i in range(len(t) - n + 1):
+                # crc32 ให้ค่าเดิมทุก process (hash() ของ Python สุ่ม seed ต่อ process)
+                h = zlib.crc32(t[i:i + n].encode("utf-8"))
+                v[h % self.dim] += 1.0 if h >> 31 else -1.0
+        return v
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return _normalize(np.stack([self._vector(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32))
+
+
+class SentenceTransformerEncoder:
+    """โมเดลจาก sentence-transformers บน CPU (ค่าเริ่มต้นเป็นโมเดลหลายภาษาที่รองรับภาษาไทย)"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), batch_size=64, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def load_encoder(name: str, dim: Optional[int] = None):
+    if name == HashingEncoder.name:
+        return HashingEncoder(dim or 512)
+    try:
+        return SentenceTransformerEncoder(name)
+    except ImportError:
+        raise RuntimeError(
+            f"encoder {name!r} ต้องใช้แพ็กเกจ sentence-transformers (หรือใช้ --encoder hashing)"
+        )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+# ---------- สร้างดัชนี ----------
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(เมทริกซ์ที่เก็บจริง, scale ต่อแถวที่ต้องคูณกลับตอนคิดคะแนน หรือ None)"""
+    if dtype == "int8":
+        # scale ต่อแถวจากค่าสัมบูรณ์สูงสุด: ใช้ครบ 255 ระดับแม้ค่าในเวกเตอร์ยาวจะเล็กมาก
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        return np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8), scales
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    raise ValueError(f"dtype ต้องเป็น float16 หรือ int8 ไม่ใช่ {dtype!r}")
+
+
+def encode_documents(encoder, docs: Sequence[str], batch_size: int = 256) -> np.ndarray:
+    chunks = [encoder.encode(docs[i:i + batch_size]) for i in range(0, len(docs), batch_size)]
+    return np.concatenate(chunks) if chunks else np.zeros((0, encoder.dim), np.float32)
+
+
+def build_index(rows: List[Dict], out_dir: str, encoder, dtype: str = "int8", batch_size: int = 256) -> Dict:
+    """คำนวณเวกเตอร์ของทุกแถวที่มี id แล้วเขียนดัชนีลง out_dir (เขียนทับของเดิม)"""
+    rows = sorted((r for r in rows if r.get("id") is not None), key=lambda r: int(r["id"]))
+    ids = np.array([int(r["id"]) for r in rows], dtype=np.int64)
+    vectors = encode_documents(encoder, [place_document(r) for r in rows], batch_size)
+    return write_index(out_dir, ids, vectors, encoder, dtype)
+
+
+def write_index(out_dir: str, ids: np.ndarray, vectors: np.ndarray, encoder, dtype: str = "int8") -> Dict:
+    """เขียนดัชนีจาก ids (เรียงจากน้อยไปมาก) และเวกเตอร์ float32 แถวตรงกัน"""
+    stored, scales = quantize(_normalize(vectors), dtype)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "vectors.npy"), stored)
+    np.save(os.path.join(out_dir, "ids.npy"), ids)
+    scales_path = os.path.join(out_dir, "scales.npy")
+    if scales is not None:
+        np.save(scales_path, scales)
+    elif os.path.exists(scales_path):
+        os.remove(scales_path)
+    meta = {"encoder": encoder.name, "dim": int(encoder.dim), "dtype": dtype, "count": len(ids)}
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+# ---------- ค้นหา ----------
+class EmbeddingIndex:
+    def __init__(self, path: str, encoder=None):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"))
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        self.encoder = encoder or load_encoder(self.meta["encoder"], self.meta.get("dim"))
+        self._embed = lru_cache(maxsize=1024)(self._embed_uncached)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _embed_uncached(self, text: str) -> np.ndarray:
+        return self.encoder.encode([text])[0]
+
+    def embed(self, text: str) -> np.ndarray:
+        return self._embed(text)
+
+    def _scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """cosine ของ q กับทุกแถว (หรือเฉพาะ rows) คิดทีละบล็อกเพื่อไม่แปลงทั้งเมทริกซ์เป็น float32"""
+        if rows is not None:
+            out = np.asarray(self.vectors[rows], dtype=np.float32) @ q
+            return out * self.scales[rows] if self.scales is not None else out
+        out = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = block @ q
+        return out * self.scales if self.scales is not None else out
+
+    def search(self, text: str, k: int = 30) -> List[Tuple[int, float]]:
+        """[(id, cosine)] k อันดับแรก"""
+        if not len(self.ids) or not text.strip():
+            return []
+        scores = self._scores(self.embed(text))
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+    def vectors_for_ids(self, ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(mask ของ id ที่มีในดัชนี, เวกเตอร์ float32 ของ id เหล่านั้น) ใช้ตอนสร้างดัชนีใหม่แบบเพิ่มส่วน"""
+        wanted = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.zeros(len(wanted), dtype=bool), np.zeros((0, self.vectors.shape[1]), np.float32)
+        pos = np.clip(np.searchsorted(self.ids, wanted), 0, len(self.ids) - 1)
+        found = self.ids[pos] == wanted
+        vectors = np.asarray(self.vectors[pos[found]], dtype=np.float32)
+        if self.scales is not None:
+            vectors = vectors * self.scales[pos[found]][:, None]
+        return found, vectors
+
+    def scores_for_ids(self, text: str, ids: Sequence) -> np.ndarray:
+        """cosine ของข้อความกับสถานที่ตาม ids (id ที่ไม่มีในดัชนีได้ 0)"""
+        out = np.zeros(len(ids), dtype=np.float32)
+        if not len(self.ids) or not text.strip():
+            return out
+        wanted = np.array([int(i) if i is not None else -1 for i in ids], dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.ids, wanted), 0, len(self.ids) - 1)
+        found = self.ids[pos] == wanted
+        if found.any():
+            out[found] = self._scores(self.embed(text), pos[found])
+        return out
+
+
+def resolve_index_path(path: str) -> str:
+    """โฟลเดอร์ดัชนีของ path: ถ้าเป็นโฟลเดอร์ artifact ของ precompute.py (มี manifest.json)
+    ใช้ <path>/<รุ่นที่ "index" ชี้>/embeddings ไม่งั้นใช้ path ตรงๆ"""
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return path
+    with open(manifest_path, encoding="utf-8") as f:
+        version = json.load(f).get("index")
+    if not version:
+        raise FileNotFoundError(f"{manifest_path} has no version with an embedding index")
+    return os.path.join(path, version, "embeddings")
+
+
+_INDEX: Optional[EmbeddingIndex] = None
+_INDEX_LOADED = False
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index() -> Optional[EmbeddingIndex]:
+    """ดัชนีของทั้ง process (None ถ้าไม่ได้ตั้ง EMBEDDING_INDEX_PATH หรือโหลดไม่ได้)"""
+    global _INDEX, _INDEX_LOADED
+    if not _INDEX_LOADED:
+        with _INDEX_LOCK:
+            if not _INDEX_LOADED:
+                if EMBEDDING_INDEX_PATH:
+                    try:
+                        _INDEX = EmbeddingIndex(resolve_index_path(EMBEDDING_INDEX_PATH))
+                    except Exception as e:
+                        print(f"DEBUG: embedding index unavailable: {str(e)}")
+                _INDEX_LOADED = True
+    return _INDEX
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="คำนวณเวกเตอร์ของทุกแถวใน places")
+    build.add_argument("--out", default=EMBEDDING_INDEX_PATH or "data/embeddings")
+    build.add_argument("--encoder", default=EMBEDDING_MODEL, help='ชื่อโมเดล sentence-transformers หรือ "hashing"')
+    build.add_argument("--dtype", choices=["int8", "float16"], default="int8")
+    args = parser.parse_args()
+
+    import db
+
+    meta = build_index(db.fetch_all_places(), args.out, load_encoder(args.encoder), args.dtype)
+    print(f"wrote {meta['count']} vectors ({meta['dim']} dims, {meta['dtype']}) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
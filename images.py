@@ -0,0 +1,102 @@
+"""จัดการ URL รูปภาพของสถานที่: แปลงลิงก์ Google Drive / googleusercontent ให้แสดงผลได้
+และรวมรายการรูปจาก image_urls กับ image_url (ใช้ทั้งใน app.py และ precompute.py)"""
+import json
+import re
+from urllib.parse import parse_qs, urlparse
+
+
+def extract_google_drive_file_id(url: str):
+    if not url or not isinstance(url, str):
+        return None
+
+    m = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)
+    if m:
+        return m.group(1)
+
+    if "open?id=" in url:
+        try:
+            parsed = urlparse(url)
+            q = parse_qs(parsed.query)
+            file_ids = q.get("id")
+            if file_ids:
+                return file_ids[0]
+        except Exception:
+            pass
+
+    if "uc?id=" in url:
+        try:
+            parsed = urlparse(url)
+            q = parse_qs(parsed.query)
+            file_ids = q.get("id")
+            if file_ids:
+                return file_ids[0]
+        except Exception:
+            pass
+
+    return None
+
+
+def fix_image_url(url: str):
+    if not url or not isinstance(url, str):
+        return None
+
+    url = url.strip()
+    if not url:
+        return None
+
+    if "drive.google.com" in url:
+        file_id = extract_google_drive_file_id(url)
+        if file_id:
+            return f"https://drive.google.com/uc?export=view&id={file_id}"
+        return url
+
+    if "lh3.google" in url or "googleusercontent.com" in url:
+        if "=" not in url.split("/")[-1]:
+            return f"{url}=s1200"
+        return url
+
+    return url
+
+
+def parse_image_urls(raw_value):
+    if not raw_value:
+        return []
+
+    if isinstance(raw_value, list):
+        return [fix_image_url(u) for u in raw_value if isinstance(u, str) and u.strip()]
+
+    if isinstance(raw_value, str):
+        txt = raw_value.strip()
+        if not txt:
+            return []
+
+        try:
+            data = json.loads(txt)
+            if isinstance(data, list):
+                return [fix_image_url(u) for u in data if isinstance(u, str) and u.strip()]
+        except Exception:
+            pass
+
+        return [fix_image_url(txt)]
+
+    return []
+
+
+def get_best_image_candidates(place: dict):
+    urls = []
+
+    image_urls = parse_image_urls(place.get("image_urls"))
+    urls.extend(image_urls)
+
+    image_url = place.get("image_url")
+    if isinstance(image_url, str) and image_url.strip():
+        fixed = fix_image_url(image_url)
+        if fixed and fixed not in urls:
+            urls.append(fixed)
+
+    clean = []
+    for u in urls:
+        if isinstance(u, str) and u.startswith(("http://", "https://")):
+            clean.append(u)
+
+    return clean
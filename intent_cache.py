@@ -0,0 +1,93 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class IntentCache:
+    """LRU + TTL cache สำหรับผลตีความเจตนาของ LLM เก็บใน SQLite ได้ถ้าให้ path (อยู่รอดข้ามการรีสตาร์ท)"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 6 * 3600, path: Optional[str] = None):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "skipped": 0, "evictions": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _fresh(self, created_at: float) -> bool:
+        return time.time() - created_at < self.ttl
+
+    def _remember(self, key: str, value: Dict, created_at: float):
+        self._items[key] = (value, created_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                if self._fresh(entry[1]):
+                    self._items.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(entry[0])
+                del self._items[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM intent_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and self._fresh(row[1]):
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return dict(value)
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Dict):
+        now = time.time()
+        value = dict(value)
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intent_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now),
+                )
+                self._db.execute("DELETE FROM intent_cache WHERE created_at < ?", (now - self.ttl,))
+                self._db.commit()
+
+    def note_skip(self):
+        """นับครั้งที่ไม่ใช้ cache เพราะประวัติแชทเปลี่ยนความหมายของคำถาม"""
+        with self._lock:
+            self._stats["skipped"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intent_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._items)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
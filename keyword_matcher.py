@@ -0,0 +1,92 @@
+from collections import deque
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Set
+
+
+class TextMatches:
+    """ผลการจับคำหนึ่งรอบ: คำที่เจอทั้งหมด และจำนวนคำที่เจอแยกตาม tag"""
+
+    __slots__ = ("words", "_counts")
+
+    def __init__(self, words: FrozenSet[str], counts: Dict[Hashable, int]):
+        self.words = words
+        self._counts = counts
+
+    def has(self, tag: Hashable) -> bool:
+        return self._counts.get(tag, 0) > 0
+
+    def count(self, tag: Hashable) -> int:
+        return self._counts.get(tag, 0)
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton ที่รวมพจนานุกรมคำหลายชุดไว้ในตัวเดียว
+
+    แต่ละชุดคำลงทะเบียนด้วย tag ของตัวเอง แล้วสแกนข้อความครั้งเดียวได้ทุกคำที่เป็น substring
+    พร้อมจำนวนคำที่เจอต่อ tag (เท่ากับ `sum(1 for w in words if w in text)`)
+    """
+
+    def __init__(self):
+        self._word_tags: Dict[str, Dict[Hashable, int]] = {}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        self._compiled = False
+
+    def add(self, tag: Hashable, words: Iterable[str]):
+        for w in words:
+            if not w:
+                continue
+            tags = self._word_tags.setdefault(w, {})
+            tags[tag] = tags.get(tag, 0) + 1
+        self._compiled = False
+
+    def compile(self):
+        self._goto, self._fail, self._out = [{}], [0], [[]]
+        for word in self._word_tags:
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(word)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._compiled = True
+
+    def find_words(self, text: str) -> Set[str]:
+        if not self._compiled:
+            self.compile()
+
+        found: Set[str] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def match(self, text: str) -> TextMatches:
+        words = self.find_words(text)
+        counts: Dict[Hashable, int] = {}
+        for w in words:
+            for tag, n in self._word_tags[w].items():
+                counts[tag] = counts.get(tag, 0) + n
+        return TextMatches(frozenset(words), counts)
@@ -1,10 +1,186 @@
+"""client ของ Google Maps (Directions / Distance Matrix) ที่ใช้ Session ร่วมกัน มี timeout และ cache
+
+พิกัดใน key ของ cache ปัดเป็น coord_decimals ตำแหน่ง (4 ≈ 11 ม.) ผู้ใช้ที่ยืนห่างกันไม่กี่เมตรจึงใช้ผลเดียวกัน
+travel_times ถามเวลาเดินทางจากจุดเดียวไปหลายสถานที่ใน request เดียวของ Distance Matrix
+(ไม่เกิน 25 ปลายทางต่อ request ตามข้อจำกัดของ API) และถามเฉพาะคู่ที่ยังไม่อยู่ใน cache
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
 import requests
-from config import MAPS_API_KEY
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import MAPS_API_BASE, MAPS_API_KEY, MAPS_CACHE_TTL
+
+MAX_DESTINATIONS = 25
+# (connect, read) วินาที
+DEFAULT_TIMEOUT = (3.05, 10.0)
+
+Coord = Tuple[float, float]
+
+
+class MapsClient:
+    def __init__(self, api_key: str = MAPS_API_KEY, base_url: str = MAPS_API_BASE,
+                 timeout=DEFAULT_TIMEOUT, cache_size: int = 4096, cache_ttl: float = MAPS_CACHE_TTL,
+                 coord_decimals: int = 4, pool_size: int = 10, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache_size = max(1, int(cache_size))
+        self.cache_ttl = float(cache_ttl)
+        self.coord_decimals = int(coord_decimals)
+
+        if session is None:
+            session = requests.Session()
+            # ลองใหม่เฉพาะ error ฝั่งเซิร์ฟเวอร์ชั่วคราว (GET ของ API นี้ยิงซ้ำได้ปลอดภัย)
+            retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                          allowed_methods=frozenset(["GET"]))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "requests": 0, "errors": 0}
+
+    # ---------- cache ----------
+    def _round(self, coord: Coord) -> Coord:
+        return round(float(coord[0]), self.coord_decimals), round(float(coord[1]), self.coord_decimals)
+
+    def _cache_get(self, key: tuple):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.time() - entry[1] < self.cache_ttl:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._cache[key]
+            self._stats["misses"] += 1
+            return None
+
+    def _cache_put(self, key: tuple, value):
+        with self._lock:
+            self._cache[key] = (value, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._cache)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+    # ---------- HTTP ----------
+    def _get(self, endpoint: str, params: Dict) -> Dict:
+        with self._lock:
+            self._stats["requests"] += 1
+        try:
+            response = self.session.get(
+                f"{self.base_url}/{endpoint}/json", params={**params, "key": self.api_key}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+    @staticmethod
+    def _latlng(coord: Coord) -> str:
+        return f"{coord[0]},{coord[1]}"
+
+    # ---------- API ----------
+    def directions(self, origin: Coord, destination: Coord, mode: str = "driving") -> Dict:
+        """JSON ของ Directions API (cache เฉพาะผลที่ status เป็น OK)"""
+        origin, destination = self._round(origin), self._round(destination)
+        key = ("directions", origin, destination, mode)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        data = self._get("directions", {
+            "origin": self._latlng(origin), "destination": self._latlng(destination), "mode": mode,
+        })
+        if data.get("status") == "OK":
+            self._cache_put(key, data)
+        return data
+
+    def distance_matrix(self, origins: Sequence[Coord], destinations: Sequence[Coord], mode: str = "driving") -> Dict:
+        """JSON ของ Distance Matrix API ตรงๆ (ไม่ cache; ผู้เรียกต้องคุมจำนวนปลายทางเอง)"""
+        return self._get("distancematrix", {
+            "origins": "|".join(self._latlng(self._round(o)) for o in origins),
+            "destinations": "|".join(self._latlng(self._round(d)) for d in destinations),
+            "mode": mode,
+        })
+
+    def travel_times(self, origin: Coord, places: List[Dict], mode: str = "driving") -> List[Optional[Dict]]:
+        """เวลาเดินทางจาก origin ไปทุกสถานที่ เรียงตาม places:
+        {"distance_m", "duration_s", "distance_text", "duration_text"} หรือ None ถ้าไม่มีพิกัด/API ไม่มีเส้นทาง"""
+        origin = self._round(origin)
+        out: List[Optional[Dict]] = [None] * len(places)
+        missing: "OrderedDict[Coord, List[int]]" = OrderedDict()
+
+        for i, p in enumerate(places):
+            if p.get("latitude") is None or p.get("longitude") is None:
+                continue
+            dest = self._round((p["latitude"], p["longitude"]))
+            cached = self._cache_get(("travel", origin, dest, mode))
+            if cached is not None:
+                out[i] = cached
+            else:
+                missing.setdefault(dest, []).append(i)
+
+        dests = list(missing)
+        for start in range(0, len(dests), MAX_DESTINATIONS):
+            chunk = dests[start:start + MAX_DESTINATIONS]
+            try:
+                data = self.distance_matrix([origin], chunk, mode)
+            except Exception as e:
+                # ข้อความของ requests มี URL เต็มซึ่งมี API key: พิมพ์แค่ชนิดของ error
+                print(f"DEBUG: distance matrix error: {type(e).__name__}")
+                continue
+            if data.get("status") != "OK" or not data.get("rows"):
+                print(f"DEBUG: distance matrix status: {data.get('status')}")
+                continue
+            for dest, element in zip(chunk, data["rows"][0].get("elements", [])):
+                if element.get("status") != "OK":
+                    continue
+                value = {
+                    "distance_m": element["distance"]["value"],
+                    "duration_s": element["duration"]["value"],
+                    "distance_text": element["distance"].get("text"),
+                    "duration_text": element["duration"].get("text"),
+                }
+                self._cache_put(("travel", origin, dest, mode), value)
+                for i in missing[dest]:
+                    out[i] = value
+        return out
+
+
+_CLIENT: Optional[MapsClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> MapsClient:
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = MapsClient()
+    return _CLIENT
+
 
 def get_directions(origin_lat, origin_lng, dest_lat, dest_lng):
-    url = (
-        f"https://maps.googleapis.com/maps/api/directions/json?"
-        f"origin={origin_lat},{origin_lng}&destination={dest_lat},{dest_lng}&key={MAPS_API_KEY}"
-    )
-    response = requests.get(url)
-    return response.json()
+    return get_client().directions((origin_lat, origin_lng), (dest_lat, dest_lng))
@@ -0,0 +1,39 @@
+"""รันไฟล์ใน migrations/ ตามลำดับชื่อไฟล์ ทุกไฟล์เขียนให้รันซ้ำได้ (idempotent)
+
+    python migrate.py
+"""
+import os
+import sys
+
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def run_migrations(migrations_dir: str = MIGRATIONS_DIR) -> bool:
+    files = sorted(f for f in os.listdir(migrations_dir) if f.endswith(".sql"))
+    ok = True
+
+    conn = db.get_conn()
+    try:
+        for name in files:
+            with open(os.path.join(migrations_dir, name), encoding="utf-8") as fh:
+                sql = fh.read()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                conn.commit()
+                print(f"applied  {name}")
+            except Exception as e:
+                conn.rollback()
+                ok = False
+                print(f"skipped  {name}: {str(e).strip()}")
+    finally:
+        conn.close()
+
+    db.invalidate_schema_cache()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_migrations() else 1)
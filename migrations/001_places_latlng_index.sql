@@ -0,0 +1,2 @@
+-- ดัชนีสำหรับ bounding box ใน db.search_places_nearby
+CREATE INDEX IF NOT EXISTS places_lat_lng_idx ON places (latitude, longitude);
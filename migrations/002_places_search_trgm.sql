@@ -0,0 +1,19 @@
+-- ค้นหาคีย์เวิร์ดด้วย pg_trgm: คอลัมน์ข้อความ normalize รวมทุกฟิลด์ + GIN trigram index
+-- ถ้าสร้าง extension ไม่ได้ ไฟล์นี้จะถูก rollback ทั้งไฟล์และ db.py จะใช้ SQL แบบเดิมต่อไป
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- normalize แบบเดียวกับ db._norm_sql และคั่นแต่ละฟิลด์ด้วย '|' กันไม่ให้คำไปตรงข้ามฟิลด์
+ALTER TABLE places
+    ADD COLUMN IF NOT EXISTS search_norm TEXT
+    GENERATED ALWAYS AS (
+        LOWER(REPLACE(REPLACE(REPLACE(
+            COALESCE(name, '') || '|' ||
+            COALESCE(description, '') || '|' ||
+            COALESCE(highlight, '') || '|' ||
+            COALESCE(category, '') || '|' ||
+            COALESCE(tambon, ''),
+        ' ', ''), '-', ''), '_', ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS places_search_norm_trgm_idx
+    ON places USING gin (search_norm gin_trgm_ops);
@@ -0,0 +1,27 @@
+-- ตัวนับ version ของตาราง places: เพิ่มทุกครั้งที่มีการแก้ข้อมูล แล้ว NOTIFY places_changed
+-- ให้ cache ผลค้นหา (result_cache.py) และ PlaceCatalog รู้ว่าต้องล้าง/โหลดใหม่
+CREATE TABLE IF NOT EXISTS places_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO places_version (id, version) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_places_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE places_version
+       SET version = version + 1, changed_at = now()
+     WHERE id
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('places_changed', new_version::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS places_version_bump ON places;
+CREATE TRIGGER places_version_bump
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON places
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_places_version();
@@ -0,0 +1,12 @@
+-- ค่าที่ precompute.py คำนวณจากแต่ละแถวของ places (ใช้เมื่อรันด้วย --write-back)
+-- content_hash คือ hash ของคอลัมน์ต้นทาง: แถวที่ hash ไม่เปลี่ยนจะไม่ถูกคำนวณซ้ำ
+CREATE TABLE IF NOT EXISTS places_derived (
+    place_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    name_norm TEXT,
+    blob_norm TEXT,
+    cat_tags TEXT[],
+    image_candidates JSONB NOT NULL DEFAULT '[]'::jsonb,
+    artifact_version TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,288 @@
+import re
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+import db
+from config import CATALOG_REFRESH_SECONDS
+from place_text import place_text
+from spatial_index import GridIndex
+
+NGRAM = 3
+SEAFOOD_TERMS = ["อาหารทะเล", "ซีฟู้ด"]
+
+
+def _ngrams(text: str) -> set:
+    if len(text) < NGRAM:
+        return set()
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _lower(value) -> Optional[str]:
+    return None if value is None else str(value).lower()
+
+
+def _sql_norm(text: Optional[str]) -> str:
+    """เท่ากับ db._norm_sql(...): COALESCE แล้วตัดช่องว่าง - _ (ไม่ strip แบบ _norm_text)"""
+    return (text or "").replace(" ", "").replace("-", "").replace("_", "")
+
+
+def _like_matcher(term: str) -> Callable[[Optional[str]], bool]:
+    """เลียนแบบ `col ILIKE '%term%'` (term ถูก lower มาแล้ว) รวมถึง wildcard % และ _ ใน term"""
+    if not any(ch in term for ch in "%_\\"):
+        return lambda text: text is not None and term in text
+
+    parts = []
+    i = 0
+    while i < len(term):
+        ch = term[i]
+        if ch == "\\" and i + 1 < len(term):
+            parts.append(re.escape(term[i + 1]))
+            i += 2
+            continue
+        if ch == "%":
+            parts.append(".*")
+        elif ch == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+        i += 1
+    rx = re.compile("".join(parts), re.DOTALL)
+    return lambda text: text is not None and rx.search(text) is not None
+
+
+class PlaceRecord:
+    __slots__ = (
+        "row", "lat", "lng",
+        "name_l", "cat_l", "tmb_l", "desc_l", "hi_l",
+        "name_n", "cat_n", "tmb_n", "desc_n", "hi_n",
+    )
+
+    def __init__(self, row: Dict):
+        place_text(row)  # คำนวณข้อความ normalize ครั้งเดียวตอนโหลด สำเนาที่คืนออกไปใช้ร่วมกัน
+        self.row = row
+        lat, lng = row.get("latitude"), row.get("longitude")
+        self.lat = float(lat) if lat is not None else None
+        self.lng = float(lng) if lng is not None else None
+
+        self.name_l = _lower(row.get("name"))
+        self.cat_l = _lower(row.get("category"))
+        self.tmb_l = _lower(row.get("tambon"))
+        self.desc_l = _lower(row.get("description"))
+        self.hi_l = _lower(row.get("highlight"))
+
+        self.name_n = _sql_norm(self.name_l)
+        self.cat_n = _sql_norm(self.cat_l)
+        self.tmb_n = _sql_norm(self.tmb_l)
+        self.desc_n = _sql_norm(self.desc_l)
+        self.hi_n = _sql_norm(self.hi_l)
+
+
+class _CatalogState:
+    """ข้อมูลที่โหลดแล้วหนึ่งชุด (สลับทั้งก้อนตอน refresh เพื่อไม่ให้ผู้อ่านเห็นสถานะครึ่งๆ กลางๆ)"""
+
+    def __init__(self, rows: List[Dict], version):
+        # ORDER BY name, id ฝั่ง SQL: เรียงตามชื่อ (NULL ไว้ท้าย) แล้วตาม id
+        rows = sorted(rows, key=lambda r: (r.get("name") is None, r.get("name") or "", r.get("id") or 0))
+        self.records = [PlaceRecord(r) for r in rows]
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        grams: Dict[str, set] = {}
+        categories: Dict[Optional[str], List[int]] = {}
+        tambons: Dict[Optional[str], List[int]] = {}
+        for i, rec in enumerate(self.records):
+            for text in (rec.name_n, rec.cat_n, rec.tmb_n, rec.desc_n, rec.hi_n):
+                for g in _ngrams(text):
+                    grams.setdefault(g, set()).add(i)
+            categories.setdefault(rec.cat_l, []).append(i)
+            tambons.setdefault(rec.tmb_l, []).append(i)
+
+        self.by_id = {rec.row["id"]: i for i, rec in enumerate(self.records) if rec.row.get("id") is not None}
+        self.ngram_index: Dict[str, FrozenSet[int]] = {g: frozenset(ids) for g, ids in grams.items()}
+        self.by_category = categories
+        self.by_tambon = tambons
+        self.grid = GridIndex(
+            (i, rec.lat, rec.lng)
+            for i, rec in enumerate(self.records)
+            if rec.lat is not None and rec.lng is not None
+        )
+
+    def _ids_for_value(self, groups: Dict[Optional[str], List[int]], value: str) -> set:
+        matcher = _like_matcher(value.lower())
+        out = set()
+        for key, ids in groups.items():
+            if matcher(key):
+                out.update(ids)
+        return out
+
+    def _ids_for_term(self, norm_term: str) -> Optional[set]:
+        """ตัวกรองหยาบจาก n-gram index: คืน None ถ้าคำสั้นเกินหรือมี wildcard (ต้องสแกนทั้งหมด)"""
+        if len(norm_term) < NGRAM or any(ch in norm_term for ch in "%_\\"):
+            return None
+        ids = None
+        for g in _ngrams(norm_term):
+            posting = self.ngram_index.get(g)
+            if not posting:
+                return set()
+            ids = set(posting) if ids is None else ids & posting
+            if not ids:
+                return ids
+        return ids
+
+    def _keyword_filter(self, keywords_any: Optional[List[str]]):
+        """คืน (candidate_ids, predicate) ที่ให้ผลเท่ากับ db._build_keywords_or"""
+        if not keywords_any:
+            return None, None
+
+        checks = []
+        candidates: Optional[set] = set()
+        for term in keywords_any:
+            raw_term = (term or "").strip()
+            if not raw_term:
+                continue
+            norm_term = db._norm_text(raw_term)
+            raw_match = _like_matcher(raw_term.lower())
+            norm_match = _like_matcher(norm_term)
+            seafood = raw_term in SEAFOOD_TERMS
+            checks.append((raw_match, norm_match, seafood))
+
+            if candidates is not None:
+                ids = self._ids_for_term(norm_term)
+                if ids is None or any(ch in raw_term for ch in "%_\\"):
+                    candidates = None
+                else:
+                    candidates |= ids
+
+        if not checks:
+            return None, None
+
+        def predicate(rec: PlaceRecord) -> bool:
+            for raw_match, norm_match, seafood in checks:
+                if seafood:
+                    if (raw_match(rec.name_l) or raw_match(rec.cat_l) or raw_match(rec.desc_l)
+                            or norm_match(rec.name_n) or norm_match(rec.cat_n) or norm_match(rec.desc_n)):
+                        return True
+                elif (raw_match(rec.name_l) or raw_match(rec.desc_l) or raw_match(rec.hi_l)
+                      or raw_match(rec.cat_l) or raw_match(rec.tmb_l)
+                      or norm_match(rec.name_n) or norm_match(rec.desc_n) or norm_match(rec.hi_n)
+                      or norm_match(rec.cat_n) or norm_match(rec.tmb_n)):
+                    return True
+            return False
+
+        return candidates, predicate
+
+    def filter(self, category=None, tambon=None, keywords_any=None, restrict: Optional[set] = None) -> List[int]:
+        ids: Optional[set] = restrict
+        if category is not None:
+            cat_ids = self._ids_for_value(self.by_category, category)
+            ids = cat_ids if ids is None else ids & cat_ids
+        if tambon is not None:
+            tmb_ids = self._ids_for_value(self.by_tambon, tambon)
+            ids = tmb_ids if ids is None else ids & tmb_ids
+
+        kw_ids, predicate = self._keyword_filter(keywords_any)
+        if kw_ids is not None:
+            ids = kw_ids if ids is None else ids & kw_ids
+
+        order = sorted(ids) if ids is not None else range(len(self.records))
+        out = []
+        for i in order:
+            rec = self.records[i]
+            if predicate is not None and not predicate(rec):
+                continue
+            out.append(i)
+        return out
+
+
+class PlaceCatalog:
+    """เครื่องค้นหาในหน่วยความจำ: โหลดตาราง places ครั้งเดียว แล้วตอบ search_places /
+    search_places_nearby ด้วยความหมายเดียวกับ SQL ใน db.py โดยไม่ต้องยิง Postgres
+
+    ข้อต่างเดียวคือ ORDER BY name เรียงตาม codepoint ไม่ใช่ collation ของฐานข้อมูล
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict]] = None,
+                 version_fn: Callable[[], object] = None,
+                 refresh_seconds: float = CATALOG_REFRESH_SECONDS):
+        self._loader = loader or db.fetch_all_places
+        self._version_fn = version_fn or db.places_version
+        self.refresh_seconds = float(refresh_seconds)
+        self._state: Optional[_CatalogState] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        version = self._version_fn()
+        state = _CatalogState(self._loader(), version)
+        self._state = state
+        self._checked_at = time.monotonic()
+        return state
+
+    def _current(self) -> _CatalogState:
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    return self.load()
+                return self._state
+
+        if self.refresh_seconds > 0 and time.monotonic() - self._checked_at >= self.refresh_seconds:
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._checked_at = time.monotonic()
+                    version = self._version_fn()
+                    # ไม่มี updated_at ให้เทียบ (version เป็น None) ก็โหลดใหม่ตามรอบเวลา
+                    if version is None or version != state.version:
+                        state = self.load()
+                finally:
+                    self._lock.release()
+        return state
+
+    def __len__(self):
+        return len(self._current().records)
+
+    def search_places(self, category=None, tambon=None, keywords_any=None, limit=30) -> List[Dict]:
+        state = self._current()
+        ids = state.filter(category, tambon, keywords_any)
+        if limit is not None:
+            ids = ids[:limit]
+        return [dict(state.records[i].row) for i in ids]
+
+    def search_places_nearby(self, lat, lng, category=None, tambon=None, keywords_any=None,
+                             limit=30, within_km=20) -> List[Dict]:
+        state = self._current()
+        hits = state.grid.within(lat, lng, within_km)
+        if not hits:
+            return []
+
+        allowed = set(state.filter(category, tambon, keywords_any, restrict={i for _, i in hits}))
+        hits = [h for h in hits if h[1] in allowed]
+        # ORDER BY distance_km, id: ระยะเท่ากัน (พิกัดเดียวกัน) เรียงตาม id
+        hits.sort(key=lambda h: (h[0], state.records[h[1]].row.get("id") or 0))
+        if limit is not None:
+            hits = hits[:limit]
+
+        out = []
+        for dist, i in hits:
+            row = dict(state.records[i].row)
+            row["distance_km"] = dist
+            out.append(row)
+        return out
+
+    def fetch_places_by_ids(self, ids: List[int]) -> List[Dict]:
+        state = self._current()
+        return [dict(state.records[state.by_id[i]].row) for i in ids if i in state.by_id]
+
+
+_CATALOG: Optional[PlaceCatalog] = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_catalog() -> PlaceCatalog:
+    global _CATALOG
+    if _CATALOG is None:
+        with _CATALOG_LOCK:
+            if _CATALOG is None:
+                _CATALOG = PlaceCatalog()
+    return _CATALOG
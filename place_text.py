@@ -0,0 +1,64 @@
+import re
+from typing import Dict, List, Tuple
+
+TEXT_KEY = "_text"
+
+
+def norm(s: str) -> str:
+    return (s or "").strip().lower()
+
+
+def normalize_loose_text(s: str) -> str:
+    s = norm(s)
+    s = re.sub(r"[\s\-_]+", "", s)
+    return s
+
+
+def split_category_tags(cat_value: str) -> List[str]:
+    if not cat_value:
+        return []
+    parts = [p.strip().lower() for p in str(cat_value).split(",")]
+    return [p for p in parts if p]
+
+
+class PlaceText:
+    """ข้อความของสถานที่ที่ normalize ไว้แล้ว ใช้ร่วมกันใน _rank, การกรองหมวด และการเทียบชื่อ"""
+
+    __slots__ = (
+        "name", "name_lower", "name_norm",
+        "category", "category_norm", "cat_tags",
+        "tambon_lower", "blob", "blob_norm", "detail_count",
+    )
+
+    def __init__(self, place: Dict):
+        name = str(place.get("name") or "")
+        cat = str(place.get("category") or "")
+        tmb = str(place.get("tambon") or "")
+        desc = str(place.get("description") or "")
+        hi = str(place.get("highlight") or "")
+
+        self.name = name
+        self.name_lower = name.lower()
+        self.name_norm = normalize_loose_text(name)
+        self.category = cat
+        self.category_norm = norm(cat)
+        self.cat_tags: Tuple[str, ...] = tuple(split_category_tags(cat))
+        self.tambon_lower = tmb.lower()
+        self.blob = " ".join([name, cat, tmb, desc, hi]).lower()
+        self.blob_norm = normalize_loose_text(self.blob)
+        self.detail_count = bool(hi) + bool(desc) + bool(place.get("image_url"))
+
+
+def place_text(place: Dict) -> PlaceText:
+    """PlaceText ของแถวนี้ คำนวณครั้งแรกครั้งเดียวแล้วแนบไว้ในแถว (คีย์ _text)"""
+    pt = place.get(TEXT_KEY)
+    if pt is None:
+        pt = PlaceText(place)
+        place[TEXT_KEY] = pt
+    return pt
+
+
+def attach_place_text(rows: List[Dict]) -> List[Dict]:
+    for r in rows:
+        place_text(r)
+    return rows
@@ -0,0 +1,75 @@
+"""ข้อมูลสำหรับแสดงการ์ดสถานที่ใน app.py (view model) คำนวณครั้งเดียวตอนได้ผลลัพธ์
+
+Streamlit รันสคริปต์ใหม่ทั้งไฟล์ทุกครั้งที่มีการโต้ตอบ การ์ดจึงไม่ควรแยก image_urls (JSON),
+แก้ลิงก์รูปด้วย regex หรือประกอบ URL แผนที่ซ้ำทุก rerun: app.py เก็บ view model ไว้ใน session_state
+แล้วแค่วาดซ้ำ
+
+ไม่ใช้ st.cache_data ต่อการ์ด: การ hash อาร์กิวเมนต์และ pickle สำเนาผลของ cache ช้ากว่าคำนวณใหม่
+(ดู benchmarks/bench_render.py)
+
+ถ้าตั้ง THUMBNAIL_DIR ไว้ view model จะมี path ของรูปย่อในเครื่อง (thumbnails.py) ให้การ์ดแสดงก่อน URL ต้นฉบับ
+และถ้าตั้ง STATIC_MAP_DIR การ์ดที่ไม่มีรูปจะได้ภาพแผนที่จาก cache ในเครื่อง (static_maps.py) แทน URL
+MAPS_TRAVEL_TIMES เติมเวลาเดินทางจากตำแหน่งผู้ใช้ให้ทุกการ์ดด้วย Distance Matrix request เดียว (maps_api.py)
+แถวที่มี road_km (NEARBY_ORDER = "road", road_graph.py) แสดงระยะทางตามถนนแทนระยะเส้นตรง
+"""
+from typing import Dict, List, Optional, Tuple
+
+from config import MAPS_TRAVEL_TIMES
+from images import get_best_image_candidates
+from maps_api import get_client
+from static_maps import build_static_map_url, get_static_map_cache, static_maps_for
+from thumbnails import thumbnails_for
+
+
+def build_place_view(place: Dict) -> Dict:
+    """view model ของการ์ดหนึ่งใบ"""
+    lat = place.get("latitude")
+    lng = place.get("longitude")
+    has_coords = lat is not None and lng is not None
+    return {
+        "name": place.get("name", "-"),
+        "tambon": place.get("tambon", "-"),
+        "category": place.get("category", "-"),
+        "description": (place.get("description") or "").strip(),
+        "highlight": (place.get("highlight") or "").strip(),
+        "images": get_best_image_candidates(place),
+        "thumbnail": None,
+        "static_map": build_static_map_url(lat, lng),
+        "map_link": f"https://www.google.com/maps?q={lat},{lng}" if has_coords else None,
+        "distance": _distance_text(place),
+        "distance_by_road": place.get("road_km") is not None,
+        "travel_time": None,
+    }
+
+
+def _distance_text(place: Dict) -> Optional[str]:
+    km = place.get("road_km")
+    if km is None:
+        km = place.get("distance_km")
+    if km is None:
+        return None
+    try:
+        return f"{float(km):.2f}"
+    except Exception:
+        return None
+
+
+def place_views(places: List[Dict], origin: Optional[Tuple[float, float]] = None) -> List[Dict]:
+    """view model ของทุกการ์ด เรียกครั้งเดียวตอนได้ผลลัพธ์ใหม่ แล้วเก็บไว้ใน session_state
+    origin = (lat, lng) ของผู้ใช้ ใช้หาเวลาเดินทางเมื่อเปิด MAPS_TRAVEL_TIMES"""
+    views = [build_place_view(p) for p in places]
+    for view, thumb in zip(views, thumbnails_for([v["images"] for v in views])):
+        view["thumbnail"] = thumb
+
+    if get_static_map_cache() is not None:
+        # ภาพแผนที่ใช้เฉพาะการ์ดที่ไม่มีรูป: ดึงเข้า cache เฉพาะใบเหล่านั้น
+        need = [i for i, v in enumerate(views) if not v["thumbnail"] and not v["images"]]
+        coords = [(places[i].get("latitude"), places[i].get("longitude")) for i in need]
+        for i, static_map in zip(need, static_maps_for(coords)):
+            views[i]["static_map"] = static_map
+
+    if MAPS_TRAVEL_TIMES and origin is not None and None not in origin and places:
+        for view, travel in zip(views, get_client().travel_times(origin, places)):
+            if travel:
+                view["travel_time"] = travel["duration_text"]
+    return views
@@ -0,0 +1,259 @@
+"""คำนวณค่าที่ได้จากแต่ละแถวของ places ล่วงหน้าแบบเพิ่มส่วน (incremental) แล้วเก็บเป็น artifact มีเวอร์ชัน
+
+    python precompute.py
+    python precompute.py --embeddings                 # สร้างดัชนีเวกเตอร์ (embeddings.py) ไปด้วย
+    python precompute.py --write-back                 # upsert ลงตาราง places_derived (migrations/004)
+    python precompute.py --full                       # คำนวณใหม่ทุกแถว ไม่สน hash เดิม
+
+อ่านตาราง places ทีละชุดผ่าน server-side cursor (db.iter_places) แล้วคำนวณ: ข้อความ normalize,
+trigram ของแต่ละฟิลด์, tag ของหมวดจาก category, URL รูปที่แก้แล้ว (images.py) และข้อความสำหรับเวกเตอร์
+แถวที่ hash ของคอลัมน์ต้นทางเท่ากับรอบก่อนจะใช้ผลเดิม (รวมถึงเวกเตอร์) ไม่คำนวณซ้ำ
+
+artifact แต่ละรอบอยู่ใน <out>/vNNNNNN/ (derived.jsonl และ embeddings/ ถ้ามี) และ <out>/manifest.json
+ชี้รุ่นล่าสุด ("current") และรุ่นล่าสุดที่มีดัชนีเวกเตอร์ ("index") เก็บไว้ --keep รุ่น (ไม่ลบรุ่นของ "index")
+ชี้ EMBEDDING_INDEX_PATH ไปที่ <out> เลย embeddings.get_index จะอ่านดัชนีตาม manifest เอง
+
+--write-back จะ upsert เฉพาะแถวที่เปลี่ยนเมื่อรุ่นก่อนก็ write back แล้ว ถ้ารุ่นก่อนไม่ได้ write back
+(เช่นรันครั้งแรกโดยไม่ใส่ flag) จะ upsert ทุกแถวและลบแถวที่ไม่มีใน places แล้ว
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import psycopg2.extras
+
+import db
+import embeddings
+from config import EMBEDDING_MODEL, PRECOMPUTE_DIR
+from images import get_best_image_candidates
+from place_catalog import PlaceRecord, _ngrams
+from place_text import place_text
+
+SOURCE_FIELDS = (
+    "name", "tambon", "category", "description", "highlight",
+    "latitude", "longitude", "image_url", "image_urls",
+)
+# เปลี่ยนเมื่อรูปแบบของ record ใน derived.jsonl เปลี่ยน: รอบถัดไปจะคำนวณใหม่ทั้งหมด
+DERIVED_FORMAT = 1
+
+
+def content_hash(row: Dict) -> str:
+    payload = json.dumps([row.get(f) for f in SOURCE_FIELDS], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def derive(row: Dict, row_hash: str) -> Dict:
+    pt = place_text(row)
+    rec = PlaceRecord(row)
+    trigrams = set()
+    for text in (rec.name_n, rec.cat_n, rec.tmb_n, rec.desc_n, rec.hi_n):
+        trigrams |= _ngrams(text)
+    return {
+        "id": int(row["id"]),
+        "hash": row_hash,
+        "name_norm": pt.name_norm,
+        "blob_norm": pt.blob_norm,
+        "cat_tags": list(pt.cat_tags),
+        "trigrams": sorted(trigrams),
+        "image_candidates": get_best_image_candidates(row),
+        "document": embeddings.place_document(row),
+    }
+
+
+# ---------- artifact ----------
+class ArtifactStore:
+    """โฟลเดอร์ artifact: <root>/manifest.json + <root>/vNNNNNN/ หนึ่งโฟลเดอร์ต่อรอบ"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+
+    def manifest(self) -> Dict:
+        if not os.path.exists(self.manifest_path):
+            return {"versions": []}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def path(self, version: str, *parts: str) -> str:
+        return os.path.join(self.root, version, *parts)
+
+    def load_records(self, version: str) -> Dict[int, Dict]:
+        path = self.path(version, "derived.jsonl")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return {rec["id"]: rec for rec in (json.loads(line) for line in f if line.strip())}
+
+    def next_version(self) -> str:
+        versions = self.manifest()["versions"]
+        n = int(versions[-1]["version"][1:]) + 1 if versions else 1
+        return f"v{n:06d}"
+
+    def publish(self, entry: Dict, keep: int):
+        """ชี้ manifest ไปรุ่นใหม่ (เขียนไฟล์ชั่วคราวแล้ว rename) แล้วลบรุ่นเก่าเกิน keep
+        ยกเว้นรุ่นที่ "index" ชี้ ซึ่งแอปอาจกำลังใช้ดัชนีเวกเตอร์อยู่"""
+        manifest = self.manifest()
+        index = entry["version"] if entry.get("encoder") else manifest.get("index")
+        versions = manifest["versions"] + [entry]
+        stale = [v for v in versions[:-keep] if v["version"] != index]
+        versions = [v for v in versions if v not in stale]
+        manifest.update(current=entry["version"], index=index, versions=versions)
+
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+        for old in stale:
+            shutil.rmtree(self.path(old["version"]), ignore_errors=True)
+
+
+def _write_records(path: str, records: Dict[int, Dict]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for pid in sorted(records):
+            f.write(json.dumps(records[pid], ensure_ascii=False) + "\n")
+
+
+def _build_embeddings(store: ArtifactStore, previous: Optional[Dict], version: str,
+                      records: Dict[int, Dict], changed: set, encoder_name: str, dtype: str) -> Dict:
+    """ดัชนีเวกเตอร์ของรุ่นใหม่: เวกเตอร์ของแถวที่ไม่เปลี่ยนคัดลอกจากรุ่นก่อน เข้ารหัสใหม่เฉพาะแถวที่เปลี่ยน"""
+    ids = np.array(sorted(records), dtype=np.int64)
+    encoder = embeddings.load_encoder(encoder_name)
+    vectors = np.zeros((len(ids), encoder.dim), dtype=np.float32)
+    todo = np.ones(len(ids), dtype=bool)
+
+    prev_dir = store.path(previous["version"], "embeddings") if previous else None
+    if prev_dir and previous.get("encoder") == encoder_name and os.path.exists(os.path.join(prev_dir, "meta.json")):
+        prev = embeddings.EmbeddingIndex(prev_dir, encoder=encoder)
+        reusable = np.array([pid not in changed for pid in ids.tolist()], dtype=bool)
+        found, old_vectors = prev.vectors_for_ids(ids[reusable])
+        positions = np.flatnonzero(reusable)[found]
+        vectors[positions] = old_vectors
+        todo[positions] = False
+
+    docs = [records[pid]["document"] for pid in ids[todo].tolist()]
+    if docs:
+        vectors[todo] = embeddings.encode_documents(encoder, docs)
+    meta = embeddings.write_index(store.path(version, "embeddings"), ids, vectors, encoder, dtype)
+    meta["encoded"] = len(docs)
+    return meta
+
+
+def _write_back(records: Dict[int, Dict], changed: set, removed: set, version: str, full: bool = False):
+    """upsert แถวที่เปลี่ยนลง places_derived; full=True upsert ทุกแถวแล้วลบ place_id ที่ไม่มีใน records"""
+    if full:
+        changed = set(records)
+    upserts = [
+        (pid, records[pid]["hash"], records[pid]["name_norm"], records[pid]["blob_norm"],
+         records[pid]["cat_tags"], json.dumps(records[pid]["image_candidates"], ensure_ascii=False), version)
+        for pid in sorted(changed)
+    ]
+    with db.pooled_conn() as conn:
+        with conn.cursor() as cur:
+            if upserts:
+                psycopg2.extras.execute_values(
+                    cur,
+                    "INSERT INTO places_derived "
+                    "(place_id, content_hash, name_norm, blob_norm, cat_tags, image_candidates, artifact_version) "
+                    "VALUES %s "
+                    "ON CONFLICT (place_id) DO UPDATE SET "
+                    "content_hash = EXCLUDED.content_hash, name_norm = EXCLUDED.name_norm, "
+                    "blob_norm = EXCLUDED.blob_norm, cat_tags = EXCLUDED.cat_tags, "
+                    "image_candidates = EXCLUDED.image_candidates, "
+                    "artifact_version = EXCLUDED.artifact_version, updated_at = now()",
+                    upserts,
+                    template="(%s, %s, %s, %s, %s, %s::jsonb, %s)",
+                    page_size=1000,
+                )
+            if full:
+                cur.execute("DELETE FROM places_derived WHERE NOT (place_id = ANY(%s));", (sorted(records),))
+            elif removed:
+                cur.execute("DELETE FROM places_derived WHERE place_id = ANY(%s);", (sorted(removed),))
+
+
+# ---------- main ----------
+def run(out_dir: str = PRECOMPUTE_DIR, batch_size: int = 2000, full: bool = False,
+        with_embeddings: bool = False, encoder_name: str = EMBEDDING_MODEL, dtype: str = "int8",
+        write_back: bool = False, keep: int = 3) -> Optional[Dict]:
+    store = ArtifactStore(out_dir)
+    manifest = store.manifest()
+    previous = manifest["versions"][-1] if manifest["versions"] else None
+    old_records: Dict[int, Dict] = {}
+    if previous and not full and previous.get("format") == DERIVED_FORMAT:
+        old_records = store.load_records(previous["version"])
+
+    start = time.perf_counter()
+    records: Dict[int, Dict] = {}
+    changed = set()
+    for batch in db.iter_places(batch_size):
+        for row in batch:
+            if row.get("id") is None:
+                continue
+            pid, row_hash = int(row["id"]), content_hash(row)
+            old = old_records.get(pid)
+            if old is not None and old["hash"] == row_hash:
+                records[pid] = old
+            else:
+                records[pid] = derive(row, row_hash)
+                changed.add(pid)
+    removed = set(old_records) - set(records)
+
+    needs_embeddings = with_embeddings and not (previous and previous.get("encoder") == encoder_name)
+    # รุ่นก่อนไม่ได้ write back: places_derived ยังไม่ตรงกับ artifact จึงต้อง upsert ทุกแถวแม้ไม่มีอะไรเปลี่ยน
+    pending_write_back = write_back and not (previous and previous.get("write_back"))
+    if previous and old_records and not changed and not removed and not needs_embeddings and not pending_write_back:
+        print(f"up to date ({previous['version']}, {len(records)} rows)")
+        return None
+
+    version = store.next_version()
+    _write_records(store.path(version, "derived.jsonl"), records)
+    entry = {
+        "version": version,
+        "format": DERIVED_FORMAT,
+        "created_at": time.time(),
+        "rows": len(records),
+        "changed": len(changed),
+        "removed": len(removed),
+        "write_back": write_back,
+    }
+
+    if with_embeddings:
+        meta = _build_embeddings(store, previous, version, records, changed, encoder_name, dtype)
+        entry.update(encoder=encoder_name, dtype=dtype, encoded=meta["encoded"])
+
+    if write_back:
+        _write_back(records, changed, removed, version, full=pending_write_back)
+
+    store.publish(entry, max(1, keep))
+    print(f"{version}: {len(records)} rows, {len(changed)} changed, {len(removed)} removed"
+          + (f", {entry['encoded']} encoded" if with_embeddings else "")
+          + f" in {time.perf_counter() - start:.1f}s -> {store.path(version)}")
+    return entry
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=PRECOMPUTE_DIR, help="โฟลเดอร์ artifact")
+    parser.add_argument("--batch-size", type=int, default=2000, help="จำนวนแถวต่อชุดที่อ่านจาก cursor")
+    parser.add_argument("--full", action="store_true", help="คำนวณใหม่ทุกแถว")
+    parser.add_argument("--embeddings", action="store_true", help="สร้างดัชนีเวกเตอร์ด้วย")
+    parser.add_argument("--encoder", default=EMBEDDING_MODEL, help='ชื่อโมเดล sentence-transformers หรือ "hashing"')
+    parser.add_argument("--dtype", choices=["int8", "float16"], default="int8")
+    parser.add_argument("--write-back", action="store_true", help="upsert ผลลงตาราง places_derived")
+    parser.add_argument("--keep", type=int, default=3, help="จำนวนรุ่นของ artifact ที่เก็บไว้")
+    args = parser.parse_args()
+
+    run(args.out, args.batch_size, args.full, args.embeddings, args.encoder, args.dtype,
+        args.write_back, args.keep)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import db
+from config import (
+    RESULT_CACHE_GEOHASH_PRECISION,
+    RESULT_CACHE_LISTEN,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL,
+    RESULT_CACHE_VERSION_CHECK_SECONDS,
+)
+from place_text import attach_place_text
+from spatial_index import great_circle_km
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+# ---------- Geohash ----------
+def geohash(lat: float, lng: float, precision: int) -> str:
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch, lng_lo = (ch << 1) | 1, mid
+            else:
+                ch, lng_hi = ch << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch, lat_lo = (ch << 1) | 1, mid
+            else:
+                ch, lat_hi = ch << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_bounds(code: str) -> Tuple[float, float, float, float]:
+    """(lat_lo, lat_hi, lng_lo, lng_hi) ของช่อง geohash"""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in code:
+        v = _BASE32.index(c)
+        for shift in range(4, -1, -1):
+            bit = (v >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                lng_lo, lng_hi = (mid, lng_hi) if bit else (lng_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lng_lo, lng_hi
+
+
+def geohash_center(code: str) -> Tuple[float, float]:
+    lat_lo, lat_hi, lng_lo, lng_hi = geohash_bounds(code)
+    return (lat_lo + lat_hi) / 2, (lng_lo + lng_hi) / 2
+
+
+def _copy(value):
+    """สำเนาแบบตื้นของทุกแถว (PlaceText ที่แนบไว้ใช้ร่วมกันได้เพราะไม่มีใครแก้)"""
+    if isinstance(value, dict):
+        return {tag: [dict(r) for r in rows] for tag, rows in value.items()}
+    return [dict(r) for r in value]
+
+
+class ResultCache:
+    """LRU + TTL cache ของผลค้นหาสถานที่ ใช้ร่วมกันทุกผู้ใช้ใน process
+
+    ล้างทั้งก้อนเมื่อ version ของตาราง places เปลี่ยน (ตรวจไม่บ่อยกว่า version_check_seconds)
+    หรือเมื่อถูกเรียก invalidate() เช่นจาก LISTEN places_changed
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 300.0,
+                 version_fn: Optional[Callable[[], object]] = None,
+                 version_check_seconds: float = 5.0,
+                 geohash_precision: int = 6):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        self.geohash_precision = int(geohash_precision)
+        self.version_check_seconds = float(version_check_seconds)
+        self._version_fn = version_fn
+        self._version = None
+        self._checked_at = 0.0
+        self._items: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        # เพิ่มทุกครั้งที่ invalidate: ผลที่เริ่มโหลดก่อนการล้างจะไม่ถูกเก็บ
+        self.generation = 0
+
+    # ---------- พิกัด ----------
+    def bucket(self, lat, lng) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+        """(lat, lng ที่ใช้ค้นจริง, คีย์ของช่อง) ผู้ใช้ในช่อง geohash เดียวกันใช้ผลร่วมกัน
+        โดยค้นจากจุดกึ่งกลางช่อง (precision 0 = ไม่ปัด)"""
+        if lat is None or lng is None:
+            return lat, lng, None
+        lat, lng = float(lat), float(lng)
+        if self.geohash_precision <= 0:
+            return lat, lng, f"{lat:.6f},{lng:.6f}"
+        code = geohash(lat, lng, self.geohash_precision)
+        clat, clng = geohash_center(code)
+        return clat, clng, code
+
+    def cell_radius_km(self, cell: Optional[str]) -> float:
+        """ระยะจากกึ่งกลางช่องถึงมุมที่ไกลสุด: ผู้ใช้ในช่องอยู่ห่างจุดที่ใช้ค้นไม่เกินนี้"""
+        if cell is None or self.geohash_precision <= 0:
+            return 0.0
+        lat_lo, lat_hi, lng_lo, lng_hi = geohash_bounds(cell)
+        clat, clng = (lat_lo + lat_hi) / 2, (lng_lo + lng_hi) / 2
+        return max(great_circle_km(clat, clng, la, ln) for la in (lat_lo, lat_hi) for ln in (lng_lo, lng_hi))
+
+    # ---------- version ----------
+    def _check_version(self):
+        if self._version_fn is None or self.version_check_seconds < 0:
+            return
+        if time.monotonic() - self._checked_at < self.version_check_seconds:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            try:
+                version = self._version_fn()
+            except Exception:
+                # อ่าน version ไม่ได้ก็ไม่รู้ว่าข้อมูลยังสดไหม: ล้างทิ้งให้ไปอ่านจากฐานข้อมูล
+                self.invalidate()
+                return
+            # ไม่มีตัวนับ version (None) ให้พึ่ง TTL อย่างเดียว
+            if version is not None and version != self._version:
+                if self._version is not None:
+                    self.invalidate()
+                self._version = version
+        finally:
+            self._check_lock.release()
+
+    # ---------- get / put ----------
+    def get(self, key: tuple):
+        self._check_version()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[1] < self.ttl:
+                    self._items.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return _copy(entry[0])
+                del self._items[key]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: tuple, value, generation: Optional[int] = None):
+        # คำนวณข้อความ normalize ของแถวไว้ก่อนเก็บ สำเนาทุกชุดที่คืนออกไปจะใช้ร่วมกัน
+        for rows in (value.values() if isinstance(value, dict) else [value]):
+            attach_place_text(rows)
+        stored = _copy(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._items[key] = (stored, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._items.clear()
+            self.generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["size"] = len(self._items)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+
+def relocate(rows: List[Dict], lat, lng, within_km, limit: Optional[int] = None, pad_km: float = 0.0,
+             queried_limit: Optional[int] = None) -> Optional[List[Dict]]:
+    """คำนวณ distance_km ใหม่จากพิกัดจริงของผู้ใช้ (ผลใน cache วัดจากกึ่งกลางช่อง) กรอง เรียง แล้วตัดเหลือ limit
+
+    rows มาจาก query ที่กึ่งกลางช่องด้วยรัศมี within_km + pad_km และ LIMIT queried_limit
+    ถ้า query ถูก LIMIT ตัด สถานที่ที่ไม่ได้มาห่างกึ่งกลางอย่างน้อยเท่าแถวที่ไกลสุด จึงห่างผู้ใช้อย่างน้อย
+    ค่านั้นลบ pad_km: คืน None เมื่อยืนยันจากขอบเขตนี้ไม่ได้ว่าได้แถวที่ใกล้ผู้ใช้ที่สุดครบ
+    """
+    lat, lng = float(lat), float(lng)
+    truncated = queried_limit is not None and len(rows) >= queried_limit
+    unseen_km = max((float(r["distance_km"]) for r in rows), default=0.0) - pad_km
+
+    out = []
+    for r in rows:
+        plat, plng = r.get("latitude"), r.get("longitude")
+        if plat is None or plng is None:
+            continue
+        d = great_circle_km(lat, lng, float(plat), float(plng))
+        if d <= within_km:
+            r["distance_km"] = d
+            out.append(r)
+    out.sort(key=lambda r: r["distance_km"])
+    if limit is not None:
+        out = out[:limit]
+
+    if truncated:
+        if out and out[-1]["distance_km"] > unseen_km:
+            return None
+        if (limit is None or len(out) < limit) and within_km > unseen_km:
+            return None
+    return out
+
+
+# ---------- LISTEN/NOTIFY ----------
+def _listen_forever(cache: ResultCache):
+    while True:
+        try:
+            db.listen_places_changes(lambda payload: cache.invalidate())
+        except Exception as e:
+            print(f"DEBUG: places_changed listener error: {str(e)}")
+        time.sleep(5.0)
+
+
+_CACHE: Optional[ResultCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """cache ของทั้ง process (None ถ้าปิดด้วย RESULT_CACHE_SIZE = 0)"""
+    global _CACHE
+    if RESULT_CACHE_SIZE <= 0:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                cache = ResultCache(
+                    max_size=RESULT_CACHE_SIZE,
+                    ttl=RESULT_CACHE_TTL,
+                    version_fn=db.places_version,
+                    version_check_seconds=RESULT_CACHE_VERSION_CHECK_SECONDS,
+                    geohash_precision=RESULT_CACHE_GEOHASH_PRECISION,
+                )
+                if RESULT_CACHE_LISTEN:
+                    threading.Thread(
+                        target=_listen_forever, args=(cache,), name="places-listen", daemon=True
+                    ).start()
+                _CACHE = cache
+    return _CACHE
@@ -0,0 +1,419 @@
+"""ระยะทางตามถนนจากกราฟถนนของอำเภอที่แปลงไว้ล่วงหน้า ไม่ต้องยิง Directions ทีละสถานที่
+
+    python road_graph.py build pathew.osm data/pathew_roads.npz   # แปลง OSM XML (เช่นจาก Overpass / osmium extract)
+    python road_graph.py info                                     # ขนาดกราฟของ ROAD_GRAPH_PATH
+    python road_graph.py route 10.86,99.33 10.91,99.29             # ลองหาระยะทางสองจุด
+
+ไฟล์กราฟเป็น .npz แบบ CSR: lat/lng ของ node (float32), indptr/indices (int32) และ weight เป็นเมตร (float32)
+เก็บเฉพาะถนนที่รถวิ่งได้ (ROUTABLE_HIGHWAYS) ตามทิศของ oneway และเฉพาะ node ที่ไปถึงและกลับออกมาจาก
+โครงข่ายหลักได้ (ถนนในลานจอดรถ เส้นที่ขาดจากโครงข่าย หรือปลาย oneway ที่ถูกตัดขอบเขตของ extract
+จะไม่ทำให้พิกัดถูก snap ไปจุดที่ไปไม่ถึง และ Dijkstra ไม่ต้องไล่ทั้งกราฟเพื่อหาจุดที่ไม่มีทางถึง)
+
+distances_km หาระยะจากตำแหน่งผู้ใช้ไปทุกสถานที่ด้วย Dijkstra รอบเดียว และหยุดทันทีที่เจอ node ของสถานที่ครบ
+ผลค้นหาใกล้ฉันอยู่ในรัศมีไม่กี่สิบกิโลเมตร จึงใช้เวลาระดับมิลลิวินาทีโดยไม่ต้องทำ contraction hierarchy
+ระยะที่ได้ = ระยะเส้นตรงจากพิกัดไป node ที่ใกล้สุด + ระยะตามถนน + ระยะจาก node ไปพิกัดของสถานที่
+"""
+import argparse
+import heapq
+import os
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import NEARBY_ORDER, ROAD_GRAPH_PATH
+from spatial_index import EARTH_RADIUS_KM, GridIndex, great_circle_km
+
+GRAPH_FORMAT = 1
+# ค่า highway ของ OSM ที่รถยนต์/มอเตอร์ไซค์วิ่งได้
+ROUTABLE_HIGHWAYS = frozenset([
+    "motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
+    "living_street", "service", "road", "track",
+])
+# พิกัดที่ห่างจากถนนเกินนี้ถือว่า snap ไม่ได้ (เกาะ, กลางทะเล)
+SNAP_MAX_KM = 1.0
+# หยุดค้นเมื่อระยะตามถนนเกิน ROAD_DETOUR_MAX เท่าของระยะเส้นตรงถึงสถานที่ที่ไกลสุด
+ROAD_DETOUR_MAX = 3.0
+
+Coord = Tuple[float, float]
+_MISSING = object()
+
+
+class RoadGraph:
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                 weights: np.ndarray, cell_deg: float = 0.002, snap_cache_size: int = 65536):
+        self.lat = np.asarray(lat, dtype=np.float32)
+        self.lng = np.asarray(lng, dtype=np.float32)
+        # Dijkstra วนทีละ edge ใน Python: list เข้าถึงเร็วกว่า index ของ numpy ทีละตัวหลายเท่า
+        self._indptr: List[int] = np.asarray(indptr).tolist()
+        self._indices: List[int] = np.asarray(indices).tolist()
+        self._weights: List[float] = np.asarray(weights, dtype=np.float64).tolist()
+        self._index = GridIndex(
+            zip(range(len(self.lat)), self.lat.astype(np.float64).tolist(), self.lng.astype(np.float64).tolist()),
+            cell_deg=cell_deg,
+        )
+        # พิกัดของสถานที่ชุดเดิมถูก snap ซ้ำทุกคำถาม: จำ node ของแต่ละพิกัดไว้
+        self._snap_cache: Dict[Coord, Optional[Tuple[int, float]]] = {}
+        self._snap_cache_size = snap_cache_size
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "settled": 0, "unreachable": 0, "seconds": 0.0}
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with np.load(path) as data:
+            fmt = int(data["format"][0]) if "format" in data else 0
+            if fmt != GRAPH_FORMAT:
+                raise ValueError(f"unsupported road graph format {fmt} (expected {GRAPH_FORMAT})")
+            return cls(data["lat"], data["lng"], data["indptr"], data["indices"], data["weight"])
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._indices)
+
+    def snap(self, lat: float, lng: float, max_km: float = SNAP_MAX_KM) -> Optional[Tuple[int, float]]:
+        """(node, ระยะ km) ของ node ที่ใกล้พิกัดที่สุด หรือ None ถ้าไม่มีถนนในระยะ max_km"""
+        hits = self._index.nearest(lat, lng, 1, max_km=max_km)
+        if not hits:
+            return None
+        d, node = hits[0]
+        return node, d
+
+    def _snap_cached(self, lat: float, lng: float) -> Optional[Tuple[int, float]]:
+        key = (lat, lng)
+        # get ครั้งเดียว: thread อื่นอาจ clear() ระหว่างเช็ก in กับอ่านค่า (ค่า None คือ snap ไม่ได้ จึงใช้ _MISSING)
+        hit = self._snap_cache.get(key, _MISSING)
+        if hit is not _MISSING:
+            return hit
+        hit = self.snap(lat, lng)
+        if len(self._snap_cache) >= self._snap_cache_size:
+            self._snap_cache.clear()
+        self._snap_cache[key] = hit
+        return hit
+
+    def _search(self, source: int, targets: set, max_m: float) -> Dict[int, float]:
+        """Dijkstra จาก source จนเจอทุก node ใน targets หรือระยะเกิน max_m คืน {node: เมตร} ของที่เจอ"""
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        remaining = set(targets)
+        found: Dict[int, float] = {}
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > max_m:
+                break
+            settled += 1
+            if u in remaining:
+                remaining.discard(u)
+                found[u] = d
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        with self._lock:
+            self._stats["settled"] += settled
+        return found
+
+    def distances_km(self, origin: Coord, destinations: Sequence[Optional[Coord]],
+                     max_km: Optional[float] = None) -> List[Optional[float]]:
+        """ระยะทางตามถนน (km) จาก origin ไปทุกปลายทาง เรียงตาม destinations
+        None = ไม่มีพิกัด, snap ไม่ได้ หรือไปไม่ถึงภายใน max_km (ค่าเริ่มต้นคิดจาก ROAD_DETOUR_MAX)"""
+        start = time.perf_counter()
+        out: List[Optional[float]] = [None] * len(destinations)
+        src = self.snap(float(origin[0]), float(origin[1]))
+        snapped: List[Tuple[int, int, float]] = []
+        farthest = 0.0
+        if src is not None:
+            for i, dest in enumerate(destinations):
+                if dest is None or dest[0] is None or dest[1] is None:
+                    continue
+                hit = self._snap_cached(float(dest[0]), float(dest[1]))
+                if hit is None:
+                    continue
+                snapped.append((i, hit[0], hit[1]))
+                farthest = max(farthest, great_circle_km(float(origin[0]), float(origin[1]),
+                                                         float(dest[0]), float(dest[1])))
+
+        if snapped:
+            if max_km is None:
+                max_km = farthest * ROAD_DETOUR_MAX + 2 * SNAP_MAX_KM
+            found = self._search(src[0], {node for _, node, _ in snapped}, max_km * 1000.0)
+            for i, node, snap_km in snapped:
+                if node in found:
+                    out[i] = src[1] + found[node] / 1000.0 + snap_km
+
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["unreachable"] += sum(1 for d in destinations if d is not None) - sum(
+                1 for v in out if v is not None)
+            self._stats["seconds"] += time.perf_counter() - start
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+        out["nodes"] = len(self)
+        out["edges"] = self.edge_count
+        out["mean_ms"] = out["seconds"] * 1000.0 / out["queries"] if out["queries"] else 0.0
+        return out
+
+
+# ---------- สร้างไฟล์กราฟ ----------
+def edge_lengths_m(lat: np.ndarray, lng: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """ความยาว (เมตร) ของแต่ละ edge แบบ haversine"""
+    p1, p2 = np.radians(lat[u].astype(np.float64)), np.radians(lat[v].astype(np.float64))
+    dlng = np.radians(lng[v].astype(np.float64) - lng[u].astype(np.float64))
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _reachable(n: int, u: np.ndarray, v: np.ndarray, root: int) -> np.ndarray:
+    """mask ของ node ที่ไปถึงได้จาก root ตามทิศ u -> v"""
+    order = np.argsort(u, kind="stable")
+    targets = v[order].tolist()
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+    indptr = indptr.tolist()
+    seen = np.zeros(n, dtype=bool)
+    seen[root] = True
+    stack = [root]
+    while stack:
+        x = stack.pop()
+        for k in range(indptr[x], indptr[x + 1]):
+            y = targets[k]
+            if not seen[y]:
+                seen[y] = True
+                stack.append(y)
+    return seen
+
+
+def _main_component(n: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """mask ของ node ที่ไปถึงและกลับมาถึง node ที่มีทางแยกมากสุดของกลุ่มถนน (ไม่สนทิศ) ที่ใหญ่สุด
+    คือ strongly connected component ของโครงข่ายหลัก"""
+    if n == 0 or len(u) == 0:
+        return np.zeros(n, dtype=bool)
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(u.tolist(), v.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    roots = np.array([find(i) for i in range(n)], dtype=np.int64)
+    largest = roots == np.bincount(roots).argmax()
+    degree = np.bincount(u, minlength=n) + np.bincount(v, minlength=n)
+    root = int(np.argmax(np.where(largest, degree, -1)))
+    return _reachable(n, u, v, root) & _reachable(n, v, u, root)
+
+
+def write_graph(path: str, lat: np.ndarray, lng: np.ndarray, u: np.ndarray, v: np.ndarray,
+                keep_largest: bool = True) -> Dict:
+    """เขียนกราฟจากรายการ edge ทิศเดียว (u -> v) เป็นไฟล์ .npz (ความยาวคำนวณจากพิกัด)"""
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    u, v = np.asarray(u, dtype=np.int64), np.asarray(v, dtype=np.int64)
+
+    if keep_largest and len(lat):
+        keep = _main_component(len(lat), u, v)
+    else:
+        keep = np.ones(len(lat), dtype=bool)
+    # ตัด node ที่ไม่อยู่บน edge ที่เหลือ แล้วเรียงเลข node ใหม่
+    ok = keep[u] & keep[v] & (u != v)
+    u, v = u[ok], v[ok]
+    used = np.zeros(len(lat), dtype=bool)
+    used[u] = True
+    used[v] = True
+    remap = np.cumsum(used) - 1
+    lat, lng, u, v = lat[used], lng[used], remap[u], remap[v]
+
+    weight = edge_lengths_m(lat, lng, u, v)
+    # edge ซ้ำระหว่างคู่เดิม (ทางขนาน) เก็บเส้นที่สั้นสุด
+    order = np.lexsort((weight, v, u))
+    u, v, weight = u[order], v[order], weight[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    u, v, weight = u[first], v[first], weight[first]
+
+    indptr = np.zeros(len(lat) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(u, minlength=len(lat)), out=indptr[1:])
+
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(
+        tmp, format=np.array([GRAPH_FORMAT], dtype=np.int32),
+        lat=lat.astype(np.float32), lng=lng.astype(np.float32),
+        indptr=indptr, indices=v.astype(np.int32), weight=weight.astype(np.float32),
+    )
+    os.replace(tmp, path)
+    return {"nodes": len(lat), "edges": len(u), "bytes": os.path.getsize(path)}
+
+
+def _oneway(tags: Dict[str, str]) -> int:
+    """1 = ตามลำดับ node, -1 = ย้อนลำดับ, 0 = สองทาง"""
+    value = tags.get("oneway", "").lower()
+    if value in ("yes", "true", "1"):
+        return 1
+    if value == "-1":
+        return -1
+    if value == "no":
+        return 0
+    if tags.get("junction") in ("roundabout", "circular") or tags.get("highway") == "motorway":
+        return 1
+    return 0
+
+
+def convert_osm(osm_path: str, out_path: str) -> Dict:
+    """แปลง OSM XML เป็นไฟล์กราฟ (อ่านแบบ streaming; node ต้องมาก่อน way ตามลำดับปกติของไฟล์ .osm)"""
+    coords: Dict[int, Tuple[float, float]] = {}
+    node_ids: Dict[int, int] = {}
+    lat: List[float] = []
+    lng: List[float] = []
+    us: List[int] = []
+    vs: List[int] = []
+    ways = 0
+
+    def node_index(osm_id: int) -> Optional[int]:
+        idx = node_ids.get(osm_id)
+        if idx is None:
+            c = coords.get(osm_id)
+            if c is None:
+                return None
+            idx = node_ids[osm_id] = len(lat)
+            lat.append(c[0])
+            lng.append(c[1])
+        return idx
+
+    for _, elem in ET.iterparse(osm_path, events=("end",)):
+        if elem.tag == "node":
+            coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            if tags.get("highway") in ROUTABLE_HIGHWAYS and tags.get("access") not in ("no", "private"):
+                refs = [node_index(int(nd.get("ref"))) for nd in elem.iter("nd")]
+                refs = [r for r in refs if r is not None]
+                direction = _oneway(tags)
+                for a, b in zip(refs, refs[1:]):
+                    if direction >= 0:
+                        us.append(a)
+                        vs.append(b)
+                    if direction <= 0:
+                        us.append(b)
+                        vs.append(a)
+                ways += 1
+            elem.clear()
+        elif elem.tag == "relation":
+            elem.clear()
+
+    result = write_graph(out_path, np.array(lat), np.array(lng), np.array(us, dtype=np.int64),
+                         np.array(vs, dtype=np.int64))
+    result["ways"] = ways
+    return result
+
+
+# ---------- ใช้งานในแอป ----------
+_GRAPH: Optional[RoadGraph] = None
+_GRAPH_LOADED = False
+_GRAPH_LOCK = threading.Lock()
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    """กราฟจาก ROAD_GRAPH_PATH (None ถ้าไม่ได้ตั้งค่าหรือโหลดไม่ได้ ซึ่งจะใช้ระยะเส้นตรงตามเดิม)"""
+    global _GRAPH, _GRAPH_LOADED
+    if not _GRAPH_LOADED:
+        with _GRAPH_LOCK:
+            if not _GRAPH_LOADED:
+                if ROAD_GRAPH_PATH:
+                    try:
+                        _GRAPH = RoadGraph.load(ROAD_GRAPH_PATH)
+                    except Exception as e:
+                        print(f"DEBUG: road graph load error: {str(e)}")
+                _GRAPH_LOADED = True
+    return _GRAPH
+
+
+def order_by_road(rows: List[Dict], lat, lng) -> List[Dict]:
+    """เติม road_km ให้ทุกแถวแล้วเรียงตามระยะทางถนน (แถวที่ไม่มีค่าไปท้ายตามลำดับเดิม)
+    ใช้เมื่อ NEARBY_ORDER = "road" และมีกราฟ ไม่งั้นคืน rows เดิม
+
+    แถวชุดนี้ยังเป็นชุดที่ SQL เลือกด้วย LIMIT ตามระยะเส้นตรง ลำดับนี้มีผลต่อคำตอบผ่าน
+    คะแนนความใกล้ตามถนนใน chatbot._rank (ROAD_DISTANCE_WEIGHT) ซึ่งจัดอันดับผลใหม่ตามข้อความอีกรอบ"""
+    if NEARBY_ORDER != "road" or lat is None or lng is None or not rows:
+        return rows
+    graph = get_road_graph()
+    if graph is None:
+        return rows
+    distances = graph.distances_km(
+        (float(lat), float(lng)), [(r.get("latitude"), r.get("longitude")) for r in rows]
+    )
+    for r, d in zip(rows, distances):
+        r["road_km"] = d
+    return sorted(rows, key=lambda r: (r["road_km"] is None, r["road_km"] or 0.0))
+
+
+def _coord(text: str) -> Coord:
+    lat, lng = text.split(",")
+    return float(lat), float(lng)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="แปลง OSM XML เป็นไฟล์กราฟ .npz")
+    p_build.add_argument("osm")
+    p_build.add_argument("out")
+    p_info = sub.add_parser("info", help="จำนวน node / edge ของไฟล์กราฟ")
+    p_info.add_argument("--graph", default=ROAD_GRAPH_PATH)
+    p_route = sub.add_parser("route", help="ระยะทางตามถนนจาก origin ไปแต่ละปลายทาง")
+    p_route.add_argument("origin", help="lat,lng")
+    p_route.add_argument("destinations", nargs="+", help="lat,lng")
+    p_route.add_argument("--graph", default=ROAD_GRAPH_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        r = convert_osm(args.osm, args.out)
+        print(f"{r['ways']} ways -> {r['nodes']} nodes, {r['edges']} edges, {r['bytes'] / 1e6:.2f} MB "
+              f"in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    if not args.graph:
+        print("ROAD_GRAPH_PATH is not set")
+        return 1
+    start = time.perf_counter()
+    graph = RoadGraph.load(args.graph)
+    load_s = time.perf_counter() - start
+    if args.command == "info":
+        print(f"{len(graph)} nodes, {graph.edge_count} edges, {os.path.getsize(args.graph) / 1e6:.2f} MB "
+              f"(loaded in {load_s:.2f}s)")
+        return 0
+
+    origin = _coord(args.origin)
+    dests = [_coord(d) for d in args.destinations]
+    start = time.perf_counter()
+    distances = graph.distances_km(origin, dests)
+    ms = (time.perf_counter() - start) * 1000.0
+    for dest, d in zip(dests, distances):
+        straight = great_circle_km(origin[0], origin[1], dest[0], dest[1])
+        road = f"{d:.2f} km" if d is not None else "unreachable"
+        print(f"{dest[0]},{dest[1]}  road={road}  straight={straight:.2f} km")
+    print(f"{ms:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
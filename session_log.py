@@ -0,0 +1,73 @@
+"""บันทึกบทสนทนาจริงเป็น JSON lines เพื่อนำไปเล่นซ้ำแบบออฟไลน์ (benchmarks/replay.py)
+
+หนึ่งบรรทัดต่อหนึ่งรอบ เก็บ input ทุกตัวที่ส่งเข้า get_answer ในรอบนั้นครบ จึงเล่นซ้ำแต่ละรอบแยกกันได้:
+
+    {"session_id": "...", "turn": 0, "ts": 1700000000.0,
+     "user_input": "...", "user_lat": null, "user_lng": null,
+     "history": [...], "focus_place_id": null, "last_results": [...], "banned_categories": [...],
+     "reply": "...", "place_ids": [...], "latency_ms": 812.4}
+"""
+import json
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+_WRITE_LOCK = threading.Lock()
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _stored_row(place: Dict) -> Dict:
+    # คีย์ขึ้นต้นด้วย _ (เช่น _text, _score) คำนวณใหม่ได้ตอนเล่นซ้ำ ไม่ต้องเก็บ
+    return {k: v for k, v in place.items() if not k.startswith("_")}
+
+
+def turn_record(
+    session_id: str,
+    turn: int,
+    user_input: str,
+    user_lat: Optional[float],
+    user_lng: Optional[float],
+    history: List[Dict],
+    focus_place_id: Optional[int],
+    last_results: List[Dict],
+    banned_categories: List[str],
+    reply: str,
+    places: List[Dict],
+    latency_ms: float,
+) -> Dict:
+    return {
+        "session_id": session_id,
+        "turn": turn,
+        "ts": time.time(),
+        "user_input": user_input,
+        "user_lat": user_lat,
+        "user_lng": user_lng,
+        "history": [{"role": m.get("role"), "content": m.get("content")} for m in history],
+        "focus_place_id": focus_place_id,
+        "last_results": [_stored_row(p) for p in last_results],
+        "banned_categories": list(banned_categories),
+        "reply": reply,
+        "place_ids": [p.get("id") for p in places],
+        "latency_ms": latency_ms,
+    }
+
+
+def record_turn(path: str, record: Dict):
+    """ต่อท้ายหนึ่งรอบลงไฟล์ (ผิดพลาดก็แค่พิมพ์ log ไม่ให้กระทบการตอบผู้ใช้)"""
+    try:
+        # แถวจากฐานข้อมูลอาจมี Decimal / datetime: แปลงเป็น str ไว้ก่อน
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _WRITE_LOCK:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"DEBUG: session log error: {str(e)}")
+
+
+def read_log(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,128 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def great_circle_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """ระยะทางแบบ spherical law of cosines (สูตรเดียวกับใน SQL ของ db.search_places_nearby)"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    x = (
+        math.cos(p1) * math.cos(p2) * math.cos(math.radians(lng2) - math.radians(lng1))
+        + math.sin(p1) * math.sin(p2)
+    )
+    return EARTH_RADIUS_KM * math.acos(max(-1.0, min(1.0, x)))
+
+
+def bounding_box(lat: float, lng: float, within_km: float) -> Tuple[float, float, float, float]:
+    """กรอบ (lat_min, lat_max, lng_min, lng_max) ที่ครอบทุกจุดซึ่งห่างไม่เกิน within_km แน่นอน"""
+    lat, lng = float(lat), float(lng)
+    ang = float(within_km) / EARTH_RADIUS_KM
+    dlat = math.degrees(ang)
+    lat_min, lat_max = lat - dlat, lat + dlat
+
+    cos_lat = math.cos(math.radians(lat))
+    if lat_min <= -90 or lat_max >= 90 or math.sin(ang) >= cos_lat:
+        return max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0
+
+    dlng = math.degrees(math.asin(math.sin(ang) / cos_lat))
+    lng_min, lng_max = lng - dlng, lng + dlng
+    if lng_min < -180 or lng_max > 180:
+        lng_min, lng_max = -180.0, 180.0
+    return lat_min, lat_max, lng_min, lng_max
+
+
+def _ring_cells(r0: int, c0: int, ring: int):
+    """เซลล์บนขอบสี่เหลี่ยมที่ห่างจาก (r0, c0) เท่ากับ ring เซลล์พอดี"""
+    if ring == 0:
+        yield r0, c0
+        return
+    for c in range(c0 - ring, c0 + ring + 1):
+        yield r0 - ring, c
+        yield r0 + ring, c
+    for r in range(r0 - ring + 1, r0 + ring):
+        yield r, c0 - ring
+        yield r, c0 + ring
+
+
+class GridIndex:
+    """ดัชนีแบบตารางกริดบนพิกัด lat/lng สำหรับค้นหาในรัศมีและ k จุดที่ใกล้ที่สุด"""
+
+    def __init__(self, points: Iterable[Tuple[int, float, float]], cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = {}
+        self._count = 0
+        for key, lat, lng in points:
+            self._cells.setdefault(self._cell(lat, lng), []).append((key, lat, lng))
+            self._count += 1
+
+        if self._cells:
+            rows = [c[0] for c in self._cells]
+            cols = [c[1] for c in self._cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+        else:
+            self._bounds = (0, -1, 0, -1)
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, int]]:
+        """[(distance_km, key)] ของทุกจุดในรัศมี เรียงจากใกล้ไปไกล"""
+        lat, lng = float(lat), float(lng)
+        lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+        r0, c0 = self._cell(lat_min, lng_min)
+        r1, c1 = self._cell(lat_max, lng_max)
+        br0, br1, bc0, bc1 = self._bounds
+        r0, r1 = max(r0, br0), min(r1, br1)
+        c0, c1 = max(c0, bc0), min(c1, bc1)
+
+        hits = []
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                for key, plat, plng in self._cells.get((r, c), ()):
+                    if lat_min <= plat <= lat_max and lng_min <= plng <= lng_max:
+                        d = great_circle_km(lat, lng, plat, plng)
+                        if d <= radius_km:
+                            hits.append((d, key))
+        hits.sort(key=lambda h: h[0])
+        return hits
+
+    def nearest(self, lat: float, lng: float, k: int,
+                max_km: Optional[float] = None) -> List[Tuple[float, int]]:
+        """k จุดที่ใกล้ที่สุด (ขยายวงทีละชั้นของกริดจนแน่ใจว่าไม่มีจุดที่ใกล้กว่านี้แล้ว)"""
+        if k <= 0 or not self._cells:
+            return []
+        lat, lng = float(lat), float(lng)
+
+        r_center, c_center = self._cell(lat, lng)
+        br0, br1, bc0, bc1 = self._bounds
+        max_ring = max(abs(r_center - br0), abs(r_center - br1), abs(c_center - bc0), abs(c_center - bc1))
+        # ระยะขั้นต่ำของวงถัดไป: ใช้ความกว้างเซลล์ด้าน longitude ที่แคบที่สุดในพื้นที่
+        # (คูณ 0.99 เผื่อว่าเส้นทาง great-circle สั้นกว่าระยะตามเส้นขนานเล็กน้อย)
+        cell_km = 0.99 * math.radians(self.cell_deg) * EARTH_RADIUS_KM * max(
+            math.cos(math.radians(min(abs(lat) + self.cell_deg * (max_ring + 1), 89.9))), 1e-6
+        )
+
+        heap: List[Tuple[float, int]] = []  # max-heap ของ k ตัวที่ดีที่สุด (เก็บ -distance)
+        for ring in range(max_ring + 1):
+            for r, c in _ring_cells(r_center, c_center, ring):
+                for key, plat, plng in self._cells.get((r, c), ()):
+                    d = great_circle_km(lat, lng, plat, plng)
+                    if max_km is not None and d > max_km:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d, key))
+                    elif d < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d, key))
+
+            # จุดใดๆ ที่อยู่ในวงถัดไปห่างอย่างน้อย ring * cell_km
+            if len(heap) == k and ring * cell_km >= -heap[0][0]:
+                break
+            if max_km is not None and ring * cell_km > max_km:
+                break
+
+        return sorted(((-nd, key) for nd, key in heap), key=lambda h: h[0])
@@ -0,0 +1,363 @@
+"""cache ภาพแผนที่ (Google Static Maps) ของการ์ดสถานที่บนดิสก์ และวาดแผนที่เองได้เมื่อออฟไลน์
+
+    python static_maps.py warm                 # ดึงภาพแผนที่ของทุกแถวใน places ไว้ล่วงหน้า
+    python static_maps.py warm --tiles         # ดึง tile (MAP_TILE_URL) ไว้วาดแบบออฟไลน์ด้วย
+    python static_maps.py stats
+
+ภาพแผนที่ของสถานที่หนึ่งคงที่ (พิกัด, zoom, ขนาดเดิมทุกครั้ง) แต่ URL ของ Static Maps ทำให้เบราว์เซอร์
+ยิงไป Google ทุกครั้งที่วาดการ์ด (เสียเงินต่อครั้งและรอ network): ที่นี่ดึงครั้งเดียวต่อ key
+(lat, lng, zoom, size) แล้วเก็บ PNG ไว้ ไม่มี API key ในชื่อไฟล์หรือ key ของ cache
+
+offline=True ไม่ยิง Static Maps เลย: ใช้ PNG ที่ cache ไว้ถ้ามี ไม่งั้นวาดภาพเองจาก tile แบบ slippy map
+(z/x/y.png) ที่ดึงเก็บไว้ก่อนหน้า (ช่องที่ไม่มี tile เป็นพื้นสีเทา) แล้วปักหมุดตรงกลาง
+พิกัดที่ดึงไม่ได้จะจำไว้ failure_ttl วินาที (ในหน่วยความจำ) และหลาย thread ที่ขอภาพเดียวกันพร้อมกันดึงแค่ครั้งเดียว
+benchmarks/mock_maps_server.py เป็นเซิร์ฟเวอร์แทน Google/tile server สำหรับทดสอบและวัดผล
+"""
+import argparse
+import hashlib
+import io
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from PIL import Image, ImageDraw
+
+from config import MAP_TILE_URL, MAPS_API_KEY, STATIC_MAP_DIR, STATIC_MAP_OFFLINE, STATIC_MAP_URL
+
+DEFAULT_ZOOM = 15
+DEFAULT_SIZE = "900x520"
+TILE_SIZE = 256
+FETCH_TIMEOUT = 10.0
+# ความละเอียดของพิกัดใน key (6 ตำแหน่ง ≈ 10 ซม.) พิกัดเดียวกันจาก float ต่างที่มาจึงได้ไฟล์เดียวกัน
+COORD_DECIMALS = 6
+_BACKGROUND = (229, 227, 223)
+_MARKER = (234, 67, 53)
+
+
+def build_static_map_url(lat, lng, zoom: int = DEFAULT_ZOOM, size: str = DEFAULT_SIZE,
+                         base_url: str = STATIC_MAP_URL) -> Optional[str]:
+    if lat is None or lng is None or not MAPS_API_KEY:
+        return None
+
+    return (
+        f"{base_url}"
+        f"?center={lat},{lng}"
+        f"&zoom={zoom}"
+        f"&size={size}"
+        f"&maptype=roadmap"
+        f"&markers=color:red%7C{lat},{lng}"
+        f"&key={MAPS_API_KEY}"
+    )
+
+
+def _parse_size(size: str) -> Tuple[int, int]:
+    w, h = size.lower().split("x")
+    return int(w), int(h)
+
+
+# ---------- Web Mercator ----------
+def world_pixel(lat: float, lng: float, zoom: int) -> Tuple[float, float]:
+    """พิกัดเป็นพิกเซลบนแผนที่ทั้งโลกที่ zoom นี้ (แบบเดียวกับ Google / OSM tiles)"""
+    scale = TILE_SIZE * (1 << zoom)
+    lat = max(-85.05112878, min(85.05112878, lat))
+    sin_lat = math.sin(math.radians(lat))
+    x = (lng + 180.0) / 360.0 * scale
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def tiles_around(lat: float, lng: float, zoom: int, width: int, height: int):
+    """[(x, y, left, top)] ของ tile ที่คลุมภาพขนาด width x height ที่มีพิกัดนี้อยู่ตรงกลาง"""
+    cx, cy = world_pixel(lat, lng, zoom)
+    x0, y0 = cx - width / 2.0, cy - height / 2.0
+    n = 1 << zoom
+    out = []
+    for ty in range(int(math.floor(y0 / TILE_SIZE)), int(math.floor((y0 + height) / TILE_SIZE)) + 1):
+        if ty < 0 or ty >= n:
+            continue
+        for tx in range(int(math.floor(x0 / TILE_SIZE)), int(math.floor((x0 + width) / TILE_SIZE)) + 1):
+            out.append((tx % n, ty, int(round(tx * TILE_SIZE - x0)), int(round(ty * TILE_SIZE - y0))))
+    return out
+
+
+def _draw_marker(img: Image.Image):
+    draw = ImageDraw.Draw(img)
+    cx, cy = img.width // 2, img.height // 2
+    r = max(6, min(img.width, img.height) // 40)
+    # หมุดรูปหยดน้ำ: ปลายแหลมอยู่ที่พิกัดจริง
+    draw.polygon([(cx - r * 0.8, cy - r * 1.6), (cx + r * 0.8, cy - r * 1.6), (cx, cy)], fill=_MARKER)
+    draw.ellipse([cx - r, cy - r * 3, cx + r, cy - r], fill=_MARKER, outline=(255, 255, 255), width=2)
+    draw.ellipse([cx - r * 0.35, cy - r * 2.35, cx + r * 0.35, cy - r * 1.65], fill=(120, 20, 15))
+
+
+def _http_fetcher() -> Callable[[str, float], bytes]:
+    session = requests.Session()
+    session.headers["User-Agent"] = "pathew-chatbot-static-maps/1.0"
+
+    def fetch(url: str, timeout: float) -> bytes:
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    return fetch
+
+
+class StaticMapCache:
+    """ไฟล์ PNG ของแผนที่ต่อ (lat, lng, zoom, size) บนดิสก์ + tile สำหรับวาดเองแบบออฟไลน์"""
+
+    def __init__(self, root: str, offline: bool = False, base_url: str = STATIC_MAP_URL,
+                 tile_url: str = MAP_TILE_URL, fetch: Optional[Callable[[str, float], bytes]] = None,
+                 timeout: float = FETCH_TIMEOUT, failure_ttl: float = 600.0):
+        self.root = root
+        self.offline = bool(offline)
+        self.base_url = base_url
+        self.tile_url = tile_url
+        self.timeout = float(timeout)
+        self.failure_ttl = float(failure_ttl)
+        self._fetch = fetch or _http_fetcher()
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, threading.Lock] = {}
+        self._failed: Dict[tuple, float] = {}
+        self._stats = {
+            "hits": 0, "misses": 0, "fetched": 0, "failed": 0, "skipped_failed": 0, "offline_rendered": 0,
+            "bytes_fetched": 0, "bytes_saved": 0, "tiles_fetched": 0,
+        }
+        os.makedirs(os.path.join(root, "maps"), exist_ok=True)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    @staticmethod
+    def key(lat: float, lng: float, zoom: int = DEFAULT_ZOOM, size: str = DEFAULT_SIZE) -> tuple:
+        return (round(float(lat), COORD_DECIMALS), round(float(lng), COORD_DECIMALS), int(zoom), size)
+
+    def path_for(self, key: tuple, offline: bool = False) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        suffix = "-offline" if offline else ""
+        return os.path.join(self.root, "maps", digest[:2], f"{digest}{suffix}.png")
+
+    def tile_path(self, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, "tiles", str(z), str(x), f"{y}.png")
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, lat, lng, zoom: int = DEFAULT_ZOOM, size: str = DEFAULT_SIZE) -> Optional[str]:
+        """path ของภาพแผนที่ (None ถ้าไม่มีพิกัด หรือดึงไม่ได้และไม่ได้อยู่ในโหมดออฟไลน์)"""
+        if lat is None or lng is None:
+            return None
+        key = self.key(lat, lng, zoom, size)
+        path = self._existing(key)
+        if path is not None:
+            return path
+        if self._recently_failed(key):
+            self._count(skipped_failed=1)
+            return None
+        self._count(misses=1)
+
+        with self._lock:
+            inflight = self._inflight.setdefault(key, threading.Lock())
+        with inflight:
+            # อีก thread อาจดึงหรือวาดภาพเดียวกันเสร็จ (หรือดึงไม่สำเร็จ) ไปแล้วระหว่างรอ
+            path = self._existing(key, count=False)
+            if path is None and not self._recently_failed(key):
+                path = self.render_offline(*key) if self.offline else self._fetch_and_store(key)
+        with self._lock:
+            self._inflight.pop(key, None)
+        return path
+
+    def _existing(self, key: tuple, count: bool = True) -> Optional[str]:
+        for offline in (False, True) if self.offline else (False,):
+            path = self.path_for(key, offline)
+            if os.path.exists(path):
+                if count:
+                    # ภาพที่วาดเองไม่ได้แทนการดึงจาก Google จึงนับ bytes_saved เฉพาะภาพที่ดึงมา
+                    self._count(hits=1, bytes_saved=0 if offline else os.path.getsize(path))
+                return path
+        return None
+
+    def _recently_failed(self, key: tuple) -> bool:
+        with self._lock:
+            failed_at = self._failed.get(key)
+            if failed_at is None:
+                return False
+            if time.time() - failed_at < self.failure_ttl:
+                return True
+            del self._failed[key]
+            return False
+
+    def _fetch_and_store(self, key: tuple) -> Optional[str]:
+        url = build_static_map_url(key[0], key[1], key[2], key[3], self.base_url)
+        if url is None:
+            return None
+        try:
+            data = self._fetch(url, self.timeout)
+            Image.open(io.BytesIO(data)).verify()
+        except Exception as e:
+            # ข้อความของ requests มี URL เต็มซึ่งมี API key: พิมพ์แค่ชนิดของ error
+            print(f"DEBUG: static map error: {type(e).__name__}")
+            with self._lock:
+                self._failed[key] = time.time()
+                self._stats["failed"] += 1
+            return None
+        path = self.path_for(key)
+        self._write(path, data)
+        self._count(fetched=1, bytes_fetched=len(data))
+        return path
+
+    def render_offline(self, lat: float, lng: float, zoom: int = DEFAULT_ZOOM, size: str = DEFAULT_SIZE) -> str:
+        """ภาพแผนที่จาก tile ที่ cache ไว้ (ช่องที่ไม่มี tile เป็นพื้นเทา) พร้อมหมุดตรงกลาง"""
+        width, height = _parse_size(size)
+        img = Image.new("RGB", (width, height), _BACKGROUND)
+        for x, y, left, top in tiles_around(lat, lng, zoom, width, height):
+            path = self.tile_path(zoom, x, y)
+            if os.path.exists(path):
+                try:
+                    with Image.open(path) as tile:
+                        img.paste(tile.convert("RGB"), (left, top))
+                except Exception:
+                    pass
+        _draw_marker(img)
+
+        out = io.BytesIO()
+        img.save(out, "PNG")
+        path = self.path_for(self.key(lat, lng, zoom, size), offline=True)
+        self._write(path, out.getvalue())
+        self._count(offline_rendered=1)
+        return path
+
+    def fetch_tiles(self, lat: float, lng: float, zoom: int = DEFAULT_ZOOM, size: str = DEFAULT_SIZE) -> int:
+        """ดึง tile ที่ภาพแผนที่ของพิกัดนี้ต้องใช้จาก tile_url เก็บไว้วาดแบบออฟไลน์ คืนจำนวนที่ดึงใหม่"""
+        if not self.tile_url:
+            return 0
+        width, height = _parse_size(size)
+        fetched = 0
+        for x, y, _, _ in tiles_around(lat, lng, zoom, width, height):
+            path = self.tile_path(zoom, x, y)
+            if os.path.exists(path):
+                continue
+            try:
+                data = self._fetch(self.tile_url.format(z=zoom, x=x, y=y), self.timeout)
+            except Exception as e:
+                print(f"DEBUG: map tile error {zoom}/{x}/{y}: {str(e)}")
+                continue
+            self._write(path, data)
+            fetched += 1
+        if fetched:
+            # ภาพที่เคยวาดตอนยังไม่มี tile เหล่านี้ล้าสมัยแล้ว
+            try:
+                os.remove(self.path_for(self.key(lat, lng, zoom, size), offline=True))
+            except FileNotFoundError:
+                pass
+        self._count(tiles_fetched=fetched)
+        return fetched
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+
+_CACHE: Optional[StaticMapCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_static_map_cache() -> Optional[StaticMapCache]:
+    """cache ของ process นี้ (None ถ้าไม่ได้ตั้ง STATIC_MAP_DIR)"""
+    global _CACHE
+    if not STATIC_MAP_DIR:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = StaticMapCache(STATIC_MAP_DIR, offline=STATIC_MAP_OFFLINE)
+    return _CACHE
+
+
+def static_map_for(lat, lng) -> Optional[str]:
+    """ภาพแผนที่ของการ์ด: ไฟล์ในเครื่องถ้าเปิด cache ไว้ ไม่งั้น URL ของ Static Maps แบบเดิม"""
+    cache = get_static_map_cache()
+    if cache is None:
+        return build_static_map_url(lat, lng)
+    return cache.get(lat, lng) or (None if cache.offline else build_static_map_url(lat, lng))
+
+
+def static_maps_for(coords, workers: int = 8):
+    """static_map_for ของหลายการ์ดพร้อมกัน (coords = [(lat, lng)])"""
+    if get_static_map_cache() is None or len(coords) <= 1:
+        return [static_map_for(lat, lng) for lat, lng in coords]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(coords)))) as pool:
+        return list(pool.map(lambda c: static_map_for(*c), coords))
+
+
+# ---------- CLI ----------
+def warm(cache: StaticMapCache, tiles: bool = False, workers: int = 8, batch_size: int = 2000) -> Dict:
+    import db
+
+    start = time.perf_counter()
+    places = 0
+
+    def one(row):
+        if tiles:
+            cache.fetch_tiles(row["latitude"], row["longitude"])
+        cache.get(row["latitude"], row["longitude"])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in db.iter_places(batch_size):
+            rows = [r for r in batch if r.get("latitude") is not None and r.get("longitude") is not None]
+            places += len(rows)
+            list(pool.map(one, rows))
+    return {"places": places, "seconds": time.perf_counter() - start, **cache.stats()}
+
+
+def _print_stats(s: Dict):
+    print(f"hit_ratio={s['hit_ratio']:.3f} hits={s['hits']} misses={s['misses']} fetched={s['fetched']} "
+          f"failed={s['failed']} offline_rendered={s['offline_rendered']} tiles_fetched={s['tiles_fetched']}")
+    print(f"bytes_fetched={s['bytes_fetched'] / 1e6:.2f} MB  bytes_saved={s['bytes_saved'] / 1e6:.2f} MB")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_warm = sub.add_parser("warm", help="ดึงภาพแผนที่ของทุกแถวใน places ไว้ล่วงหน้า")
+    p_warm.add_argument("--tiles", action="store_true", help="ดึง tile สำหรับโหมดออฟไลน์ด้วย (ต้องตั้ง MAP_TILE_URL)")
+    p_warm.add_argument("--workers", type=int, default=8)
+    p_warm.add_argument("--batch-size", type=int, default=2000)
+    sub.add_parser("stats", help="จำนวนไฟล์และขนาดรวมของ cache")
+    args = parser.parse_args()
+
+    cache = get_static_map_cache()
+    if cache is None:
+        print("STATIC_MAP_DIR is not set")
+        return 1
+
+    if args.command == "warm":
+        r = warm(cache, args.tiles, args.workers, args.batch_size)
+        print(f"{r['places']} places in {r['seconds']:.1f}s")
+        _print_stats(r)
+    else:
+        files = size = 0
+        for dirpath, _, names in os.walk(cache.root):
+            for name in names:
+                files += 1
+                size += os.path.getsize(os.path.join(dirpath, name))
+        print(f"{files} files, {size / 1e6:.1f} MB in {cache.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""MapsClient กับ benchmarks/mock_maps_server.py: แบ่ง request ละ 25 ปลายทาง, cache ของพิกัดที่ปัด และ element ที่ไม่ OK"""
+import pytest
+
+import maps_api
+from benchmarks import mock_maps_server
+from benchmarks.common import PATHEW_CENTER
+
+
+@pytest.fixture(scope="module")
+def server():
+    server, base = mock_maps_server.start()
+    server.base = f"{base}/maps/api"
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    return maps_api.MapsClient(api_key="test", base_url=server.base)
+
+
+def _places(n):
+    lat, lng = PATHEW_CENTER
+    return [{"id": i, "latitude": lat + (i + 1) * 0.001, "longitude": lng + (i + 1) * 0.0005}
+            for i in range(n)]
+
+
+def test_travel_times_chunks_destinations_by_25(server, client):
+    before = server.counters["distancematrix"]
+    out = client.travel_times(PATHEW_CENTER, _places(60))
+
+    assert server.counters["distancematrix"] - before == 3
+    assert all(t is not None and t["duration_s"] > 0 for t in out)
+    assert [t["distance_m"] for t in out[:3]] == sorted(t["distance_m"] for t in out[:3])
+
+
+def test_travel_times_hits_cache_for_nearby_origin(server, client):
+    places = _places(30)
+    first = client.travel_times(PATHEW_CENTER, places)
+    before = server.counters["distancematrix"]
+    hits = client.stats()["hits"]
+
+    # ห่างไม่กี่เมตร: ปัดเป็น 4 ตำแหน่งแล้วได้พิกัดเดียวกัน
+    again = client.travel_times((PATHEW_CENTER[0] + 2e-5, PATHEW_CENTER[1] - 2e-5), places)
+
+    assert server.counters["distancematrix"] == before
+    assert client.stats()["hits"] - hits == len(places)
+    assert again == first
+
+
+def test_travel_times_skips_non_ok_elements(server, client):
+    places = _places(3) + [{"id": 99, "latitude": 51.5, "longitude": -0.12}, {"id": 100, "latitude": None}]
+    out = client.travel_times(PATHEW_CENTER, places)
+
+    assert all(t is not None for t in out[:3])
+    assert out[3] is None  # ZERO_RESULTS จาก mock (ไกลเกิน MAX_ROUTE_KM)
+    assert out[4] is None  # ไม่มีพิกัด ไม่ถาม API
+
+    # element ที่ไม่ OK ไม่ถูก cache: ถามใหม่เฉพาะปลายทางนั้น
+    before = server.counters["distancematrix"]
+    assert client.travel_times(PATHEW_CENTER, places)[3] is None
+    assert server.counters["distancematrix"] - before == 1
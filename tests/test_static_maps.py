@@ -0,0 +1,116 @@
+"""StaticMapCache กับ benchmarks/mock_maps_server.py: hit และ byte ที่ประหยัด, ดึงครั้งเดียวเมื่อขอพร้อมกัน,
+จำ URL ที่ดึงไม่ได้ไว้ failure_ttl และวาดแบบออฟไลน์โดยไม่ยิง network"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+import static_maps
+from benchmarks import mock_maps_server
+from benchmarks.common import PATHEW_CENTER
+
+
+@pytest.fixture(scope="module")
+def server():
+    server, base = mock_maps_server.start()
+    server.base = base
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    # build_static_map_url ไม่สร้าง URL ถ้าไม่มี key
+    monkeypatch.setattr(static_maps, "MAPS_API_KEY", "test")
+
+
+def _counting_fetcher():
+    fetch = static_maps._http_fetcher()
+    calls = []
+
+    def counted(url, timeout):
+        calls.append(url)
+        return fetch(url, timeout)
+
+    return counted, calls
+
+
+def _cache(tmp_path, base_url, **kwargs):
+    fetch, calls = _counting_fetcher()
+    return static_maps.StaticMapCache(str(tmp_path), base_url=base_url, fetch=fetch, **kwargs), calls
+
+
+def test_second_get_is_a_hit(server, tmp_path):
+    cache, calls = _cache(tmp_path, f"{server.base}/maps/api/staticmap")
+    lat, lng = PATHEW_CENTER
+
+    first = cache.get(lat, lng)
+    second = cache.get(lat, lng)
+
+    assert first == second and os.path.exists(first)
+    assert len(calls) == 1
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["fetched"]) == (1, 1, 1)
+    assert s["hit_ratio"] == 0.5
+    assert s["bytes_saved"] == os.path.getsize(first) == s["bytes_fetched"]
+
+
+def test_concurrent_gets_fetch_once(server, tmp_path):
+    cache, calls = _cache(tmp_path, f"{server.base}/maps/api/staticmap")
+    before = server.counters["staticmap"]
+    start = threading.Barrier(8)
+
+    def get(_):
+        start.wait()
+        return cache.get(PATHEW_CENTER[0] + 0.01, PATHEW_CENTER[1])
+
+    server.latency = 0.2  # ให้ทุก thread มาถึงระหว่างที่ request แรกยังไม่เสร็จ
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            paths = list(pool.map(get, range(8)))
+    finally:
+        server.latency = 0.0
+
+    assert len(set(paths)) == 1 and paths[0] is not None
+    assert server.counters["staticmap"] - before == 1
+    assert len(calls) == 1
+
+
+def test_failed_fetch_is_skipped_within_failure_ttl(server, tmp_path):
+    # path นี้ mock ตอบ 404
+    cache, calls = _cache(tmp_path, f"{server.base}/missing", failure_ttl=60.0)
+    lat, lng = PATHEW_CENTER
+
+    assert cache.get(lat, lng) is None
+    assert cache.get(lat, lng) is None
+
+    assert len(calls) == 1
+    s = cache.stats()
+    assert (s["failed"], s["skipped_failed"]) == (1, 1)
+
+
+def test_failed_fetch_is_retried_after_failure_ttl(server, tmp_path):
+    cache, calls = _cache(tmp_path, f"{server.base}/missing", failure_ttl=0.0)
+    lat, lng = PATHEW_CENTER
+
+    cache.get(lat, lng)
+    cache.get(lat, lng)
+
+    assert len(calls) == 2
+
+
+def test_offline_renders_png_without_network(tmp_path):
+    def no_network(url, timeout):
+        raise AssertionError(f"offline cache fetched {url}")
+
+    cache = static_maps.StaticMapCache(str(tmp_path), offline=True, fetch=no_network)
+    path = cache.get(*PATHEW_CENTER)
+
+    with Image.open(path) as img:
+        assert img.format == "PNG"
+        assert img.size == static_maps._parse_size(static_maps.DEFAULT_SIZE)
+    assert cache.stats()["offline_rendered"] == 1
+    assert cache.get(*PATHEW_CENTER) == path
+    assert cache.stats()["offline_rendered"] == 1
@@ -0,0 +1,407 @@
+"""ย่อรูปของสถานที่เป็นขนาดการ์ดแล้วเก็บใน cache บนดิสก์ ให้ app.py แสดงไฟล์ในเครื่องแทน URL เต็มขนาด
+
+    python thumbnails.py warm                  # ดึงรูปแรกของทุกแถวใน places ไว้ล่วงหน้า
+    python thumbnails.py warm --all-images     # ทุกรูปใน image_urls / image_url
+    python thumbnails.py stats
+
+ลิงก์จาก Google Drive (uc?export=view) และ googleusercontent (=s1200) ส่งรูปเต็มขนาดให้ทุกเบราว์เซอร์
+ทุกครั้งที่เปิดหน้า และ Drive มัก throttle: ที่นี่ดึงแต่ละ URL ครั้งเดียว ย่อด้วย Pillow แล้วเก็บเป็น JPEG
+
+ไฟล์ตั้งชื่อตาม sha256 ของเนื้อหา (<dir>/ab/abcd....jpg) หลาย URL ที่ได้รูปเดียวกันจึงใช้ไฟล์ร่วมกัน
+index.sqlite เก็บ URL -> digest และขนาด/เวลาใช้ล่าสุดของแต่ละไฟล์ เพื่อลบไฟล์ที่ใช้น้อยที่สุดเมื่อรวมเกิน max_bytes
+URL ที่ดึงไม่ได้จะจำไว้ failure_ttl วินาที ไม่ยิงซ้ำทุกครั้งที่มีคนเปิดการ์ด
+เวลาใช้ล่าสุดของไฟล์ที่ถูกอ่านจะสะสมไว้ในหน่วยความจำแล้วเขียนลง index.sqlite ทีละชุด ไม่ commit ทุกครั้งที่ hit
+
+ตอนตอบแชท thumbnails_for ไม่รอดึงรูปเกิน THUMBNAIL_DEADLINE_SECONDS: การ์ดที่ยังไม่มีรูปย่อใช้ URL ต้นฉบับไปก่อน
+แล้วรูปย่อจะถูกดึงต่อใน thread เบื้องหลัง ให้คำถามถัดไปได้จาก cache
+"""
+import argparse
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+import requests
+from PIL import Image, ImageOps
+
+from config import THUMBNAIL_DEADLINE_SECONDS, THUMBNAIL_DIR, THUMBNAIL_MAX_MB, THUMBNAIL_SIZE
+
+FETCH_TIMEOUT = 10.0
+MAX_SOURCE_BYTES = 25 * 1024 * 1024
+JPEG_QUALITY = 82
+# เขียนเวลาใช้ล่าสุดที่สะสมไว้ลง index.sqlite เมื่อครบจำนวนนี้หรือทิ้งไว้นานเกินนี้ (วินาที)
+TOUCH_BATCH = 64
+TOUCH_FLUSH_SECONDS = 30.0
+
+
+def _http_fetcher() -> Callable[[str, float], bytes]:
+    session = requests.Session()
+    session.headers["User-Agent"] = "pathew-chatbot-thumbnails/1.0"
+
+    def fetch(url: str, timeout: float) -> bytes:
+        with session.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError("image too large")
+        return data
+
+    return fetch
+
+
+def make_thumbnail(data: bytes, size: int) -> bytes:
+    """ย่อรูปให้ด้านยาวไม่เกิน size px (ไม่ขยายรูปเล็ก) คืน JPEG"""
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+class ThumbnailCache:
+    """cache รูปย่อบนดิสก์ แบบ content-addressed + LRU ตามขนาดรวม ใช้ร่วมกันทุก thread"""
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024, size: int = 512,
+                 fetch: Optional[Callable[[str, float], bytes]] = None,
+                 timeout: float = FETCH_TIMEOUT, failure_ttl: float = 3600.0):
+        self.root = root
+        self.max_bytes = max(1, int(max_bytes))
+        self.size = int(size)
+        self.timeout = float(timeout)
+        self.failure_ttl = float(failure_ttl)
+        self._fetch = fetch or _http_fetcher()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.monotonic()
+        self._stats = {"hits": 0, "misses": 0, "fetched": 0, "failed": 0, "skipped_failed": 0, "evictions": 0}
+
+        os.makedirs(root, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            "key TEXT PRIMARY KEY, digest TEXT, failed_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _key(self, url: str) -> str:
+        # ขนาดเป็นส่วนหนึ่งของ key: เปลี่ยน THUMBNAIL_SIZE แล้วจะย่อใหม่
+        return f"{self.size}:{url}"
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.jpg")
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        """(digest, failed_at) ของ URL นี้ และเลื่อนเวลาใช้ล่าสุดของไฟล์ (ต้องถือ _lock)"""
+        row = self._db.execute("SELECT digest, failed_at FROM sources WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        digest, failed_at = row
+        if digest is not None:
+            if not os.path.exists(self.path_for(digest)):
+                # ไฟล์หายไปจากดิสก์ (ลบด้วยมือ): ลืม URL นี้แล้วดึงใหม่
+                self._forget([digest])
+                self._db.commit()
+                return None
+            self._touch(digest)
+        return digest, failed_at
+
+    def _touch(self, digest: str):
+        """จดเวลาใช้ล่าสุดไว้ก่อน เขียนลงดิสก์ทีละชุดใน _flush_touched (ต้องถือ _lock)"""
+        self._touched[digest] = time.time()
+        if len(self._touched) >= TOUCH_BATCH or time.monotonic() - self._touched_since >= TOUCH_FLUSH_SECONDS:
+            self._flush_touched()
+            self._db.commit()
+
+    def _flush_touched(self):
+        """เขียนเวลาใช้ล่าสุดที่สะสมไว้ (ต้องถือ _lock และ commit เอง) เรียกก่อนลบไฟล์ด้วย เพื่อให้ LRU ถูก"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE blobs SET last_used = ? WHERE digest = ?",
+                [(used, digest) for digest, used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_since = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+
+    def get(self, url: str) -> Optional[str]:
+        """path ของรูปย่อจาก URL นี้ ดึงและย่อถ้ายังไม่มี (None ถ้าดึงหรือเปิดรูปไม่ได้)"""
+        if not url:
+            return None
+        key = self._key(url)
+        path = self._cached(key)
+        if path is not False:
+            return path
+
+        with self._lock:
+            inflight = self._inflight.setdefault(key, threading.Lock())
+        with inflight:
+            # อีก thread อาจดึง URL เดียวกันเสร็จไปแล้วระหว่างรอ
+            path = self._cached(key, count=False)
+            if path is False:
+                path = self._fetch_and_store(url, key)
+        with self._lock:
+            self._inflight.pop(key, None)
+        return path
+
+    def _fetch_and_store(self, url: str, key: str) -> Optional[str]:
+        try:
+            thumb = make_thumbnail(self._fetch(url, self.timeout), self.size)
+        except Exception as e:
+            print(f"DEBUG: thumbnail error {url}: {str(e)}")
+            self._store_failure(key)
+            return None
+        return self._store(key, thumb)
+
+    def _cached(self, key: str, count: bool = True):
+        """path ถ้ามีใน cache, None ถ้าเพิ่งดึงไม่สำเร็จ, False ถ้าต้องดึง"""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                digest, failed_at = entry
+                if digest is not None:
+                    if count:
+                        self._stats["hits"] += 1
+                    return self.path_for(digest)
+                if time.time() - (failed_at or 0.0) < self.failure_ttl:
+                    if count:
+                        self._stats["skipped_failed"] += 1
+                    return None
+            if count:
+                self._stats["misses"] += 1
+            return False
+
+    def _store(self, key: str, thumb: bytes) -> str:
+        digest = hashlib.sha256(thumb).hexdigest()
+        path = self.path_for(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(thumb)
+                os.replace(tmp, path)
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                (digest, len(thumb), time.time()),
+            )
+            if cur.rowcount:
+                self._total += len(thumb)
+            else:
+                self._db.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), digest))
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (key, digest, failed_at) VALUES (?, ?, NULL)", (key, digest)
+            )
+            self._stats["fetched"] += 1
+            self._flush_touched()
+            self._evict(keep=digest)
+            self._db.commit()
+        return path
+
+    def _store_failure(self, key: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (key, digest, failed_at) VALUES (?, NULL, ?)", (key, time.time())
+            )
+            self._db.commit()
+            self._stats["failed"] += 1
+
+    def _forget(self, digests: Sequence[str]):
+        """ลบไฟล์และแถวใน index ของ digest เหล่านี้ (ต้องถือ _lock)"""
+        for digest in digests:
+            row = self._db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row:
+                self._total -= row[0]
+            self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            self._db.execute("DELETE FROM sources WHERE digest = ?", (digest,))
+            try:
+                os.remove(self.path_for(digest))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, keep: Optional[str] = None):
+        """ลบไฟล์ที่ใช้ล่าสุดนานที่สุดจนขนาดรวมไม่เกิน max_bytes (ต้องถือ _lock)"""
+        while self._total > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT digest FROM blobs WHERE digest != ? ORDER BY last_used LIMIT 64", (keep or "",)
+            ).fetchall()
+            if not rows:
+                break
+            for (digest,) in rows:
+                if self._total <= self.max_bytes:
+                    break
+                self._forget([digest])
+                self._stats["evictions"] += 1
+
+    def first_cached(self, urls: Sequence[str]) -> Optional[str]:
+        """รูปย่อของ URL แรกในรายการที่มีใน cache แล้ว ไม่ดึงอะไรจาก network"""
+        for url in urls:
+            if url:
+                # นับเป็น hit เฉพาะที่เจอ: ใบที่ไม่เจอจะถูกนับตอน first_available ดึงในเบื้องหลัง
+                path = self._cached(self._key(url), count=False)
+                if path:
+                    with self._lock:
+                        self._stats["hits"] += 1
+                    return path
+        return None
+
+    def first_available(self, urls: Sequence[str]) -> Optional[str]:
+        """รูปย่อของ URL แรกในรายการที่ใช้ได้"""
+        for url in urls:
+            path = self.get(url)
+            if path:
+                return path
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["files"] = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            out["bytes"] = self._total
+        out["max_bytes"] = self.max_bytes
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = out["hits"] / lookups if lookups else 0.0
+        return out
+
+
+_CACHE: Optional[ThumbnailCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_thumbnail_cache() -> Optional[ThumbnailCache]:
+    """cache ของ process นี้ (None ถ้าไม่ได้ตั้ง THUMBNAIL_DIR)"""
+    global _CACHE
+    if not THUMBNAIL_DIR:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ThumbnailCache(THUMBNAIL_DIR, int(THUMBNAIL_MAX_MB * 1024 * 1024), THUMBNAIL_SIZE)
+    return _CACHE
+
+
+_WARM_POOL: Optional[ThreadPoolExecutor] = None
+_WARMING: Dict[tuple, Future] = {}
+
+
+def _warm_pool() -> ThreadPoolExecutor:
+    global _WARM_POOL
+    if _WARM_POOL is None:
+        with _CACHE_LOCK:
+            if _WARM_POOL is None:
+                _WARM_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="thumbnails")
+    return _WARM_POOL
+
+
+def _warm_later(cache: ThumbnailCache, urls: Sequence[str]) -> Future:
+    """ดึงรูปย่อของการ์ดใน thread เบื้องหลัง (การ์ดเดียวกันที่ยังดึงอยู่ใช้งานเดิม)"""
+    key = tuple(urls)
+    pool = _warm_pool()
+    with _CACHE_LOCK:
+        job = _WARMING.get(key)
+        if job is None:
+            job = pool.submit(cache.first_available, urls)
+            _WARMING[key] = job
+            job.add_done_callback(lambda _: _WARMING.pop(key, None))
+    return job
+
+
+def thumbnails_for(candidates: List[List[str]],
+                   deadline: float = THUMBNAIL_DEADLINE_SECONDS) -> List[Optional[str]]:
+    """รูปย่อของการ์ดหลายใบ คืน None ทุกใบถ้าปิดไว้
+
+    ใบที่มีใน cache แล้วได้ path ทันที ใบที่ยังไม่มีเริ่มดึงในเบื้องหลังแล้วรอรวมกันไม่เกิน deadline วินาที
+    ใบที่ยังไม่เสร็จได้ None (การ์ดใช้ URL ต้นฉบับ) และจะอยู่ใน cache ให้คำถามถัดไป
+    """
+    cache = get_thumbnail_cache()
+    if cache is None or not candidates:
+        return [None] * len(candidates)
+    out = [cache.first_cached(urls) for urls in candidates]
+    jobs = {i: _warm_later(cache, urls) for i, urls in enumerate(candidates) if out[i] is None and urls}
+    if jobs and deadline > 0:
+        wait(jobs.values(), timeout=deadline)
+    for i, job in jobs.items():
+        if job.done() and not job.cancelled() and job.exception() is None:
+            out[i] = job.result()
+    return out
+
+
+# ---------- CLI ----------
+def warm(cache: ThumbnailCache, all_images: bool = False, workers: int = 16, batch_size: int = 2000) -> Dict:
+    """ดึงรูปย่อของทุกแถวใน places ไว้ล่วงหน้า (ค่าเริ่มต้น: รูปแรกที่การ์ดจะแสดง)"""
+    import db
+    from images import get_best_image_candidates
+
+    before = cache.stats()
+    start = time.perf_counter()
+    places = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in db.iter_places(batch_size):
+            jobs = []
+            for row in batch:
+                urls = get_best_image_candidates(row)
+                places += 1
+                if all_images:
+                    jobs.extend(pool.submit(cache.get, u) for u in urls)
+                elif urls:
+                    jobs.append(pool.submit(cache.first_available, urls))
+            for job in jobs:
+                job.result()
+    cache.flush()
+
+    after = cache.stats()
+    return {
+        "places": places,
+        "seconds": time.perf_counter() - start,
+        **{k: after[k] - before[k] for k in ("hits", "fetched", "failed", "skipped_failed", "evictions")},
+        "files": after["files"],
+        "bytes": after["bytes"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_warm = sub.add_parser("warm", help="ดึงรูปย่อของทุกแถวใน places ไว้ล่วงหน้า")
+    p_warm.add_argument("--all-images", action="store_true", help="ทุกรูป ไม่ใช่แค่รูปแรกของแต่ละแถว")
+    p_warm.add_argument("--workers", type=int, default=16, help="จำนวนการดึงพร้อมกัน")
+    p_warm.add_argument("--batch-size", type=int, default=2000)
+    sub.add_parser("stats", help="จำนวนไฟล์และขนาดรวมของ cache")
+    args = parser.parse_args()
+
+    cache = get_thumbnail_cache()
+    if cache is None:
+        print("THUMBNAIL_DIR is not set")
+        return 1
+
+    if args.command == "warm":
+        r = warm(cache, args.all_images, args.workers, args.batch_size)
+        print(f"{r['places']} places in {r['seconds']:.1f}s: {r['fetched']} fetched, {r['hits']} cached, "
+              f"{r['failed'] + r['skipped_failed']} failed, {r['evictions']} evicted")
+        print(f"cache: {r['files']} files, {r['bytes'] / 1e6:.1f} MB")
+    else:
+        s = cache.stats()
+        print(f"{s['files']} files, {s['bytes'] / 1e6:.1f} / {s['max_bytes'] / 1e6:.1f} MB in {cache.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import asyncio
+import functools
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+from config import TRACE_ENABLED, TRACE_HISTORY_SIZE, TRACE_JSONL_PATH, TRACE_OTEL_ENDPOINT
+
+
+class Trace:
+    """span ทั้งหมดของหนึ่งคำขอ (เช่นหนึ่งรอบ get_answer) เรียงตามเวลาที่จบ"""
+
+    __slots__ = ("trace_id", "name", "attrs", "spans")
+
+    def __init__(self, name: str, attrs: Optional[Dict] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.spans: List[Dict] = []
+
+    def to_dict(self) -> Dict:
+        return {"trace_id": self.trace_id, "name": self.name, "attrs": self.attrs, "spans": self.spans}
+
+
+# contextvars ถูกคัดลอกให้ทุก asyncio task: span ที่รันพร้อมกันใน gather ยังเข้า trace เดียวกันและรู้ parent ถูกตัว
+_TRACE: ContextVar[Optional[Trace]] = ContextVar("pathew_trace", default=None)
+_PARENT: ContextVar[Optional[int]] = ContextVar("pathew_span", default=None)
+_SPAN_IDS = itertools.count(1)
+
+_STAGES: Dict[str, Deque[float]] = {}
+_STAGES_LOCK = threading.Lock()
+_RECENT: Deque[Trace] = deque(maxlen=50)
+_EXPORT_LOCK = threading.Lock()
+
+
+# ---------- บันทึกเวลา ----------
+def record(name: str, seconds: float):
+    """เก็บเวลาหนึ่งครั้งของขั้นตอน name ลง histogram (ใช้ได้แม้ไม่ได้อยู่ใน span)"""
+    if not TRACE_ENABLED:
+        return
+    samples = _STAGES.get(name)
+    if samples is None:
+        with _STAGES_LOCK:
+            samples = _STAGES.setdefault(name, deque(maxlen=max(1, TRACE_HISTORY_SIZE)))
+    samples.append(seconds)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """จับเวลาบล็อกโค้ดด้วย perf_counter แล้วแนบเป็น span ของ trace ปัจจุบัน (ถ้ามี)"""
+    if not TRACE_ENABLED:
+        yield
+        return
+
+    trace = _TRACE.get()
+    span_id = next(_SPAN_IDS)
+    parent_id = _PARENT.get()
+    token = _PARENT.set(span_id)
+    wall = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _PARENT.reset(token)
+        record(name, elapsed)
+        if trace is not None:
+            item = {
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "name": name,
+                "start": wall,
+                "duration_ms": elapsed * 1000.0,
+            }
+            if attrs:
+                item["attrs"] = attrs
+            if error:
+                item["error"] = error
+            trace.spans.append(item)
+
+
+def traced(name: str):
+    """decorator: ครอบทั้งฟังก์ชัน (sync หรือ async) ด้วย span(name)"""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """เริ่ม trace ใหม่ (root span ชื่อ name) จบแล้วส่งออกเป็น JSON lines / OpenTelemetry ตามที่ตั้งไว้"""
+    if not TRACE_ENABLED:
+        yield None
+        return
+
+    t = Trace(name, attrs)
+    token = _TRACE.set(t)
+    parent_token = _PARENT.set(None)
+    try:
+        with span(name):
+            yield t
+    finally:
+        _PARENT.reset(parent_token)
+        _TRACE.reset(token)
+        _finish(t)
+
+
+def current_trace() -> Optional[Trace]:
+    return _TRACE.get()
+
+
+# ---------- ส่งออก ----------
+def _finish(t: Trace):
+    _RECENT.append(t)
+    if TRACE_JSONL_PATH:
+        _write_jsonl(t, TRACE_JSONL_PATH)
+    if TRACE_OTEL_ENDPOINT:
+        _export_otel(t)
+
+
+def _write_jsonl(t: Trace, path: str):
+    try:
+        line = json.dumps(t.to_dict(), ensure_ascii=False, default=str)
+        with _EXPORT_LOCK:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"DEBUG: trace export error: {str(e)}")
+
+
+_OTEL_TRACER = None
+_OTEL_FAILED = False
+
+
+def _otel_tracer():
+    """tracer ของ OpenTelemetry ที่ส่ง OTLP ไปยัง collector ที่ TRACE_OTEL_ENDPOINT (ไม่มีแพ็กเกจก็ข้าม)"""
+    global _OTEL_TRACER, _OTEL_FAILED
+    if _OTEL_TRACER is not None or _OTEL_FAILED:
+        return _OTEL_TRACER
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        print("DEBUG: TRACE_OTEL_ENDPOINT is set but opentelemetry-sdk is not installed")
+        _OTEL_FAILED = True
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "pathew-chatbot"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=TRACE_OTEL_ENDPOINT)))
+    _OTEL_TRACER = provider.get_tracer("pathew.tracing")
+    return _OTEL_TRACER
+
+
+def _export_otel(t: Trace):
+    """สร้าง span ของ OpenTelemetry ย้อนหลังจากเวลาที่บันทึกไว้ (ไม่มี overhead ระหว่างรันคำขอ)"""
+    tracer = _otel_tracer()
+    if tracer is None:
+        return
+    try:
+        from opentelemetry.trace import set_span_in_context
+
+        by_id = {s["span_id"]: s for s in t.spans}
+        created: Dict[int, object] = {}
+
+        def build(s: Dict):
+            if s["span_id"] in created:
+                return created[s["span_id"]]
+            parent = by_id.get(s["parent_id"])
+            context = set_span_in_context(build(parent)) if parent else None
+            start_ns = int(s["start"] * 1e9)
+            otel_span = tracer.start_span(s["name"], context=context, start_time=start_ns,
+                                          attributes=s.get("attrs") or None)
+            if parent is None and t.attrs:
+                otel_span.set_attributes({k: str(v) for k, v in t.attrs.items()})
+            if s.get("error"):
+                otel_span.set_attribute("error.type", s["error"])
+            otel_span.end(end_time=start_ns + int(s["duration_ms"] * 1e6))
+            created[s["span_id"]] = otel_span
+            return otel_span
+
+        for s in t.spans:
+            build(s)
+    except Exception as e:
+        print(f"DEBUG: otel export error: {str(e)}")
+
+
+# ---------- สถิติ ----------
+def _pct(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def stage_percentiles() -> Dict[str, Dict]:
+    """p50/p95/p99 (ms) ของแต่ละขั้นตอน จาก TRACE_HISTORY_SIZE ครั้งล่าสุด"""
+    out = {}
+    for name, samples in list(_STAGES.items()):
+        ordered = sorted(samples)
+        if not ordered:
+            continue
+        out[name] = {
+            "count": len(ordered),
+            "p50_ms": _pct(ordered, 50) * 1000.0,
+            "p95_ms": _pct(ordered, 95) * 1000.0,
+            "p99_ms": _pct(ordered, 99) * 1000.0,
+            "mean_ms": sum(ordered) / len(ordered) * 1000.0,
+        }
+    return out
+
+
+def recent_traces(limit: int = 10) -> List[Dict]:
+    return [t.to_dict() for t in list(_RECENT)[-limit:]]
+
+
+def reset_stats():
+    with _STAGES_LOCK:
+        _STAGES.clear()
+    _RECENT.clear()